@@ -0,0 +1,114 @@
+"""
+Compares the compiled NumPy models with the sklearn estimators they're exported from: how far
+their probabilities differ on a synthetic season, and how long a fresh process takes to import,
+load the three models and score one slate, with its peak memory
+
+    python benchmarks/bench_compiled.py
+    python benchmarks/bench_compiled.py --rows 5000      # score more rows per process
+
+Each process runs in a temporary home directory with the shipped models copied in, so the
+compiled exports are written there rather than under ~/Desktop/PREDICT_NBA
+"""
+
+import os
+import sys
+import glob
+import json
+import shutil
+import argparse
+import tempfile
+import subprocess
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+
+sys.path.insert(0, ROOT)
+
+# run in a fresh interpreter, prints one json line
+PROCESS = '''
+import sys, json, time, resource
+start = time.perf_counter()
+import numpy as np
+from modules import ModelRegistry as registry
+from modules import CompiledModels as cm
+from modules.NBAtools import PREDICTION_FEATURES
+X = np.random.default_rng(0).normal(size=({rows}, 20)).astype(np.float32)
+if {compiled}:
+    probs = cm.score(X)
+else:
+    import pandas as pd
+    X = pd.DataFrame(X, columns=PREDICTION_FEATURES)
+    probs = {{name: registry.load(name).predict_proba(X)[:, 1] for name in registry.MODELS}}
+seconds = time.perf_counter() - start
+# VmHWM starts again at exec, ru_maxrss keeps the peak of the benchmark process this one was forked from
+try:
+    with open('/proc/self/status') as f:
+        peak = next(int(line.split()[1]) for line in f if line.startswith('VmHWM'))
+except (OSError, StopIteration):
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({{'seconds': seconds, 'sklearn': 'sklearn' in sys.modules, 'max_rss_mb': peak / 1024}}))
+'''
+
+
+def process(home, compiled, rows):
+    env = dict(os.environ, HOME=home)
+    out = subprocess.run([sys.executable, '-c', PROCESS.format(rows=rows, compiled=compiled)], cwd=ROOT, env=env,
+                         capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def agreement(home):
+
+    # the modules work out their PREDICT_NBA paths when imported, so HOME is set first
+    os.environ['HOME'] = home
+    from modules import ModelRegistry as registry
+    from modules import CompiledModels as cm
+    from bench_suite import inputs
+
+    X = inputs('season')['X']
+    probs = cm.score(X)
+    result = {}
+    for name in registry.MODELS:
+        reference = registry.load(name).predict_proba(X)[:, 1]
+        result[name] = {'max_abs_diff': float(np.abs(probs[name] - reference).max()),
+                        'winner_differs': int(((probs[name] > 0.5) != (reference > 0.5)).sum()),
+                        'sav_kb': round(os.path.getsize(registry.model_path(name)) / 1024, 1),
+                        'npz_kb': round(os.path.getsize(cm.compiled_path(name)) / 1024, 1)}
+    return len(X), result
+
+
+def main(argv=None):
+
+    p = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    p.add_argument('--rows', type=int, default=30, help='rows each process scores, about one slate by default')
+    p.add_argument('--repeats', type=int, default=3)
+    args = p.parse_args(argv)
+
+    home = tempfile.mkdtemp(prefix='nbapredict-compiled-')
+    models = os.path.join(home, 'Desktop', 'PREDICT_NBA', 'MODELS')
+    os.makedirs(models)
+    for file in glob.glob(os.path.join(ROOT, 'data', '*.sav')):
+        shutil.copy(file, models)
+
+    try:
+        rows, result = agreement(home)
+        print(f'compiled vs sklearn on {rows} synthetic rows:')
+        for name, r in result.items():
+            print(f'  {name:<4} max difference {r["max_abs_diff"]:.2e}, {r["winner_differs"]} winners differ, '
+                  f'{r["sav_kb"]:.0f} KB pickled -> {r["npz_kb"]:.0f} KB exported')
+
+        print(f'\nfresh process importing, loading and scoring {args.rows} rows (best of {args.repeats}):')
+        for compiled in [False, True]:
+            runs = [process(home, compiled, args.rows) for _ in range(args.repeats)]
+            best = min(runs, key=lambda r: r['seconds'])
+            print(f'  {"compiled" if compiled else "sklearn":<9} {best["seconds"]:6.3f}s, '
+                  f'peak rss {min(r["max_rss_mb"] for r in runs):6.1f} MB, sklearn imported: {best["sklearn"]}')
+    finally:
+        shutil.rmtree(home, ignore_errors=True)
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,102 @@
+"""
+How far EloEngine's ratings are from fully converged after each number of warm-up seasons, on a
+simulated league whose teams have real strengths, and optionally how they compare with the ratings
+FiveThirtyEight published for the same games
+
+    python benchmarks/bench_elo.py
+    python benchmarks/bench_elo.py --fivethirtyeight nba_elo.csv --seasons 2019 2023
+
+The comparison with FiveThirtyEight rates the seasons from basketball-reference's schedule pages, so
+it needs the network or a response cache (NBAPREDICT_BASE_URL can point it at a replay server)
+"""
+
+import os
+import sys
+import argparse
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules import EloEngine as elo
+from synthetic import synthetic_schedule
+
+
+def simulated_league(seasons, seed=0):
+    """
+    Seasons of games between teams of known strength, which moves between seasons the way
+    FiveThirtyEight's ratings do. Margins are drawn around the Elo point spread
+    """
+
+    rng = np.random.default_rng(seed)
+    teams = sorted(synthetic_schedule(seasons[0], full_names=False).home_team.unique())
+    strength = pd.Series(rng.normal(elo.MEAN, 100, len(teams)), index=teams)
+
+    parts = []
+    for season in seasons:
+        strength = elo.CARRYOVER * strength + (1 - elo.CARRYOVER) * elo.MEAN + rng.normal(0, 50, len(teams))
+        sched = synthetic_schedule(season, seed, full_names=False)
+        spread = (strength[sched.home_team].to_numpy() + elo.HOME_ADV - strength[sched.away_team].to_numpy()) / 28
+        margin = np.round(rng.normal(spread, 12))
+        margin[margin == 0] = 1
+        parts.append(pd.DataFrame({'season': season, 'date': pd.to_datetime(sched.date).dt.strftime('%Y-%m-%d'),
+                                   'home': sched.home_team, 'away': sched.away_team,
+                                   'home_pts': (110 + np.maximum(margin, 0)).astype('int'),
+                                   'away_pts': (110 + np.maximum(-margin, 0)).astype('int')}))
+    return pd.concat(parts, ignore_index=True)
+
+
+def convergence(history=20, warmups=(1, 2, 3, 4, 6)):
+
+    games = simulated_league(list(range(2000, 2000 + history)))
+    target = games.season.max()
+    reference, _, _ = elo.compute(games)
+    reference = reference[reference.season == target].home_elo.to_numpy()
+
+    rows = []
+    for warmup in warmups:
+        pre, _, _ = elo.compute(games[games.season >= target - warmup])
+        diff = np.abs(pre[pre.season == target].home_elo.to_numpy() - reference)
+        rows.append({'warmup': warmup, 'max_abs_diff': diff.max(), 'mean_abs_diff': diff.mean()})
+    return history - 1, pd.DataFrame(rows)
+
+
+def fivethirtyeight(path, seasons):
+
+    published = pd.read_csv(path)
+    published = published[published.season.isin(seasons)]
+    local = elo.elo_history(seasons, save=False)
+
+    # team1 is the home team in FiveThirtyEight's file
+    df = published.merge(local, left_on=['date', 'team1', 'team2'], right_on=['date', 'team', 'opp'])
+    diff = df.teamElo - df.elo1_pre
+    return {'games': len(df), 'of': len(published), 'mean_diff': diff.mean(), 'max_abs_diff': diff.abs().max(),
+            'sd_published': df.elo1_pre.std(), 'sd_local': df.teamElo.std(),
+            'correlation': np.corrcoef(df.teamElo, df.elo1_pre)[0, 1]}
+
+
+def main(argv=None):
+
+    p = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    p.add_argument('--fivethirtyeight', metavar='CSV', help="FiveThirtyEight's nba_elo.csv")
+    p.add_argument('--seasons', type=int, nargs=2, default=[2019, 2023], metavar=('FIRST', 'LAST'))
+    args = p.parse_args(argv)
+
+    seasons, table = convergence()
+    print(f'ratings through a season vs ones started {seasons} seasons earlier, all teams starting at {elo.INITIAL}:')
+    for row in table.itertuples():
+        marker = '  <- WARMUP_SEASONS' if row.warmup == elo.WARMUP_SEASONS else ''
+        print(f'  {row.warmup} warm-up seasons: max difference {row.max_abs_diff:6.2f}, '
+              f'mean {row.mean_abs_diff:5.2f}{marker}')
+
+    if args.fivethirtyeight:
+        r = fivethirtyeight(args.fivethirtyeight, list(range(args.seasons[0], args.seasons[1] + 1)))
+        print(f'\nlocal vs published ratings for {r["games"]} of {r["of"]} games:')
+        print(f'  mean difference {r["mean_diff"]:+.2f}, max {r["max_abs_diff"]:.2f}, correlation {r["correlation"]:.4f}')
+        print(f'  spread (sd) published {r["sd_published"]:.1f}, local {r["sd_local"]:.1f}')
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
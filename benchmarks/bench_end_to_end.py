@@ -0,0 +1,211 @@
+"""
+End-to-end benchmark of the full scrape-to-predict pipeline against the local replay server:
+a day's slate through DailyReport and get_predictions, and a historical season through
+HistoryBuilder.build_season, each run once with an empty response cache and once with a warm one
+
+    python benchmarks/bench_end_to_end.py                          # day and season, no added latency
+    python benchmarks/bench_end_to_end.py --scenarios day --latency 0.08 --jitter 0.04
+    python benchmarks/bench_end_to_end.py --production-rates       # keep basketball-reference's request limit
+    python benchmarks/bench_end_to_end.py --root ~/recorded        # serve recorded pages where there are any
+
+Everything runs in a temporary home directory, so nothing under ~/Desktop/PREDICT_NBA is touched.
+Results are saved to benchmarks/results/end_to_end/{label}.json and compared with the previous file
+"""
+
+import os
+import sys
+import json
+import glob
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import importlib
+import contextlib
+import datetime as dt
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+RESULTS_DIR = os.path.join(HERE, 'results', 'end_to_end')
+
+SCENARIOS = ['day', 'season']
+
+# client side request rates used unless --production-rates is given, high enough that only
+# the server's latency and the pipeline itself are measured
+FAST_RATE = (1000.0, 50)
+
+
+def load_package(home, trace_memory):
+    """
+    Imports the package with HOME pointing at a scratch directory. Every module works out its
+    PREDICT_NBA paths when it is imported, so HOME has to be set first
+    """
+
+    os.environ['HOME'] = home
+    os.environ['NBAPREDICT_TRACE_MEMORY'] = '1' if trace_memory else '0'
+    # the replay server serves the minutes as a json feed at this address, sent to it through the base url
+    os.environ.setdefault('NBAPREDICT_MINUTES_URL', 'https://api.lineups.com/nba/fetch/minutes')
+    sys.path.insert(0, os.path.dirname(ROOT))
+    name = os.path.basename(ROOT)
+
+    # installed models stand in for the first run's downloads
+    models = os.path.join(home, 'Desktop', 'PREDICT_NBA', 'MODELS')
+    os.makedirs(models, exist_ok=True)
+    for file in glob.glob(os.path.join(ROOT, 'data', '*.sav')):
+        shutil.copy(file, models)
+
+    return {module: importlib.import_module(f'{name}.{module}')
+            for module in ['predict', 'modules.WebCache', 'modules.FetchScheduler', 'modules.HistoryBuilder',
+                           'modules.Instrumentation']}
+
+
+def summarise(reports, seconds, server, rows):
+
+    # stages at the top level only, repeated stages added together, over every run of the scenario
+    stages = {}
+    for span in (span for report in reports for span in report['spans']):
+        if span['depth'] == 0:
+            stages[span['name']] = round(stages.get(span['name'], 0) + span['seconds'], 4)
+    fetches = [report['fetch_summary'] for report in reports]
+    served = server.stats()
+    return {'seconds': round(seconds, 4), 'rows': rows, 'rows_per_second': round(rows / seconds, 2) if seconds else None,
+            'requests': sum(f['requests'] for f in fetches), 'cache_hits': sum(f['cache_hits'] for f in fetches),
+            'bytes': sum(f['bytes'] for f in fetches),
+            'server_requests': sum(s['requests'] for s in served.values()),
+            'throttled': sum(s['throttled'] for s in served.values()),
+            'rate_limit_wait': round(sum(h['wait'] for f in fetches for h in f['hosts'].values()), 4),
+            'stages': stages}
+
+
+def run_day(pkg, server, quiet):
+
+    server.reset_stats()
+    start = time.perf_counter()
+    with quiet():
+        report = pkg['predict'].DailyReport()
+        # building the inputs and predicting are recorded as separate runs
+        inputs = report.run
+        report.get_predictions()
+    seconds = time.perf_counter() - start
+    if report.games is None:
+        raise RuntimeError('no games on the replayed slate')
+    return summarise([inputs.report(), report.run.report()], seconds, server, len(report.games) // 2)
+
+
+def run_season(pkg, server, season, quiet):
+
+    inst = pkg['modules.Instrumentation']
+    server.reset_stats()
+    run = inst.start_run('history')
+    start = time.perf_counter()
+    try:
+        with quiet():
+            path = pkg['modules.HistoryBuilder'].build_season(season)
+    finally:
+        inst.finish_run()
+    seconds = time.perf_counter() - start
+    with open(path) as f:
+        rows = sum(1 for _ in f) - 1
+    return summarise([run.report()], seconds, server, rows // 2)
+
+
+def print_result(name, r):
+
+    print(f'\n{name}: {r["seconds"]:.2f}s, {r["rows"]} games ({r["rows_per_second"]} games/s), '
+          f'{r["requests"]} requests ({r["cache_hits"]} cached, {r["server_requests"]} reached the server, '
+          f'{r["throttled"]} throttled), {r["rate_limit_wait"]:.2f}s rate limited')
+    for stage, seconds in r['stages'].items():
+        print(f'  {stage:<26} {seconds:8.3f}s')
+
+
+def previous(path):
+    if not os.path.isdir(RESULTS_DIR):
+        return None
+    files = [os.path.join(RESULTS_DIR, f) for f in os.listdir(RESULTS_DIR) if f.endswith('.json')]
+    files = [f for f in files if os.path.abspath(f) != os.path.abspath(path)]
+    return max(files, key=os.path.getmtime) if files else None
+
+
+def main(argv=None):
+
+    p = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    p.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=SCENARIOS)
+    p.add_argument('--season', type=int, help='season to build, the last finished one by default')
+    p.add_argument('--latency', type=float, default=0.0, help='seconds the server adds to every response')
+    p.add_argument('--jitter', type=float, default=0.0, help='up to this many more seconds per response')
+    p.add_argument('--root', help='directory of recorded responses, see replay_server.export_cache')
+    p.add_argument('--production-rates', action='store_true',
+                   help="keep the client's request limits and enforce them on the server too")
+    p.add_argument('--trace-memory', action='store_true', help='record peak memory per stage, slows the run down')
+    p.add_argument('--seed', type=int, default=0)
+    p.add_argument('--home', help='home directory to run in, a temporary one by default')
+    p.add_argument('--verbose', action='store_true', help="show the pipeline's own output")
+    p.add_argument('--label', help='name of the results file, the git commit by default')
+    p.add_argument('--no-save', action='store_true')
+    args = p.parse_args(argv)
+
+    home = args.home or tempfile.mkdtemp(prefix='nbapredict-e2e-')
+    pkg = load_package(home, args.trace_memory)
+    wc, fs = pkg['modules.WebCache'], pkg['modules.FetchScheduler']
+
+    from replay_server import ReplayServer, SyntheticSite
+    from bench_suite import label
+
+    rates = dict(fs.HOST_RATES) if args.production_rates else None
+    site = SyntheticSite(seed=args.seed)
+    server = ReplayServer(site, args.root, latency=args.latency, jitter=args.jitter, rates=rates, seed=args.seed).start()
+    wc.set_base_url(server.url)
+    # processes started by the pipeline (HistoryBuilder's workers) pick the server up from here
+    os.environ['NBAPREDICT_BASE_URL'] = server.url
+    if not args.production_rates:
+        for host in ['www.basketball-reference.com', 'raw.githubusercontent.com', 'projects.fivethirtyeight.com',
+                     'api.lineups.com']:
+            fs.set_rate(host, *FAST_RATE)
+
+    devnull = open(os.devnull, 'w')
+    quiet = contextlib.nullcontext if args.verbose else lambda: contextlib.redirect_stdout(devnull)
+    season = args.season or site.season - 1
+    print(f'replay server {server.url}, home {home}, slate of {site.today}, season {season}')
+
+    results = {}
+    try:
+        for scenario in args.scenarios:
+            for cache in ['cold', 'warm']:
+                name = f'{scenario}/{cache}'
+                if scenario == 'day':
+                    results[name] = run_day(pkg, server, quiet)
+                else:
+                    results[name] = run_season(pkg, server, season, quiet)
+                print_result(name, results[name])
+    finally:
+        server.stop()
+        if not args.home:
+            shutil.rmtree(home, ignore_errors=True)
+
+    path = os.path.join(RESULTS_DIR, f'{args.label or label()}.json')
+    base_path = previous(path)
+    if base_path:
+        with open(base_path) as f:
+            base = json.load(f)['results']
+        print(f'\ncompared with {os.path.relpath(base_path)}:')
+        for key, r in results.items():
+            if key in base:
+                change = r['seconds'] / base[key]['seconds'] - 1
+                print(f'  {key:<14} {base[key]["seconds"]:9.2f} -> {r["seconds"]:9.2f} s  {change:+7.1%}')
+
+    if not args.no_save:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        record = {'label': os.path.basename(path)[:-5], 'created': dt.datetime.now().isoformat(timespec='seconds'),
+                  'python': platform.python_version(), 'machine': platform.machine(), 'cpus': os.cpu_count(),
+                  'latency': args.latency, 'jitter': args.jitter, 'production_rates': args.production_rates,
+                  'season': season, 'results': results}
+        with open(path, 'w') as f:
+            json.dump(record, f, indent=1)
+        print(f'\nsaved {os.path.relpath(path)}')
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
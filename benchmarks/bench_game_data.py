@@ -0,0 +1,85 @@
+"""
+Parity check and timing for DatasetCompilers.compile_game_data, the post-scrape part of
+build_game_data, against the original per-row abbreviation loop and per-team merge
+
+    python benchmarks/bench_game_data.py
+"""
+
+import os
+import sys
+import time
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules import DatasetCompilers as dc
+from synthetic import synthetic_schedule
+from bench_team_features import legacy_team_features
+
+
+def legacy_compile(sched, season):
+
+    sched = sched.copy()
+    sched['szn_type'] = 'reg'
+
+    for i in range(len(sched)):
+        v = sched.iloc[i, 2]
+        h = sched.iloc[i, 4]
+        sched.iloc[i, 2] = dc.ABV_DICT[v]
+        sched.iloc[i, 4] = dc.ABV_DICT[h]
+
+    sched = sched.astype({"away_pts": "int", "home_pts": "int"})
+
+    df_list = []
+    for team in sched['away_team'].unique():
+        teamdf = sched[(sched.home_team == team) | (sched.away_team == team)]
+        teamdf.reset_index(drop=True, inplace=True)
+        df_list.append(legacy_team_features(team, teamdf))
+
+    df = pd.concat(df_list, ignore_index=True)
+
+    maindf = pd.merge(df, df, left_on=['date', 'opp'], right_on=['date', 'team'], how='outer', suffixes=["", "_opp"])
+    maindf = maindf.drop(columns=['season_opp', 'team_opp', 'team_pts_opp', 'opp_opp',
+                                  'opp_pts_opp', 'win_opp', 'home_opp', 'gp_opp', 'szn_type_opp']).sort_values(by=['date']).reset_index(drop=True)
+
+    maindf.rename(columns={'teamDayOff_opp': 'oppDayOff', 'lastFive_opp': 'oppLastFive', 'lastTen_opp': 'oppLastTen', 'winp_opp': 'oppWinp'}, inplace=True)
+
+    if season == 2022:
+        maindf.loc[maindf['date'] > '2022-04-15', 'szn_type'] = 'post'
+    elif season == 2021:
+        maindf.loc[maindf['date'] > '2021-05-21', 'szn_type'] = 'post'
+    elif season == 2020:
+        maindf.loc[maindf['date'] > '2020-08-15', 'szn_type'] = 'post'
+    else:
+        maindf.loc[maindf.gp > 81, 'szn_type'] = 'post'
+
+    cols = ['season', 'date', 'team', 'team_pts', 'opp', 'opp_pts', 'home', 'szn_type', 'gp', 'lastFive', 'lastTen', 'winp',
+            'teamDayOff', 'oppLastFive', 'oppLastTen', 'oppWinp', 'oppDayOff', 'win']
+
+    return maindf[cols]
+
+
+def main():
+    for season in [2020, 2023]:
+        sched = synthetic_schedule(season=season, games_per_team=90)
+        pd.testing.assert_frame_equal(legacy_compile(sched, season), dc.compile_game_data(sched))
+    print('parity ok')
+
+    seasons = list(range(2014, 2024))
+    scheds = [synthetic_schedule(season=s) for s in seasons]
+
+    start = time.perf_counter()
+    legacy_compile(scheds[-1], seasons[-1])
+    legacy_time = time.perf_counter() - start
+    print(f'original, 1 season:    {legacy_time:8.3f}s')
+
+    for n in [1, 10]:
+        sched = pd.concat(scheds[-n:], ignore_index=True)
+        start = time.perf_counter()
+        dc.compile_game_data(sched)
+        elapsed = time.perf_counter() - start
+        print(f'columnar, {n:2d} season(s): {elapsed:8.3f}s')
+
+
+if __name__ == '__main__':
+    main()
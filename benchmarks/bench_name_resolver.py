@@ -0,0 +1,64 @@
+"""
+Agreement and timing of NameResolver against the per-row difflib.get_close_matches scan
+used by build_full_stats and get_projected_minutes
+
+    python benchmarks/bench_name_resolver.py
+"""
+
+import os
+import sys
+import time
+import difflib
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.NameResolver import NameResolver
+from synthetic import synthetic_players
+
+
+def variant(name, rng):
+    """RAPTOR/lineups style spelling of a basketball-reference name"""
+    choice = rng.integers(0, 5)
+    if choice == 0:
+        return name
+    if choice == 1:
+        return name.replace('č', 'c').replace('ć', 'c').replace('ö', 'o').replace('ņ', 'n').replace('ģ', 'g')
+    if choice == 2:
+        return name.replace(' Jr.', '').replace(' II', '').replace(' III', '').replace(' Sr.', '')
+    if choice == 3:
+        return name.replace('.', '').replace('-', ' ')
+    k = int(rng.integers(1, len(name) - 1))
+    return name[:k] + name[k + 1:]
+
+
+def main():
+    rng = np.random.default_rng(0)
+    names = list(synthetic_players(2023).PLAYER)
+    queries = [variant(n, rng) for n in names] * 2
+
+    start = time.perf_counter()
+    old = {}
+    for q in queries:
+        match = difflib.get_close_matches(q, names, 1)
+        old[q] = match[0] if match else q
+    old_time = time.perf_counter() - start
+
+    resolver = NameResolver(names, alias_path=None)
+    start = time.perf_counter()
+    new = resolver.resolve_all(queries)
+    new_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    resolver.resolve_all(queries)
+    warm_time = time.perf_counter() - start
+
+    agree = sum(old[q] == new[q] for q in old)
+    print(f'{len(queries)} lookups against {len(names)} names, {agree}/{len(old)} distinct names agree with difflib')
+    print(f'get_close_matches: {old_time * 1000:8.1f} ms')
+    print(f'NameResolver:      {new_time * 1000:8.1f} ms  ({old_time / new_time:.0f}x)')
+    print(f'  with aliases:    {warm_time * 1000:8.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
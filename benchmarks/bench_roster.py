@@ -0,0 +1,114 @@
+"""
+Parity check and timing for DatasetCompilers.build_games_plus_roster against the original
+per-game loop, on a daily slate and on a full synthetic season
+
+    python benchmarks/bench_roster.py
+"""
+
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules import DatasetCompilers as dc
+from modules import NBAtools as tl
+from synthetic import synthetic_schedule, synthetic_players, synthetic_raptor, synthetic_minutes, synthetic_stats
+
+
+def legacy_build_games_plus_roster(games, mp, stats):
+    
+    for i in range(1,9):
+        games[f'P{i}Or'] = 0
+        games[f'P{i}Dr'] = 0
+        games[f'P{i}name'] = 0
+        games[f'P{i}MP'] = 0
+        games['age'] = 0
+
+    for i in range(1,9):
+        games[f'oppP{i}Or'] = 0
+        games[f'oppP{i}Dr'] = 0
+        games[f'oppP{i}name'] = 0
+        games[f'oppP{i}MP'] = 0
+        games['oppage'] = 0
+
+
+    for i,r in games.iterrows():
+        date = r['date']
+        team = r['team']
+        opp = r['opp']
+        szn = int(r['season'])
+        # po = r['szn_type']
+
+        teammp = mp[mp.TEAM == team]
+        oppmp = mp[mp.TEAM == opp]
+
+        # Use Get Top Players Function To Return Roster and Player Info
+        top = tl.top_players(team, teammp.PLAYER.unique(), stats, szn)
+        otop = tl.top_players(opp, oppmp.PLAYER.unique(), stats, szn)
+
+        roster = top.merge(teammp, on='PLAYER', how='left')
+        oroster = otop.merge(oppmp, on='PLAYER', how='left')
+
+        roster.drop(columns=['DATE','TEAM','SEASON'], inplace=True)
+        oroster.drop(columns=['DATE','TEAM','SEASON'], inplace=True)
+
+        names = list(roster.iloc[0:7,0].values)
+        Or = list(roster.iloc[0:7,1].values)
+        Dr = list(roster.iloc[0:7,2].values)
+        minutes = list(roster.iloc[0:7,4].values)
+        age = round(np.sum(roster.iloc[0:7,3].values)/8,1)
+        games.loc[i,'age'] = age
+
+
+        onames = list(oroster.iloc[0:7,0].values)
+        oOr = list(oroster.iloc[0:7,1].values)
+        oDr = list(oroster.iloc[0:7,2].values)
+        ominutes = list(oroster.iloc[0:7,4].values)
+        oage = round(np.sum(oroster.iloc[0:7,3].values)/8,1)
+        games.loc[i,'oppage'] = oage
+
+        for j,name in enumerate(names):
+            O = Or[j]
+            D = Dr[j]
+            minu = minutes[j]
+            games.loc[i,f'P{j+1}Or'] = O
+            games.loc[i,f'P{j+1}Dr'] = D
+            games.loc[i,f'P{j+1}MP'] = minu
+            games.loc[i,f'P{j+1}name'] = name
+        for x,oname in enumerate(onames):
+            oO = oOr[x]
+            oD = oDr[x]
+            ominu = ominutes[x]
+            games.loc[i,f'oppP{x+1}Or'] = oO
+            games.loc[i,f'oppP{x+1}Dr'] = oD
+            games.loc[i,f'oppP{x+1}MP'] = ominu
+            games.loc[i,f'oppP{x+1}name'] = oname
+
+    return games
+
+
+def main():
+    players = synthetic_players(2023)
+    stats = synthetic_stats(players, synthetic_raptor(players))
+    games = dc.compile_game_data(synthetic_schedule(2023))
+    mp = synthetic_minutes(players, '2023-01-15')
+
+    slate = games[games.date == games.date.iloc[len(games) // 2]].reset_index(drop=True)
+    for label, g in [('daily slate', slate), ('full season', games)]:
+        start = time.perf_counter()
+        old = legacy_build_games_plus_roster(g.copy(), mp, stats)
+        old_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        new = dc.build_games_plus_roster(g.copy(), mp, stats)
+        new_time = time.perf_counter() - start
+
+        pd.testing.assert_frame_equal(old, new)
+        print(f'{label} ({len(g)} rows): per-game loop {old_time:8.3f}s, pivot {new_time:6.3f}s  ({old_time / new_time:.0f}x)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,204 @@
+"""
+Offline benchmark suite for the compilers and model inference on a synthetic league, at three
+scales: one day's slate, one season and ten seasons
+
+    python benchmarks/bench_suite.py                       # run everything, save results
+    python benchmarks/bench_suite.py --scales day season   # skip the ten season runs
+    python benchmarks/bench_suite.py --only roster         # benchmarks whose name contains 'roster'
+
+Results are saved to benchmarks/results/{label}.json, the label being the git commit by default,
+and compared with the previous results file (or --baseline). Anything slower than the baseline by
+more than --threshold is flagged, and the exit status is 1 when --fail-on-regression is given
+"""
+
+import os
+import sys
+import json
+import time
+import pickle
+import platform
+import argparse
+import warnings
+import subprocess
+import datetime as dt
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules import DatasetCompilers as dc
+from modules import NBAtools as tl
+from modules.LineupScenarios import ScenarioEngine
+from modules import CompiledModels as cm
+from synthetic import synthetic_league
+
+warnings.filterwarnings('ignore')
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DIR = os.path.join(HERE, 'results')
+MODELS_DIR = os.path.join(os.path.dirname(HERE), 'data')
+
+SCALES = {'day': 1, 'season': 1, 'ten_seasons': 10}
+MODELS = {'log': 'logreg_model.sav', 'mlp': 'mlp_model.sav', 'rf': 'rf_model.sav'}
+
+
+def abbreviated(sched):
+    sched = sched.copy()
+    sched['szn_type'] = 'reg'
+    for col in ['away_team', 'home_team']:
+        sched[col] = sched[col].map(dc.ABV_DICT)
+    return sched
+
+
+def inputs(scale):
+    """
+    Builds the inputs of every benchmark at one scale. A day is the middle date of a season,
+    with the schedule up to that date as build_game_data sees it on the day
+    """
+
+    league = synthetic_league(SCALES[scale])
+    sched = league['sched']
+    daily = scale == 'day'
+    if daily:
+        day = sched.date.iloc[len(sched) // 2]
+        sched = sched[sched.date <= day].reset_index(drop=True)
+
+    games = dc.compile_game_data(sched)
+    stats = dc.build_full_stats(league['raptor'].copy(), league['players'].copy(), daily=daily)
+    if daily:
+        games = games[games.date == day].reset_index(drop=True)
+    roster = dc.build_games_plus_roster(games, league['minutes'], stats)
+    team_stats = league['team_stats']
+    data = dc.build_prediction_data(roster.copy(), team_stats.copy(), league['elo'].copy())
+    data = data[data.team.notna() & data.season.notna()].copy()
+    data[tl.PREDICTION_FEATURES] = data[tl.PREDICTION_FEATURES].fillna(0)
+    X = data[tl.PREDICTION_FEATURES]
+
+    return {'league': league, 'sched': sched, 'abv': abbreviated(sched), 'daily': daily, 'games': games,
+            'stats': stats, 'roster': roster, 'data': data, 'X': X}
+
+
+def compiled_score(X, compiled):
+    # every model from one float32 matrix, the conversion included
+    X = cm.as_matrix(X)
+    return [model.proba(X) for model in compiled]
+
+
+def benchmarks(data, models):
+    """
+    name -> (setup, run). setup makes fresh arguments for each repeat, outside the timing,
+    since some compilers modify the frames they're given
+    """
+
+    league = data['league']
+    cases = {
+        'team_features_all': (lambda: (data['abv'],), tl.team_features_all),
+        'compile_game_data': (lambda: (data['sched'],), dc.compile_game_data),
+        'build_full_stats': (lambda: (league['raptor'].copy(), league['players'].copy(), data['daily']),
+                             dc.build_full_stats),
+        'build_games_plus_roster': (lambda: (data['games'], league['minutes'], data['stats']),
+                                    dc.build_games_plus_roster),
+        'build_prediction_data': (lambda: (data['roster'].copy(), league['team_stats'].copy(), league['elo'].copy()),
+                                  dc.build_prediction_data),
+    }
+    for name, model in models.items():
+        cases[f'predict_proba_{name}'] = (lambda: (data['X'],), model.predict_proba)
+    compiled = [cm.compile_model(model) for model in models.values()]
+    cases['compiled_score'] = (lambda: (data['X'], compiled), compiled_score)
+    if data['daily']:
+        # a sensitivity table is for one slate, over a season every player would be out of all their games
+        cases['injury_table'] = (lambda: (ScenarioEngine(data['data'], estimators=models),), ScenarioEngine.injury_table)
+    return cases
+
+
+def measure(setup, run, min_time=0.5, max_repeats=25):
+
+    # one untimed call to warm caches, then repeat until min_time is spent
+    run(*setup())
+    times = []
+    while len(times) < max_repeats and (len(times) < 3 or sum(times) < min_time):
+        args = setup()
+        start = time.perf_counter()
+        run(*args)
+        times.append(time.perf_counter() - start)
+    return {'best': min(times), 'median': float(np.median(times)), 'repeats': len(times)}
+
+
+def label():
+    try:
+        sha = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=HERE, capture_output=True, text=True, check=True)
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=HERE,
+                               capture_output=True, text=True).stdout.strip()
+        return sha.stdout.strip() + ('-dirty' if dirty else '')
+    except (OSError, subprocess.CalledProcessError):
+        return dt.datetime.now().strftime('%Y%m%d-%H%M%S')
+
+
+def previous(path):
+    if not os.path.isdir(RESULTS_DIR):
+        return None
+    files = [os.path.join(RESULTS_DIR, f) for f in os.listdir(RESULTS_DIR) if f.endswith('.json')]
+    files = [f for f in files if os.path.abspath(f) != os.path.abspath(path)]
+    return max(files, key=os.path.getmtime) if files else None
+
+
+def main(argv=None):
+
+    p = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    p.add_argument('--scales', nargs='+', choices=list(SCALES), default=list(SCALES))
+    p.add_argument('--only', help='run only benchmarks whose name contains this')
+    p.add_argument('--label', help='name of the results file, the git commit by default')
+    p.add_argument('--baseline', help='results file to compare with, the previous one by default')
+    p.add_argument('--threshold', type=float, default=0.25, help='slowdown flagged as a regression (0.25 = 25%%)')
+    p.add_argument('--fail-on-regression', action='store_true')
+    p.add_argument('--no-save', action='store_true')
+    args = p.parse_args(argv)
+
+    models = {}
+    for name, file in MODELS.items():
+        with open(os.path.join(MODELS_DIR, file), 'rb') as f:
+            models[name] = pickle.load(f)
+
+    results = {}
+    for scale in args.scales:
+        start = time.perf_counter()
+        data = inputs(scale)
+        print(f'\n{scale}: {len(data["sched"])} scheduled games, {len(data["games"])} team-game rows '
+              f'(generated in {time.perf_counter() - start:.1f}s)')
+        for name, (setup, run) in benchmarks(data, models).items():
+            if args.only and args.only not in name:
+                continue
+            r = measure(setup, run)
+            results[f'{name}/{scale}'] = r
+            print(f'  {name:<26} {r["best"] * 1000:10.2f} ms  (median {r["median"] * 1000:.2f} ms, {r["repeats"]} runs)')
+
+    path = os.path.join(RESULTS_DIR, f'{args.label or label()}.json')
+    base_path = args.baseline or previous(path)
+    regressions = []
+    if base_path:
+        with open(base_path) as f:
+            base = json.load(f)['results']
+        print(f'\ncompared with {os.path.relpath(base_path)}:')
+        for key, r in results.items():
+            if key not in base:
+                continue
+            change = r['best'] / base[key]['best'] - 1
+            flag = '  REGRESSION' if change > args.threshold else ''
+            if flag:
+                regressions.append(key)
+            print(f'  {key:<38} {base[key]["best"] * 1000:10.2f} -> {r["best"] * 1000:10.2f} ms  {change:+7.1%}{flag}')
+
+    if not args.no_save:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        record = {'label': os.path.basename(path)[:-5], 'created': dt.datetime.now().isoformat(timespec='seconds'),
+                  'python': platform.python_version(), 'numpy': np.__version__, 'pandas': pd.__version__,
+                  'machine': platform.machine(), 'cpus': os.cpu_count(), 'results': results}
+        with open(path, 'w') as f:
+            json.dump(record, f, indent=1)
+        print(f'\nsaved {os.path.relpath(path)}')
+
+    return 1 if regressions and args.fail_on_regression else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
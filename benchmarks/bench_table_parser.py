@@ -0,0 +1,95 @@
+"""
+Per-page parse cost of the old BeautifulSoup + read_html(str(table)) path against
+TableParser.read_tables, on saved basketball-reference team pages. Every table is also checked
+to match read_html both ways TableParser can type it: with pandas' TextParser, and through
+pd.read_html, its fallback for pandas versions where TextParser can't be used
+
+    python benchmarks/bench_table_parser.py [page.html ...]
+
+With no arguments, team pages already in the PREDICT_NBA response cache are used, and
+synthetic pages from benchmarks/synthetic.py when the cache has none. Run it on saved pages
+after upgrading pandas
+"""
+
+import os
+import sys
+import time
+import sqlite3
+import pandas as pd
+from bs4 import BeautifulSoup, Comment
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules import TableParser as tp
+from modules import WebCache
+from synthetic import synthetic_players, synthetic_team_page, TEAM_NAMES
+
+IDS = ['per_game', 'advanced', 'team_misc']
+
+
+def legacy_parse(content):
+    soup = BeautifulSoup(content, 'html.parser')
+    tables = {}
+    for stat in ['per_game', 'advanced']:
+        tables[stat] = pd.read_html(str(soup.find('table', {"id": stat})))[0]
+    team_soup = BeautifulSoup("\n".join(soup.find_all(string=Comment)), "lxml")
+    tables['team_misc'] = pd.read_html(str(team_soup.select_one("table#team_misc")))[0]
+    return tables
+
+
+def cached_team_pages():
+    index = os.path.join(WebCache.CACHE_DIR, 'index.sqlite')
+    if not os.path.exists(index):
+        return []
+    con = sqlite3.connect(index)
+    rows = con.execute("SELECT url, digest FROM entries WHERE status = 200 AND url LIKE '%basketball-reference.com/teams/%/____.html'").fetchall()
+    con.close()
+    pages = []
+    for url, digest in rows:
+        with open(os.path.join(WebCache.CACHE_DIR, 'objects', digest[:2], digest), 'rb') as f:
+            pages.append((url, f.read()))
+    return pages
+
+
+def main():
+    if len(sys.argv) > 1:
+        pages = [(path, open(path, 'rb').read()) for path in sys.argv[1:]]
+    else:
+        pages = cached_team_pages()
+    if not pages:
+        players = synthetic_players(2023)
+        pages = [(team, synthetic_team_page(team, 2023, players)) for team in list(TEAM_NAMES)[:10]]
+        print('using synthetic team pages')
+
+    old_total = new_total = fallback_total = 0
+    text_parser = tp.USE_TEXT_PARSER
+    for name, content in pages:
+        start = time.perf_counter()
+        old = legacy_parse(content)
+        old_total += time.perf_counter() - start
+
+        start = time.perf_counter()
+        new = tp.read_tables(content, IDS)
+        new_total += time.perf_counter() - start
+
+        tp.USE_TEXT_PARSER = False
+        start = time.perf_counter()
+        fallback = tp.read_tables(content, IDS)
+        fallback_total += time.perf_counter() - start
+        tp.USE_TEXT_PARSER = text_parser
+
+        for table_id in IDS:
+            pd.testing.assert_frame_equal(old[table_id], new[table_id], obj=f'{name} {table_id}')
+            pd.testing.assert_frame_equal(old[table_id], fallback[table_id], obj=f'{name} {table_id} (read_html)')
+
+    n = len(pages)
+    size = sum(len(c) for _, c in pages) / n / 1024
+    print(f'parity ok on {n} pages, {size:.0f} KB average, pandas {pd.__version__}'
+          f'{"" if text_parser else " (TextParser unavailable, both use read_html)"}')
+    print(f'bs4 + read_html:      {old_total / n * 1000:8.1f} ms/page')
+    print(f'lxml read_tables:     {new_total / n * 1000:8.1f} ms/page  ({old_total / new_total:.1f}x)')
+    print(f'  read_html fallback: {fallback_total / n * 1000:8.1f} ms/page  ({old_total / fallback_total:.1f}x)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+"""
+Parity check and timing for NBAtools.team_features_all against the original per-row loop
+
+    python benchmarks/bench_team_features.py
+"""
+
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules import NBAtools as tl
+from synthetic import synthetic_schedule
+
+
+def legacy_team_features(team, team_df):
+
+    df = team_df.copy()
+    df['team'] = team
+    df['opp'] = 0
+    df['team_pts'] = 0
+    df['opp_pts'] = 0
+    df['win'] = 0
+    df['home'] = 0
+    df['gp'] = 0
+    g = 0
+
+    for i in range(len(df)):
+
+        if df.loc[i, 'away_team'] == team:
+            df.loc[i, 'opp'] = df.loc[i, 'home_team']
+            df.loc[i, 'team_pts'] = df.loc[i, 'away_pts']
+            df.loc[i, 'opp_pts'] = df.loc[i, 'home_pts']
+            df.loc[i, 'home'] = 0
+
+        else:
+            df.loc[i, 'opp'] = df.loc[i, 'away_team']
+            df.loc[i, 'team_pts'] = df.loc[i, 'home_pts']
+            df.loc[i, 'opp_pts'] = df.loc[i, 'away_pts']
+            df.loc[i, 'home'] = 1
+
+        if df.loc[i, 'team_pts'] > df.loc[i, 'opp_pts']:
+            df.loc[i, 'win'] = 1
+
+        df.loc[i, 'gp'] = g
+        g += 1
+
+    cols = ['season', 'date', 'team', 'team_pts', 'opp', 'opp_pts', 'win', 'home', 'gp', 'szn_type']
+    df = df[cols]
+
+    teamDayOff = [0]
+    for i in range(1, len(df)):
+        days_off = (df.iloc[i, 1] - df.iloc[(i - 1), 1]).days
+        teamDayOff.append(days_off)
+
+    df['teamDayOff'] = teamDayOff
+
+    df['lastFive'] = (df['win'].rolling(min_periods=1, window=5).sum().shift().bfill()) / 5
+    df['lastTen'] = (df['win'].rolling(min_periods=1, window=10).sum().shift().bfill()) / 10
+    df['winp'] = df['win'].expanding(1).sum().shift()
+
+    for i in range(1, 5):
+        df.loc[i, 'lastFive'] = (df.loc[i, 'lastFive'] * 5) / i
+
+    for i in range(1, 10):
+        df.loc[i, 'lastTen'] = (df.loc[i, 'lastTen'] * 10) / i
+
+    for i in range(len(df)):
+        df.loc[i, 'winp'] = df.loc[i, 'winp'] / i
+
+    df.iloc[0, 11:] = 0
+
+    df = df.replace(np.nan, 0)
+
+    return df
+
+
+def legacy_all(sched):
+    df_list = []
+    for team in sched['away_team'].unique():
+        teamdf = sched[(sched.home_team == team) | (sched.away_team == team)]
+        teamdf.reset_index(drop=True, inplace=True)
+        df_list.append(legacy_team_features(team, teamdf))
+    return pd.concat(df_list, ignore_index=True)
+
+
+def main():
+    sched = synthetic_schedule(season=2023, full_names=False)
+    sched['szn_type'] = 'reg'
+
+    start = time.perf_counter()
+    old = legacy_all(sched)
+    old_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    new = tl.team_features_all(sched)
+    new_time = time.perf_counter() - start
+
+    pd.testing.assert_frame_equal(old, new)
+    print(f'parity ok: {len(new)} team-game rows, {len(new.columns)} columns')
+    print(f'per-team loop: {old_time:8.3f}s')
+    print(f'vectorized:    {new_time:8.3f}s  ({old_time / new_time:.0f}x)')
+
+
+if __name__ == '__main__':
+    main()
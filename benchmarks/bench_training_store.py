@@ -0,0 +1,96 @@
+"""
+Timing of the TrainingStore append + memory mapped load used by retrain_model against the
+original read TrainingData.csv / concat / rewrite / re-select path, on a training table the
+size of the shipped one (~24,000 rows, ~150 columns)
+
+    python benchmarks/bench_training_store.py
+"""
+
+import os
+import sys
+import time
+import tempfile
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules import NBAtools as tl
+from modules import TrainingStore as ts
+
+
+def synthetic_training(n, seed=0, extra=130, start='2013-10-29'):
+    rng = np.random.default_rng(seed)
+    # 12 rows a day, each a different team, as the store keeps one row per (date, team, opp)
+    dates = pd.Timestamp(start) + pd.to_timedelta(np.arange(n) // 12, unit='D')
+    keys = pd.DataFrame({'date': dates.strftime('%Y-%m-%d'), 'team': [f'T{i % 12:02d}' for i in range(n)], 'opp': 'OPP',
+                         'win': rng.integers(0, 2, n)})
+    features = pd.DataFrame(rng.normal(size=(n, len(tl.PREDICTION_FEATURES))).round(4), columns=tl.PREDICTION_FEATURES)
+    filler = pd.DataFrame(rng.normal(size=(n, extra)).round(2), columns=[f'extra{i}' for i in range(extra)])
+    return pd.concat([keys, features, filler], axis=1)
+
+
+def legacy_retrain_data(csv_path, new_rows):
+    train = pd.read_csv(csv_path)
+    df = pd.concat([train, new_rows], ignore_index=True)
+    df.to_csv(csv_path, index=False)
+    df = df[['win'] + tl.PREDICTION_FEATURES]
+    X = df.loc[:, df.columns[np.where(df.columns != 'win')]]
+    y = df.loc[:, 'win']
+    return X, y
+
+
+def store_retrain_data(new_rows):
+    ts.append(new_rows)
+    X, y = ts.load()
+    return pd.DataFrame(X, columns=tl.PREDICTION_FEATURES, copy=False), y
+
+
+def main():
+    base = synthetic_training(24000)
+    new_rows = synthetic_training(20, seed=1, start='2030-10-20')
+
+    with tempfile.TemporaryDirectory() as tmp:
+        ts.STORE_DIR = os.path.join(tmp, 'TRAINING')
+        ts.CSV_PATH = os.path.join(tmp, 'TrainingData.csv')
+        base.to_csv(ts.CSV_PATH, index=False)
+        legacy_csv = os.path.join(tmp, 'Legacy.csv')
+        base.to_csv(legacy_csv, index=False)
+
+        start = time.perf_counter()
+        ts.load()
+        import_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        X_old, y_old = legacy_retrain_data(legacy_csv, new_rows)
+        old_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        X_new, y_new = store_retrain_data(new_rows)
+        new_time = time.perf_counter() - start
+
+        np.testing.assert_allclose(X_old.to_numpy(), X_new.to_numpy())
+        np.testing.assert_array_equal(y_old.to_numpy(), y_new)
+
+        ts.compact()
+        loads = 50
+        start = time.perf_counter()
+        for _ in range(loads):
+            pd.read_csv(legacy_csv)[tl.PREDICTION_FEATURES + ['win']]
+        csv_load = (time.perf_counter() - start) / loads
+        start = time.perf_counter()
+        for _ in range(loads):
+            X, y = ts.load()
+            X.sum()
+        mmap_load = (time.perf_counter() - start) / loads
+
+    print(f'{len(X_new)} training rows, features and target match')
+    print(f'one-off csv import into the store: {import_time * 1000:8.1f} ms')
+    print(f'retrain data, csv rewrite:         {old_time * 1000:8.1f} ms')
+    print(f'retrain data, store append + mmap: {new_time * 1000:8.1f} ms  ({old_time / new_time:.0f}x)')
+    print(f'backtest load, csv parse:          {csv_load * 1000:8.1f} ms')
+    print(f'backtest load, mmap + full scan:   {mmap_load * 1000:8.1f} ms  ({csv_load / mmap_load:.0f}x)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,519 @@
+"""
+Local stand-in for every site the scrapers read: basketball-reference schedule, team, games and
+box score pages, 538's RAPTOR csvs and the lineups.com minutes feed. Pages recorded under --root
+are served first, anything else is generated from the synthetic league, anchored so that today
+is part-way through a season with games on the slate
+
+    python benchmarks/replay_server.py                                # synthetic site on port 8765
+    python benchmarks/replay_server.py --root ~/recorded              # recorded pages first
+    python benchmarks/replay_server.py --latency 0.08 --jitter 0.04 --rate www.basketball-reference.com=0.33
+    python benchmarks/replay_server.py --export ~/recorded            # write the response cache out as pages
+
+Point the package at it with NBAPREDICT_BASE_URL=http://127.0.0.1:8765 or WebCache.set_base_url, and
+read the minutes feed with NBAPREDICT_MINUTES_URL=https://api.lineups.com/nba/fetch/minutes. Requests arrive as /{host}/{path}, see WebCache.source_url
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import zlib
+import random
+import argparse
+import threading
+import unicodedata
+import datetime as dt
+from urllib.parse import urlsplit
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import numpy as np
+import pandas as pd
+
+from synthetic import TEAM_NAMES, _table, synthetic_schedule, synthetic_players, synthetic_raptor, synthetic_team_page
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+BOX_COLS = ['Starters', 'MP', 'FG', 'FGA', 'FG%', '3P', '3PA', '3P%', 'FT', 'FTA', 'FT%', 'ORB', 'DRB', 'TRB', 'AST',
+            'STL', 'BLK', 'TOV', 'PF', 'PTS', '+/-']
+SCHEDULE_COLS = ['Date', 'Start (ET)', 'Visitor/Neutral', 'PTS', 'Home/Neutral', 'PTS', '', '', 'Attend.', 'Arena', 'Notes']
+GAMES_COLS = ['G', 'Date', 'Start (ET)', '', '', '', 'Opponent', '', '', 'Tm', 'Opp', 'W', 'L', 'Streak', 'Notes']
+RAPTOR_COLS = ['player_name', 'player_id', 'season', 'poss', 'mp', 'raptor_offense', 'raptor_defense', 'raptor_total']
+
+# lineups.com abbreviations, undone by DailyScrape.get_projected_minutes
+LINEUPS_TEAMS = {'BRK': 'BKN', 'CHO': 'CHA', 'NOP': 'NO', 'NYK': 'NY', 'SAS': 'SA', 'GSW': 'GS'}
+
+CONTENT_TYPES = {'.html': 'text/html; charset=utf-8', '.csv': 'text/csv; charset=utf-8', '.json': 'application/json'}
+
+
+def season_of(date):
+    return date.year + 1 if date.month > 7 else date.year
+
+
+def _ascii(name):
+    return unicodedata.normalize('NFKD', name).encode('ascii', 'ignore').decode()
+
+
+def _date_label(date):
+    return f'{date:%a}, {date:%b} {date.day}, {date.year}'
+
+
+class SyntheticSite(object):
+
+    """
+    Renders the pages the scrapers request from the synthetic league. Every season is generated
+    on first use and kept, and the same request always gets the same bytes back
+    """
+
+    def __init__(self, today=None, seed=0, lead_days=30, history=4, filler=600):
+        """
+        Args:
+            today: Date the slate is generated for, today when None
+            seed: Random seed of the league
+            lead_days: Days of the current season played before today
+            history: Past seasons in 538's modern RAPTOR file
+            filler: Filler blocks per team page, see synthetic_team_page
+        """
+
+        self.today = today or dt.date.today()
+        self.season = season_of(self.today)
+        self.seed = seed
+        self.lead_days = lead_days
+        self.history = history
+        self.filler = filler
+        self._memo = {}
+        self._lock = threading.Lock()
+        self.routes = [
+            (r'www\.basketball-reference\.com/leagues/NBA_(\d{4})_games-([a-z]+)(?:-\d{4})?\.html', self.schedule_page),
+            (r'www\.basketball-reference\.com/teams/([A-Z]{3})/(\d{4})\.html', self.team_page),
+            (r'www\.basketball-reference\.com/teams/([A-Z]{3})/(\d{4})_games\.html', self.games_page),
+            (r'www\.basketball-reference\.com/boxscores/(\d{8})0([A-Z]{3})\.html', self.box_score),
+            (r'raw\.githubusercontent\.com/fivethirtyeight/data/master/nba-raptor/modern_RAPTOR_by_team\.csv',
+             self.modern_raptor),
+            (r'projects\.fivethirtyeight\.com/nba-model/(\d{4})/latest_RAPTOR_by_(team|player)\.csv', self.latest_raptor),
+            (r'api\.lineups\.com/nba/fetch/minutes', self.minutes),
+        ]
+
+    def _cached(self, key, build):
+        with self._lock:
+            if key in self._memo:
+                return self._memo[key]
+        value = build()
+        with self._lock:
+            return self._memo.setdefault(key, value)
+
+    def _rng(self, *key):
+        return np.random.default_rng(zlib.crc32(repr((self.seed,) + key).encode()))
+
+    def schedule(self, season):
+        """
+        Schedule of a season with abbreviations and dt.date dates. The current season is shifted
+        so it started lead_days before today; games from today on have no score yet
+
+        Args:
+            season: Season label
+
+        Returns:
+            df: season, date, away_team, away_pts, home_team, home_pts, played
+        """
+
+        def build():
+            df = synthetic_schedule(season, self.seed, full_names=False)
+            if season == self.season:
+                df['date'] += pd.Timestamp(self.today - dt.timedelta(days=self.lead_days)) - df.date.min()
+            df['date'] = df['date'].dt.date
+            df['played'] = df['date'] < self.today
+            return df
+
+        return self._cached(('schedule', season), build)
+
+    def players(self, season):
+        return self._cached(('players', season), lambda: synthetic_players(season, self.seed))
+
+    def raptor(self, season):
+        """
+        538's RAPTOR for a season, with 538's accent-stripped names and abbreviations
+        """
+
+        def build():
+            df = synthetic_raptor(self.players(season), self.seed + season)
+            df['player_name'] = [_ascii(p) for p in df.PLAYER]
+            df['player_id'] = [re.sub(r'[^a-z]', '', p.lower())[:7] + '01' for p in df.player_name]
+            df['season'] = season
+            df['season_type'] = 'RS'
+            df['team'] = df.TEAM.replace({'BRK': 'BKN', 'CHO': 'CHA'})
+            df['poss'] = (df.MP * 2.1).astype('int')
+            df['mp'] = df.MP
+            return df
+
+        return self._cached(('raptor', season), build)
+
+    def respond(self, host, path):
+        """
+        Renders the page for a request
+
+        Args:
+            host: Original host, e.g. 'www.basketball-reference.com'
+            path: Path without the query string
+
+        Returns:
+            status: Http status
+            body: Bytes
+        """
+
+        target = f'{host}{path}'
+        for pattern, handler in self.routes:
+            m = re.fullmatch(pattern, target)
+            if m:
+                body = self._cached(target, lambda: handler(*m.groups()))
+                return (404, b'Page Not Found') if body is None else (200, body)
+        return 404, b'Page Not Found'
+
+    def schedule_page(self, season, month):
+        sched = self.schedule(int(season))
+        rng = self._rng('schedule', season, month)
+        rows = []
+        for g in sched.itertuples(index=False):
+            if f'{g.date:%B}'.lower() != month:
+                continue
+            away_pts, home_pts = (g.away_pts, g.home_pts) if g.played else ('', '')
+            rows.append([_date_label(g.date), '7:30p', TEAM_NAMES[g.away_team], away_pts, TEAM_NAMES[g.home_team],
+                         home_pts, 'Box Score' if g.played else '', '', f'{int(rng.integers(12000, 21000)):,}',
+                         f'{TEAM_NAMES[g.home_team].split()[-1]} Arena', ''])
+        if not rows:
+            return None
+        return self._page(f'{season} NBA Schedule', _table('schedule', [SCHEDULE_COLS], rows))
+
+    def team_page(self, team, season):
+        season = int(season)
+        if team not in TEAM_NAMES:
+            return None
+        # HistoryBuilder reads the PTS/G header older seasons' pages have, the daily scrape reads PTS
+        pts = 'PTS' if season >= self.season else 'PTS/G'
+        return synthetic_team_page(team, season, self.players(season), self.seed, self.filler, pts_header=pts)
+
+    def games_page(self, team, season):
+        sched = self.schedule(int(season))
+        games = sched[(sched.home_team == team) | (sched.away_team == team)]
+        rows, wins = [], 0
+        for k, g in enumerate(games.itertuples(index=False)):
+            if k and k % 20 == 0:
+                rows.append(GAMES_COLS)
+            home = g.home_team == team
+            tm, opp = (g.home_pts, g.away_pts) if home else (g.away_pts, g.home_pts)
+            result = ''
+            if g.played:
+                result = 'W' if tm > opp else 'L'
+                wins += result == 'W'
+            rows.append([k + 1, _date_label(g.date), '7:30p', '', 'Box Score' if g.played else '', '' if home else '@',
+                         TEAM_NAMES[g.away_team if home else g.home_team], result, '', tm if g.played else '',
+                         opp if g.played else '', wins if g.played else '', k + 1 - wins if g.played else '', '', ''])
+        return self._page(f'{season} {TEAM_NAMES[team]} Schedule', _table('games', [GAMES_COLS], rows))
+
+    def box_score(self, date, home):
+        date = dt.datetime.strptime(date, '%Y%m%d').date()
+        sched = self.schedule(season_of(date))
+        game = sched[(sched.date == date) & (sched.home_team == home) & sched.played]
+        if game.empty:
+            return None
+        game = game.iloc[0]
+        season = season_of(date)
+        players = self.players(season)
+        rng = self._rng('box', str(date), home)
+
+        tables = []
+        for team, pts in [(game.away_team, game.away_pts), (game.home_team, game.home_pts)]:
+            roster = players[players.TEAM == team].reset_index(drop=True)
+            minutes = np.clip(roster.MPG.to_numpy() + rng.normal(0, 4, len(roster)), 0, 44)
+            rows = []
+            for k, (name, mins) in enumerate(zip(roster.PLAYER, minutes)):
+                if k == 5:
+                    rows.append(['Reserves'] + BOX_COLS[1:])
+                if k >= len(roster) - 2:
+                    rows.append([name, ('Did Not Play', len(BOX_COLS) - 1)])
+                    continue
+                fga = int(rng.integers(0, 20))
+                fg = int(rng.integers(0, fga + 1))
+                rows.append([name, f'{int(mins)}:{int(rng.integers(0, 60)):02d}', fg, fga, round(fg / fga, 3) if fga else '']
+                            + [int(x) for x in rng.integers(0, 8, 15)] + [f'{int(rng.integers(-15, 16)):+d}'])
+            totals = ['Team Totals', '240'] + [''] * (len(BOX_COLS) - 4) + [int(pts), '']
+            over_header = [('', 1), ('Basic Box Score Stats', len(BOX_COLS) - 1)]
+            tables.append(_table(f'box-{team}-game-basic', [over_header, BOX_COLS], rows, [totals]))
+
+        return self._page(f'{TEAM_NAMES[game.away_team]} vs {TEAM_NAMES[home]} Box Score', ''.join(tables))
+
+    def modern_raptor(self):
+        seasons = range(self.season - self.history, self.season)
+        return self._csv(pd.concat([self.raptor(s) for s in seasons], ignore_index=True),
+                         RAPTOR_COLS[:3] + ['season_type', 'team'] + RAPTOR_COLS[3:])
+
+    def latest_raptor(self, season, by):
+        season = int(season)
+        if season > self.season:
+            return None
+        if by == 'team':
+            return self._csv(self.raptor(season), RAPTOR_COLS[:3] + ['season_type', 'team'] + RAPTOR_COLS[3:])
+        # one row per player, the by-player file has no team column
+        return self._csv(self.raptor(season).drop_duplicates('player_name'), RAPTOR_COLS)
+
+    def minutes(self):
+        sched = self.schedule(self.season)
+        today = sched[sched.date == self.today]
+        teams = set(today.home_team) | set(today.away_team)
+        players = self.players(self.season)
+        players = players[players.TEAM.isin(teams)]
+        rng = self._rng('minutes', str(self.today))
+        projected = np.clip(players.MPG.to_numpy() + rng.normal(0, 3, len(players)), 0, 42).astype('int')
+        records = [{'name': p, 'team': LINEUPS_TEAMS.get(t, t), 'position': 'G', 'projected_minutes': int(m)}
+                   for p, t, m in zip(players.PLAYER, players.TEAM, projected)]
+        return json.dumps({'data': records}).encode('utf-8')
+
+    @staticmethod
+    def _page(title, body):
+        return (f'<!DOCTYPE html><html lang="en"><head><meta charset="utf-8"><title>{title}</title></head>'
+                f'<body><div id="wrap">\n{body}</div></body></html>').encode('utf-8')
+
+    @staticmethod
+    def _csv(df, cols):
+        return df[cols].to_csv(index=False).encode('utf-8')
+
+
+class HostLimiter(object):
+
+    """
+    Server side token bucket per host. A request without a token gets a 429, the way
+    basketball-reference answers clients going over its limit. slack is the fraction of a token
+    let off, so a client keeping to the same rate by its own clock isn't turned away
+    """
+
+    def __init__(self, rates, slack=0.05):
+        self.rates = dict(rates or {})
+        self.slack = slack
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def allow(self, host):
+        if host not in self.rates:
+            return True
+        rate, capacity = self.rates[host]
+        now = time.monotonic()
+        with self.lock:
+            tokens, last = self.buckets.get(host, (capacity, now))
+            tokens = min(capacity, tokens + (now - last) * rate)
+            allowed = tokens >= 1 - self.slack
+            self.buckets[host] = (tokens - 1 if allowed else tokens, now)
+        return allowed
+
+
+class _Handler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.server.replay.handle(self)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ReplayServer(object):
+
+    """
+    Threaded http server on localhost answering /{host}/{path} from recorded files or a SyntheticSite,
+    with optional added latency and per-host rate limits. Runs in a background thread:
+
+        with ReplayServer(latency=0.05) as server:
+            WebCache.set_base_url(server.url)
+            ...
+    """
+
+    def __init__(self, site=None, root=None, port=0, latency=0.0, jitter=0.0, rates=None, seed=0):
+        """
+        Args:
+            site: SyntheticSite answering requests with no recorded file, a new one when None
+            root: Directory of recorded responses laid out as {root}/{host}/{path}, see export_cache
+            port: Port to listen on, any free port when 0
+            latency: Seconds added before every response
+            jitter: Up to this many more seconds, drawn uniformly per request
+            rates: Dict of host -> (requests per second, burst) enforced with 429s
+            seed: Seed of the jitter
+        """
+
+        self.site = site or SyntheticSite()
+        self.root = root
+        self.port = port
+        self.latency = latency
+        self.jitter = jitter
+        self.limiter = HostLimiter(rates)
+        self._random = random.Random(seed)
+        self._stats_lock = threading.Lock()
+        self.httpd = None
+        self.thread = None
+        self.reset_stats()
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.httpd.server_address[1]}'
+
+    def start(self):
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', self.port), _Handler)
+        self.httpd.daemon_threads = True
+        self.httpd.replay = self
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name='replay-server', daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        if self.httpd is not None:
+            self.httpd.shutdown()
+            self.httpd.server_close()
+            self.thread.join()
+            self.httpd = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def reset_stats(self):
+        with self._stats_lock:
+            self._stats = {}
+
+    def stats(self):
+        """
+        Requests answered per host since the last reset_stats
+
+        Returns:
+            stats: Dict of host -> {'requests', 'bytes', 'not_found', 'throttled', 'recorded'}
+        """
+
+        with self._stats_lock:
+            return {host: dict(s) for host, s in self._stats.items()}
+
+    def _count(self, host, status, nbytes, recorded):
+        with self._stats_lock:
+            s = self._stats.setdefault(host, {'requests': 0, 'bytes': 0, 'not_found': 0, 'throttled': 0, 'recorded': 0})
+            s['requests'] += 1
+            s['bytes'] += nbytes
+            s['not_found'] += status == 404
+            s['throttled'] += status == 429
+            s['recorded'] += recorded
+
+    def _recorded(self, host, path):
+        if self.root is None:
+            return None
+        file = os.path.realpath(os.path.join(self.root, host, path.lstrip('/')))
+        if not file.startswith(os.path.realpath(self.root) + os.sep) or not os.path.isfile(file):
+            return None
+        with open(file, 'rb') as f:
+            return f.read()
+
+    def handle(self, request):
+
+        _, host, path = (urlsplit(request.path).path.split('/', 2) + ['', ''])[:3]
+        path = '/' + path
+        allowed = self.limiter.allow(host)
+        if self.latency or self.jitter:
+            with self._stats_lock:
+                delay = self.latency + self._random.uniform(0, self.jitter)
+            time.sleep(delay)
+
+        recorded = False
+        if not allowed:
+            status, body = 429, b'Too Many Requests'
+        else:
+            body = self._recorded(host, path)
+            recorded = body is not None
+            status, body = (200, body) if recorded else self.site.respond(host, path)
+        self._count(host, status, len(body), recorded)
+
+        request.send_response(status)
+        request.send_header('Content-Type', CONTENT_TYPES.get(os.path.splitext(path)[1], 'application/octet-stream'))
+        request.send_header('Content-Length', str(len(body)))
+        if status == 429:
+            request.send_header('Retry-After', '3600')
+        request.end_headers()
+        request.wfile.write(body)
+
+
+def export_cache(root, hosts=None):
+    """
+    Writes every successful response in the package's response cache out as {root}/{host}/{path},
+    the layout ReplayServer serves recorded pages from. Responses cached from a replay server are
+    written under the host they stood in for
+
+    Args:
+        root: Directory to write to
+        hosts: Only export these hosts, all when None
+
+    Returns:
+        count: Number of files written
+    """
+
+    sys.path.insert(0, os.path.dirname(HERE))
+    from modules import WebCache as wc
+
+    with wc._connect() as con:
+        entries = con.execute('SELECT url, digest FROM entries WHERE status = 200').fetchall()
+
+    count = 0
+    for url, digest in entries:
+        parts = urlsplit(url)
+        host, path = parts.netloc, parts.path
+        replayed = url.startswith(f'{wc.BASE_URL}/') if wc.BASE_URL else parts.hostname in ('127.0.0.1', 'localhost')
+        if replayed:
+            _, host, path = (parts.path.split('/', 2) + ['', ''])[:3]
+            path = '/' + path
+        if (hosts and host not in hosts) or path.endswith('/'):
+            continue
+        content = wc._read_object(digest)
+        if content is None:
+            continue
+        file = os.path.join(root, host, path.lstrip('/'))
+        os.makedirs(os.path.dirname(file), exist_ok=True)
+        with open(file, 'wb') as f:
+            f.write(content)
+        count += 1
+
+    return count
+
+
+def main(argv=None):
+
+    p = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    p.add_argument('--port', type=int, default=8765)
+    p.add_argument('--root', help='directory of recorded responses, {root}/{host}/{path}')
+    p.add_argument('--today', help='date the synthetic slate is for, YYYY-MM-DD, today by default')
+    p.add_argument('--seed', type=int, default=0)
+    p.add_argument('--latency', type=float, default=0.0, help='seconds added to every response')
+    p.add_argument('--jitter', type=float, default=0.0, help='up to this many more seconds per response')
+    p.add_argument('--rate', action='append', default=[], metavar='HOST=PER_SECOND[/BURST]',
+                   help='answer requests to HOST beyond this rate with 429s, repeatable')
+    p.add_argument('--export', metavar='DIR', help='write the response cache out to DIR and exit')
+    args = p.parse_args(argv)
+
+    if args.export:
+        print(f'wrote {export_cache(args.export)} responses to {args.export}')
+        return 0
+
+    rates = {}
+    for spec in args.rate:
+        host, _, rate = spec.partition('=')
+        rate, _, burst = rate.partition('/')
+        rates[host] = (float(rate), int(burst or 1))
+
+    today = dt.date.fromisoformat(args.today) if args.today else None
+    server = ReplayServer(SyntheticSite(today, args.seed), args.root, args.port, args.latency, args.jitter, rates,
+                          args.seed).start()
+    print(f'serving on {server.url}, set NBAPREDICT_BASE_URL={server.url}')
+    try:
+        server.thread.join()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
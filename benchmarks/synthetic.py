@@ -0,0 +1,330 @@
+"""
+Deterministic synthetic league data for the offline benchmarks. Nothing here touches
+the network, so the benchmarks can be run anywhere and compared between versions.
+"""
+
+import numpy as np
+import pandas as pd
+import datetime as dt
+
+
+TEAM_NAMES = {'ATL': 'Atlanta Hawks', 'BOS': 'Boston Celtics', 'BRK': 'Brooklyn Nets', 'CHI': 'Chicago Bulls',
+              'CHO': 'Charlotte Hornets', 'CLE': 'Cleveland Cavaliers', 'DAL': 'Dallas Mavericks',
+              'DEN': 'Denver Nuggets', 'DET': 'Detroit Pistons', 'GSW': 'Golden State Warriors',
+              'HOU': 'Houston Rockets', 'IND': 'Indiana Pacers', 'LAC': 'Los Angeles Clippers',
+              'LAL': 'Los Angeles Lakers', 'MEM': 'Memphis Grizzlies', 'MIA': 'Miami Heat', 'MIL': 'Milwaukee Bucks',
+              'MIN': 'Minnesota Timberwolves', 'NOP': 'New Orleans Pelicans', 'NYK': 'New York Knicks',
+              'OKC': 'Oklahoma City Thunder', 'ORL': 'Orlando Magic', 'PHI': 'Philadelphia 76ers', 'PHO': 'Phoenix Suns',
+              'POR': 'Portland Trail Blazers', 'SAC': 'Sacramento Kings', 'SAS': 'San Antonio Spurs',
+              'TOR': 'Toronto Raptors', 'UTA': 'Utah Jazz', 'WAS': 'Washington Wizards'}
+
+
+def synthetic_schedule(season=2023, seed=0, games_per_team=82, full_names=True):
+    """
+    Builds a regular season schedule shaped like Scrapers.get_szn_schedule output
+
+    Args:
+        season: Season label, the schedule starts in October of season - 1
+        seed: Random seed
+        games_per_team: Games played by each team
+        full_names: Use full team names like the scraped schedule, otherwise abbreviations
+
+    Returns:
+        df: season, date, away_team, away_pts, home_team, home_pts
+    """
+
+    rng = np.random.default_rng(seed + season)
+    teams = np.array(list(TEAM_NAMES.keys()))
+    played = dict.fromkeys(teams, 0)
+    day = pd.Timestamp(dt.date(season - 1, 10, 18))
+
+    rows = []
+    while True:
+        open_teams = [t for t in rng.permutation(teams) if played[t] < games_per_team]
+        if len(open_teams) < 2:
+            break
+        n_games = min(len(open_teams) // 2, int(rng.integers(3, 12)))
+        for k in range(n_games):
+            away, home = open_teams[2 * k], open_teams[2 * k + 1]
+            away_pts, home_pts = rng.integers(85, 135, size=2)
+            if away_pts == home_pts:
+                home_pts += 1
+            rows.append([season, day, away, int(away_pts), home, int(home_pts)])
+            played[away] += 1
+            played[home] += 1
+        day += pd.Timedelta(days=1)
+
+    df = pd.DataFrame(rows, columns=['season', 'date', 'away_team', 'away_pts', 'home_team', 'home_pts'])
+    if full_names:
+        df['away_team'] = df['away_team'].map(TEAM_NAMES)
+        df['home_team'] = df['home_team'].map(TEAM_NAMES)
+
+    return df
+
+
+FIRST_NAMES = ['James', 'Luka', 'Nikola', 'Jayson', 'Kevin', 'Stephen', 'Anthony', 'Jimmy', 'Devin', 'Jalen',
+               'Tyrese', 'Darius', 'Domantas', 'Bojan', 'Dennis', 'Jusuf', 'Kristaps', 'Marcus', 'Trae', 'Zion',
+               'Shai', 'Bam', 'Cade', 'Evan', 'Franz', 'Gary', 'Herbert', 'Ivica', 'Jaren', 'Kelly']
+LAST_NAMES = ['Dončić', 'Jokić', 'Tatum', 'Durant', 'Curry', 'Davis', 'Butler', 'Booker', 'Brunson', 'Haliburton',
+              'Garland', 'Sabonis', 'Bogdanović', 'Schröder', 'Nurkić', 'Porziņģis', 'Smart', 'Young', 'Williamson',
+              'Gilgeous-Alexander', 'Adebayo', 'Cunningham', 'Mobley', 'Wagner', 'Trent', 'Jones', 'Zubac',
+              'Jackson', 'Oubre', 'Green']
+SUFFIXES = ['', '', '', '', '', '', ' Jr.', ' II', ' III', ' Sr.']
+
+PER_GAME_COLS = ['Rk', 'Player', 'Age', 'G', 'GS', 'MP', 'FG', 'FGA', 'FG%', '3P', '3PA', '3P%', '2P', '2PA', '2P%',
+                 'eFG%', 'FT', 'FTA', 'FT%', 'ORB', 'DRB', 'TRB', 'AST', 'STL', 'BLK', 'TOV', 'PF', 'PTS']
+ADVANCED_COLS = ['Rk', 'Player', 'Age', 'G', 'MP', 'PER', 'TS%', '3PAr', 'FTr', 'ORB%', 'DRB%', 'TRB%', 'AST%',
+                 'STL%', 'BLK%', 'TOV%', 'USG%', '', 'OWS', 'DWS', 'WS', 'WS/48', '', 'OBPM', 'DBPM', 'BPM', 'VORP']
+TEAM_MISC_COLS = ['', 'W', 'L', 'PW', 'PL', 'MOV', 'SOS', 'SRS', 'ORtg', 'DRtg', 'Pace', 'FTr', '3PAr', 'eFG%',
+                  'TOV%', 'ORB%', 'FT/FGA', 'eFG%', 'TOV%', 'DRB%', 'FT/FGA', 'Arena', 'Attendance']
+ROSTER_COLS = ['No.', 'Player', 'Pos', 'Ht', 'Wt', 'Birth Date', '', 'Exp', 'College']
+
+
+def synthetic_players(season=2023, seed=0, per_team=15):
+    """
+    Builds a league of rosters with per game and advanced stats shaped like DailyScrape.daily_stats output
+
+    Args:
+        season: Season label
+        seed: Random seed
+        per_team: Players on each roster
+
+    Returns:
+        df: SEASON, TEAM, PLAYER, AGE, G, GS, MPG, MP and the other per game / advanced columns
+    """
+
+    rng = np.random.default_rng(seed + 7 * season)
+    names = set()
+    rows = []
+    for team in TEAM_NAMES:
+        minutes = np.sort(rng.uniform(4, 38, size=per_team))[::-1]
+        for mpg in minutes:
+            name = None
+            while name is None or name in names:
+                name = f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}{rng.choice(SUFFIXES)}'
+            names.add(name)
+            g = int(rng.integers(10, 82))
+            row = {'SEASON': season, 'TEAM': team, 'PLAYER': name, 'AGE': int(rng.integers(19, 38)), 'G': g,
+                   'GS': int(rng.integers(0, g + 1)), 'MPG': round(float(mpg), 1), 'MP': int(mpg * g)}
+            for col in PER_GAME_COLS[6:] + ADVANCED_COLS[5:]:
+                if col and col not in row:
+                    row[col] = round(float(rng.uniform(0, 1 if '%' in col or col == 'WS/48' else 30)), 3)
+            rows.append(row)
+
+    return pd.DataFrame(rows)
+
+
+def synthetic_raptor(players, seed=0):
+    """
+    Builds RAPTOR ratings for every player, shaped like DailyScrape.daily_raptor output
+
+    Args:
+        players: Output of synthetic_players
+        seed: Random seed
+
+    Returns:
+        df: PLAYER, TEAM, SEASON, MP, raptor_offense, raptor_defense, raptor_total
+    """
+
+    rng = np.random.default_rng(seed + 1)
+    df = players[['PLAYER', 'TEAM', 'SEASON', 'MP']].copy()
+    df['raptor_offense'] = rng.normal(0, 2.5, len(df)).round(6)
+    df['raptor_defense'] = rng.normal(0, 2.0, len(df)).round(6)
+    df['raptor_total'] = df['raptor_offense'] + df['raptor_defense']
+
+    return df
+
+
+def _table(table_id, header_rows, body_rows, foot_rows=()):
+
+    def cells(row, first_tag='th'):
+        out = []
+        for k, cell in enumerate(row):
+            tag = first_tag if k == 0 else 'td'
+            attrs = ''
+            if isinstance(cell, tuple):
+                cell, span = cell
+                attrs = f' colspan="{span}"'
+            out.append(f'<{tag} class="center" data-stat="c{k}"{attrs}>{cell}</{tag}>')
+        return ''.join(out)
+
+    head = ''.join(f'<tr>{cells(r, "th").replace("<td", "<th").replace("</td>", "</th>")}</tr>' for r in header_rows)
+    body = ''.join(f'<tr>{cells(r)}</tr>' for r in body_rows)
+    foot = ''.join(f'<tr>{cells(r)}</tr>' for r in foot_rows)
+    tfoot = f'<tfoot>{foot}</tfoot>' if foot_rows else ''
+
+    return (f'<div class="table_container" id="div_{table_id}"><table class="sortable stats_table" id="{table_id}">'
+            f'<caption>{table_id}</caption><thead>{head}</thead><tbody>{body}</tbody>{tfoot}</table></div>\n')
+
+
+def _filler(rng, n):
+    words = ['season', 'roster', 'stats', 'basketball', 'reference', 'schedule', 'totals', 'playoffs', 'leaders']
+    return ''.join(f'<div class="filler"><p>{" ".join(rng.choice(words, 40))}</p><a href="/x/{i}.html">link</a></div>\n'
+                   for i in range(n))
+
+
+def synthetic_team_page(team, season=2023, players=None, seed=0, filler=600, pts_header='PTS'):
+    """
+    Renders a basketball-reference style team page. per_game, advanced and roster are plain
+    tables, team_misc and a few others are hidden inside html comments like on the real site
+
+    Args:
+        team: Team abbreviation
+        season: Season label
+        players: Output of synthetic_players, generated when None
+        seed: Random seed
+        filler: Number of filler blocks, to get the page size close to the real thing
+        pts_header: Header of the per_game points column, 'PTS/G' on the pages HistoryBuilder was written against
+
+    Returns:
+        page: Html as bytes
+    """
+
+    if players is None:
+        players = synthetic_players(season, seed)
+    rng = np.random.default_rng(seed)
+    roster = players[players.TEAM == team].reset_index(drop=True)
+
+    per_game = [[k + 1, f'<a href="/players/{k}.html">{r.PLAYER}</a>', r.AGE, r.G, r.GS, r.MPG]
+                + [r[c] for c in PER_GAME_COLS[6:]]
+                for k, (_, r) in enumerate(roster.iterrows())]
+    advanced = [[k + 1, r.PLAYER, r.AGE, r.G, r.MP] + [r[c] if c else '' for c in ADVANCED_COLS[5:]]
+                for k, (_, r) in enumerate(roster.iterrows())]
+    team_totals = ['', 'Team Totals', '', 82, '', 240.0] + [round(float(x), 1) for x in rng.uniform(0, 100, len(PER_GAME_COLS) - 6)]
+    misc = [['Team'] + [int(x) for x in rng.integers(20, 60, 4)] + [round(float(x), 2) for x in rng.normal(0, 3, 3)]
+            + [round(float(x), 1) for x in rng.uniform(105, 120, 3)] + [round(float(x), 3) for x in rng.uniform(0, 1, 10)]
+            + [f'{TEAM_NAMES[team].split()[-1]} Arena', f'{int(rng.integers(600000, 800000)):,}'],
+            ['Lg Rank'] + [int(x) for x in rng.integers(1, 31, 20)] + ['', int(rng.integers(1, 31))]]
+    roster_rows = [[int(rng.integers(0, 99)), r.PLAYER, 'G', '6-5', 200, 'March 3, 1998', 'us', 3, 'Duke']
+                   for _, r in roster.iterrows()]
+
+    over_header = [('', 1), ('', 11), ('Offense Four Factors', 4), ('Defense Four Factors', 4), ('', 2)]
+    hidden = ''.join(f'<div class="placeholder"></div><!--\n{_table(t, [["A", "B", "C"]], [[1, 2, 3]] * 40)}-->\n'
+                     for t in ['totals', 'per_minute', 'per_poss', 'shooting', 'pbp', 'salaries2'])
+
+    page = (f'<!DOCTYPE html><html lang="en"><head><meta charset="utf-8"><title>{season} {TEAM_NAMES[team]}</title>'
+            f'<script>var x = {{"a": 1}};</script></head><body><div id="wrap">\n{_filler(rng, filler // 2)}'
+            + _table('roster', [ROSTER_COLS], roster_rows)
+            + _table('per_game', [PER_GAME_COLS[:-1] + [pts_header]], per_game, [team_totals])
+            + f'<div class="placeholder"></div><!--\n{_table("team_misc", [over_header, TEAM_MISC_COLS], misc)}-->\n'
+            + _table('advanced', [ADVANCED_COLS], advanced)
+            + hidden + _filler(rng, filler // 2) + '</div></body></html>')
+
+    return page.encode('utf-8')
+
+
+def synthetic_minutes(players, date, seed=0):
+    """
+    Builds projected minutes for every rostered player, shaped like DailyScrape.get_projected_minutes output
+
+    Args:
+        players: Output of synthetic_players
+        date: Date the minutes are for
+        seed: Random seed
+
+    Returns:
+        df: DATE, TEAM, PLAYER, MP, SEASON
+    """
+
+    rng = np.random.default_rng(seed + 2)
+    df = players[['TEAM', 'PLAYER', 'SEASON']].copy()
+    df['DATE'] = str(date)
+    df['MP'] = np.clip(players['MPG'].to_numpy() + rng.normal(0, 3, len(df)), 0, 42).astype('int')
+    df = df[df.MP != 0].sort_values(by=['TEAM']).reset_index(drop=True)
+
+    return df[['DATE', 'TEAM', 'PLAYER', 'MP', 'SEASON']]
+
+
+def synthetic_stats(players, raptor):
+    """
+    Joins players and RAPTOR ratings the way DatasetCompilers.build_full_stats does
+
+    Args:
+        players: Output of synthetic_players
+        raptor: Output of synthetic_raptor
+
+    Returns:
+        df: SEASON, TEAM, PLAYER, AGE, G, GS, MPG, MP and raptor columns
+    """
+
+    df = players.merge(raptor[['PLAYER', 'raptor_offense', 'raptor_defense', 'raptor_total']], on='PLAYER', how='left')
+    cols = ['SEASON', 'TEAM', 'PLAYER', 'AGE', 'G', 'GS', 'MPG', 'MP', 'raptor_offense', 'raptor_defense', 'raptor_total']
+
+    return df[cols]
+
+
+def synthetic_team_stats(season=2023, seed=0):
+    """
+    Builds team ratings for every team, shaped like DailyScrape.daily_stats' team_stats
+
+    Args:
+        season: Season label
+        seed: Random seed
+
+    Returns:
+        df: TEAM, SEASON, ORtg, DRtg, PACE, eFG%, TOV%, ORB%, DRB%
+    """
+
+    rng = np.random.default_rng(seed + 3 * season)
+    n = len(TEAM_NAMES)
+    return pd.DataFrame({'TEAM': list(TEAM_NAMES), 'SEASON': season,
+                         'ORtg': rng.uniform(105, 120, n).round(1), 'DRtg': rng.uniform(105, 120, n).round(1),
+                         'PACE': rng.uniform(96, 104, n).round(1), 'eFG%': rng.uniform(0.5, 0.58, n).round(3),
+                         'TOV%': rng.uniform(10, 15, n).round(1), 'ORB%': rng.uniform(20, 30, n).round(1),
+                         'DRB%': rng.uniform(70, 80, n).round(1)})
+
+
+def synthetic_elo(sched):
+    """
+    Rates a synthetic schedule with EloEngine, shaped like EloEngine.elo_history output
+
+    Args:
+        sched: Output of synthetic_schedule, one or more seasons, with full team names
+
+    Returns:
+        df: date, team, opp, teamElo, oppElo
+    """
+
+    from modules import EloEngine
+    from modules import DatasetCompilers as dc
+
+    games = pd.DataFrame({'season': sched['season'], 'date': pd.to_datetime(sched['date']).dt.strftime('%Y-%m-%d'),
+                          'home': sched['home_team'].map(dc.ABV_DICT), 'away': sched['away_team'].map(dc.ABV_DICT),
+                          'home_pts': sched['home_pts'], 'away_pts': sched['away_pts']})
+    pre, _, _ = EloEngine.compute(games)
+    return EloEngine.team_rows(pre)
+
+
+def synthetic_league(seasons=1, first_season=2023, seed=0):
+    """
+    Builds every input of the prediction pipeline for one or more consecutive seasons. RAPTOR
+    names are accent-stripped, like 538's, so name matching has work to do
+
+    Args:
+        seasons: Number of seasons
+        first_season: Label of the first season
+        seed: Random seed
+
+    Returns:
+        league: Dict with sched, players, raptor, minutes, team_stats and elo DataFrames,
+                each covering every season
+    """
+
+    import unicodedata
+
+    parts = {'sched': [], 'players': [], 'raptor': [], 'minutes': [], 'team_stats': []}
+    for season in range(first_season, first_season + seasons):
+        players = synthetic_players(season, seed)
+        raptor = synthetic_raptor(players, seed + season)
+        raptor['PLAYER'] = [unicodedata.normalize('NFKD', p).encode('ascii', 'ignore').decode() for p in raptor.PLAYER]
+        sched = synthetic_schedule(season, seed)
+        parts['sched'].append(sched)
+        parts['players'].append(players)
+        parts['raptor'].append(raptor)
+        parts['minutes'].append(synthetic_minutes(players, sched.date.iloc[len(sched) // 2].date(), seed + season))
+        parts['team_stats'].append(synthetic_team_stats(season, seed))
+
+    league = {k: pd.concat(v, ignore_index=True) for k, v in parts.items()}
+    league['elo'] = synthetic_elo(league['sched'])
+
+    return league
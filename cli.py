@@ -0,0 +1,161 @@
+"""
+Command line entry point, installed as `nbapredict`
+
+    nbapredict predict [--models log mlp rf] [--replay YYYY-MM-DD | --as-of YYYY-MM-DD [--through YYYY-MM-DD]]
+    nbapredict retrain [--models log mlp rf] [--as-of YYYY-MM-DD]
+    nbapredict show [--date YYYY-MM-DD]
+    nbapredict serve [--models log mlp rf] [--host HOST] [--port PORT]
+
+Add --timings to print the time spent importing and in each stage. Each command imports only
+what it uses: `show` reads the prediction store with sqlite alone, so it starts quickly enough to
+call from cron or a shell script. `predict` imports pandas; requests, tqdm, selenium and sklearn
+wait until a page is fetched, the browser is started or a model is exported
+"""
+
+import sys
+import time
+import argparse
+import datetime as dt
+from contextlib import contextmanager
+from .modules import ModelRegistry as registry
+
+
+class Timings(object):
+
+    """
+    Records how long each stage of a command takes, printed with --timings
+    """
+
+    def __init__(self):
+        self.stages = []
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages.append((name, time.perf_counter() - start))
+
+    def report(self, out=sys.stderr):
+        width = max(len(name) for name, _ in self.stages)
+        for name, seconds in self.stages:
+            print(f'{name:<{width}}  {seconds:8.3f}s', file=out)
+        print(f'{"total":<{width}}  {sum(s for _, s in self.stages):8.3f}s', file=out)
+
+
+def predict(args, timings):
+
+    with timings.stage('import'):
+        from .predict import DailyReport
+    with timings.stage('build inputs'):
+        report = DailyReport(models=args.models, replay=args.replay, as_of=args.as_of, end=args.through)
+    with timings.stage('predict'):
+        report.get_predictions()
+    return 0
+
+
+def retrain(args, timings):
+
+    with timings.stage('import'):
+        from .modules import NBAtools as tl
+    with timings.stage('retrain'):
+        tl.retrain_model(models=args.models, as_of=args.as_of)
+    return 0
+
+
+def show(args, timings):
+
+    with timings.stage('import'):
+        from .modules import PredictionStore as store
+    with timings.stage('read'):
+        date = args.date or str(dt.date.today())
+        columns, rows = store.query('predictions', '"DATE" = ? AND "WIN" = 1', (date,))
+
+    if not rows:
+        print(f'No predictions stored for {date}')
+        return 1
+
+    # same layout as TodayPred.csv
+    probs = [(col, label) for _, col, label in registry.MODELS.values() if col in columns]
+    header = ['Date', 'Predicted Winner', 'Predicted Loser'] + [label for _, label in probs]
+    table = [header]
+    for row in rows:
+        row = dict(zip(columns, row))
+        table.append([row['DATE'], row['TEAM'], row['OPP']] +
+                     [f'{row[col]}%' if row[col] is not None else '' for col, _ in probs])
+
+    widths = [max(len(str(r[i])) for r in table) for i in range(len(header))]
+    for r in table:
+        print('  '.join(str(v).ljust(w) for v, w in zip(r, widths)).rstrip())
+    return 0
+
+
+def serve(args, timings):
+
+    with timings.stage('import'):
+        from .modules import PredictionService as service
+    service.serve(models=args.models, host=args.host, port=args.port)
+    return 0
+
+
+def parser():
+
+    models = dict(nargs='+', choices=list(registry.MODELS), default=None, metavar='MODEL',
+                  help=f'models to use, any of {", ".join(registry.MODELS)}. All three when omitted')
+
+    p = argparse.ArgumentParser(prog='nbapredict', description="Predict today's NBA games")
+    p.add_argument('--timings', action='store_true', help='print import and stage times to stderr')
+    sub = p.add_subparsers(dest='command', required=True)
+
+    p_predict = sub.add_parser('predict', help="scrape today's data and predict today's games")
+    p_predict.add_argument('--models', **models)
+    p_predict.add_argument('--replay', metavar='YYYY-MM-DD', help='predict a past day from its snapshots instead of scraping')
+    p_predict.add_argument('--as-of', metavar='YYYY-MM-DD', help='scrape and predict a past day instead of today')
+    p_predict.add_argument('--through', metavar='YYYY-MM-DD',
+                           help='predict every day from --as-of through this date in one batch')
+    p_predict.set_defaults(func=predict)
+
+    p_retrain = sub.add_parser('retrain', help='fill in finished games and retrain the models')
+    p_retrain.add_argument('--models', **models)
+    p_retrain.add_argument('--as-of', metavar='YYYY-MM-DD', help='date treated as today, today when omitted')
+    p_retrain.set_defaults(func=retrain)
+
+    p_show = sub.add_parser('show', help='print the stored predictions for a day')
+    p_show.add_argument('--date', metavar='YYYY-MM-DD', help='day to show, today when omitted')
+    p_show.set_defaults(func=show)
+
+    p_serve = sub.add_parser('serve', help="keep today's predictions in memory and serve them over local HTTP")
+    p_serve.add_argument('--models', **models)
+    p_serve.add_argument('--host', default='127.0.0.1', help='address to listen on, 127.0.0.1 by default')
+    p_serve.add_argument('--port', type=int, default=8766, help='port to listen on, 8766 by default')
+    p_serve.set_defaults(func=serve)
+
+    return p
+
+
+def main(argv=None):
+    """
+    Runs the nbapredict command
+
+    Args:
+        argv: Arguments, sys.argv[1:] when None
+
+    Returns:
+        code: Exit status
+    """
+
+    p = parser()
+    args = p.parse_args(argv)
+    if getattr(args, 'through', None) and not args.as_of:
+        p.error('--through needs --as-of')
+    timings = Timings()
+    try:
+        return args.func(args, timings)
+    finally:
+        if args.timings and timings.stages:
+            timings.report()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
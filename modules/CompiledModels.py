@@ -0,0 +1,343 @@
+"""
+NumPy-only inference for the shipped models. Each sklearn estimator is exported once to a .npz
+file of plain arrays next to its .sav file: the logistic regression as a coefficient vector, the
+MLP as its weight matrices and the random forest as flat arrays of its padded trees' nodes. Scoring
+from the exports doesn't import sklearn or unpickle anything, and the forest's arrays take a
+fraction of the memory of its pickled trees
+"""
+
+import os
+import abc
+import threading
+import numpy as np
+from . import ModelRegistry as registry
+
+
+# set NBAPREDICT_COMPILED=0 to predict with the sklearn estimators instead
+ENABLED = os.environ.get('NBAPREDICT_COMPILED', '1') != '0'
+
+# compiled models shared by every report in the process, keyed by name like ModelRegistry's
+_loaded = {}
+_lock = threading.Lock()
+
+# rows scored at a time by the forest, keeping the (trees, rows) node index arrays small enough to stay in cache
+FOREST_CHUNK = 256
+
+# trees are padded to 2 ** depth leaves, so much deeper forests aren't worth compiling
+MAX_FOREST_DEPTH = 16
+
+
+def _sigmoid(z):
+    return 1 / (1 + np.exp(-z))
+
+
+ACTIVATIONS = {'identity': lambda z: z,
+               'relu': lambda z: np.maximum(z, 0),
+               'tanh': np.tanh,
+               'logistic': _sigmoid}
+
+
+def as_matrix(X, features=None):
+    """
+    Purpose:
+        Converts features to the contiguous float32 matrix the compiled models score
+
+    Args:
+        X: DataFrame or array of the prediction features
+        features: Column order the models expect, checked against a DataFrame's columns
+    Returns:
+        X: float32 array
+    """
+
+    columns = getattr(X, 'columns', None)
+    if columns is not None and features is not None and list(columns) != list(features):
+        raise ValueError(f'Expected the features {list(features)}, got {list(columns)}')
+    if isinstance(X, np.ndarray) and X.dtype == np.float32 and X.flags.c_contiguous:
+        return X
+    return np.ascontiguousarray(np.asarray(X, dtype=np.float32))
+
+
+class CompiledModel(abc.ABC):
+
+    """
+    Base of the compiled models. predict_proba and predict take the same arguments and return
+    the same shapes as the sklearn estimators they were exported from
+    """
+
+    kind = None
+
+    def __init__(self, arrays):
+        self.arrays = arrays
+        # None when the model was fitted without column names, and DataFrame columns aren't checked
+        self.features = [str(f) for f in arrays['features']] or None
+
+    @abc.abstractmethod
+    def proba(self, X):
+        """Probability of the positive class for a float32 matrix, as float64 of shape (rows,)"""
+
+    def predict_proba(self, X):
+        p = self.proba(as_matrix(X, self.features))
+        return np.column_stack([1 - p, p])
+
+    def predict(self, X):
+        return (self.predict_proba(X)[:, 1] > 0.5).astype(np.int64)
+
+    @property
+    def nbytes(self):
+        return sum(a.nbytes for a in self.arrays.values())
+
+
+class LogisticModel(CompiledModel):
+
+    kind = 'logistic_regression'
+
+    @staticmethod
+    def arrays_from(model):
+        return {'coef': model.coef_[0].astype(np.float32), 'intercept': model.intercept_.astype(np.float32)}
+
+    def __init__(self, arrays):
+        super().__init__(arrays)
+        self.coef = arrays['coef'].astype(np.float64)
+        self.intercept = float(arrays['intercept'][0])
+
+    def proba(self, X):
+        return _sigmoid(X.astype(np.float64) @ self.coef + self.intercept)
+
+
+class MLPModel(CompiledModel):
+
+    kind = 'mlp'
+
+    @staticmethod
+    def arrays_from(model):
+        arrays = {'activation': np.array(model.activation), 'out_activation': np.array(model.out_activation_)}
+        for i, (W, b) in enumerate(zip(model.coefs_, model.intercepts_)):
+            arrays[f'W{i}'] = W.astype(np.float32)
+            arrays[f'b{i}'] = b.astype(np.float32)
+        return arrays
+
+    def __init__(self, arrays):
+        super().__init__(arrays)
+        # weights are stored as float32 but multiplied in float64: features like Elo are in the thousands,
+        # and float32 sums through the hidden layer drift by up to 1e-4
+        self.layers = [(arrays[f'W{i}'].astype(np.float64), arrays[f'b{i}'].astype(np.float64))
+                       for i in range(sum(k.startswith('W') for k in arrays))]
+        self.activation = ACTIVATIONS[str(arrays['activation'])]
+        self.out_activation = ACTIVATIONS[str(arrays['out_activation'])]
+
+    def proba(self, X):
+        X = X.astype(np.float64)
+        for W, b in self.layers[:-1]:
+            X = self.activation(X @ W + b)
+        W, b = self.layers[-1]
+        return self.out_activation(X @ W + b)[:, 0]
+
+
+class ForestModel(CompiledModel):
+
+    kind = 'random_forest'
+
+    @staticmethod
+    def arrays_from(model):
+
+        # every tree is padded out to a perfect binary tree of the forest's depth, stored breadth first, so
+        # node i's children are always 2i + 1 and 2i + 2 and no child arrays are needed. A leaf above the
+        # bottom level becomes a chain of splits that always go left, down to a bottom level copy of it
+        depth = max(estimator.tree_.max_depth for estimator in model.estimators_)
+        if depth > MAX_FOREST_DEPTH:
+            raise ValueError(f'Trees {depth} deep are too deep to compile, at most {MAX_FOREST_DEPTH}')
+        trees, inner = len(model.estimators_), 2 ** depth - 1
+        feature = np.zeros((trees, inner), dtype=np.int16)
+        threshold = np.full((trees, inner), np.inf)
+        value = np.zeros((trees, inner + 1), dtype=np.float32)
+
+        for t, estimator in enumerate(model.estimators_):
+            tree = estimator.tree_
+            counts = tree.value[:, 0, :]
+            positive = counts[:, 1] / counts.sum(axis=1)
+            stack = [(0, 0, 0)]
+            while stack:
+                node, i, level = stack.pop()
+                if level == depth:
+                    value[t, i - inner] = positive[node]
+                elif tree.children_left[node] == -1:
+                    stack.append((node, 2 * i + 1, level + 1))
+                else:
+                    feature[t, i] = tree.feature[node]
+                    threshold[t, i] = tree.threshold[node]
+                    stack.append((tree.children_left[node], 2 * i + 1, level + 1))
+                    stack.append((tree.children_right[node], 2 * i + 2, level + 1))
+
+        # sklearn compares float32 features with float64 thresholds. Rounding each threshold down to
+        # the nearest float32 keeps every comparison the same while halving the array
+        threshold32 = threshold.astype(np.float32)
+        over = threshold32.astype(np.float64) > threshold
+        threshold32[over] = np.nextafter(threshold32[over], np.float32(-np.inf))
+
+        return {'feature': feature, 'threshold': threshold32, 'value': value}
+
+    def __init__(self, arrays):
+        super().__init__(arrays)
+        trees, inner = arrays['feature'].shape
+        self.depth = int(np.log2(inner + 1))
+        # features are stored as int16 but looked up as intp, which numpy would otherwise convert on every step
+        self.feature = arrays['feature'].astype(np.intp).ravel()
+        self.threshold = arrays['threshold'].ravel()
+        self.value = arrays['value'].ravel()
+        # nodes are tracked by their index in the flat arrays. Tree t's nodes start at t * inner, so
+        # node n's left child is 2n + 1 - t * inner, and a bottom level node's leaf value is at
+        # n - inner + t, the leaf arrays being one longer per tree
+        start = (np.arange(trees, dtype=np.intp) * inner)[:, None]
+        self.root = start
+        self.child = 1 - start
+        self.leaf = np.arange(trees, dtype=np.intp)[:, None] - inner
+
+    def proba(self, X):
+
+        out = np.empty(len(X), dtype=np.float64)
+        for start in range(0, len(X), FOREST_CHUNK):
+            chunk = X[start:start + FOREST_CHUNK]
+            flat = chunk.ravel()
+            offsets = np.arange(len(chunk), dtype=np.intp) * chunk.shape[1]
+            # (trees, rows) nodes, every tree taking all the rows down one level per step. Indexing with
+            # arrays is used rather than take, which is several times slower at this size
+            node = np.repeat(self.root, len(chunk), axis=1)
+            for _ in range(self.depth):
+                right = flat[self.feature[node] + offsets] > self.threshold[node]
+                node += node
+                node += self.child
+                node += right
+            out[start:start + FOREST_CHUNK] = self.value[node + self.leaf].mean(axis=0, dtype=np.float64)
+        return out
+
+
+KINDS = {'LogisticRegression': LogisticModel, 'MLPClassifier': MLPModel, 'RandomForestClassifier': ForestModel}
+
+
+def compiled_path(name):
+    return os.path.splitext(registry.model_path(name))[0] + '.npz'
+
+
+def _source_stamp(name):
+    try:
+        stat = os.stat(registry.model_path(name))
+    except FileNotFoundError:
+        return None
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def compile_model(model):
+    """
+    Purpose:
+        Converts a fitted estimator to its compiled equivalent in memory
+
+    Args:
+        model: Fitted LogisticRegression, MLPClassifier or RandomForestClassifier predicting 0/1
+    Returns:
+        model: CompiledModel
+    """
+
+    kind = KINDS.get(type(model).__name__)
+    if kind is None:
+        raise ValueError(f'{type(model).__name__} models can\'t be compiled, only {list(KINDS)}')
+    if list(getattr(model, 'classes_', [0, 1])) != [0, 1]:
+        raise ValueError(f'Only models predicting 0/1 wins can be compiled, not {list(model.classes_)}')
+
+    arrays = kind.arrays_from(model)
+    arrays['kind'] = np.array(kind.kind)
+    arrays['features'] = np.array(getattr(model, 'feature_names_in_', []), dtype=str)
+    arrays['source'] = np.zeros(2, dtype=np.int64)
+    return kind(arrays)
+
+
+def export(name, model=None):
+    """
+    Purpose:
+        Exports a model's parameters to MODELS/{model}.npz, e.g. MODELS/rf_model.npz. The file records
+        the .sav it was exported from, so load exports it again once retrain_model replaces the model
+
+    Args:
+        name: 'log', 'mlp' or 'rf'
+        model: Fitted estimator to export, the current one from ModelRegistry when None
+    Returns:
+        path: The .npz written
+    """
+
+    stamp = _source_stamp(name)
+    arrays = dict(compile_model(registry.load(name) if model is None else model).arrays)
+    arrays['source'] = np.array(stamp or [0, 0], dtype=np.int64)
+
+    path = compiled_path(name)
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'wb') as f:
+        np.savez(f, **arrays)
+    os.replace(tmp, path)
+    _loaded.pop(name, None)
+    return path
+
+
+def load(name):
+    """
+    Purpose:
+        Returns a compiled model, reading its .npz on first use. The model is exported first if it
+        hasn't been yet or the .sav has changed since, which is the only time sklearn is imported
+
+    Args:
+        name: 'log', 'mlp' or 'rf'
+    Returns:
+        model: CompiledModel
+    """
+
+    path = compiled_path(name)
+    source = _source_stamp(name)
+    with _lock:
+        entry = _loaded.get(name)
+        if entry is not None and (source is None or entry['source'] == source):
+            return entry['model']
+
+        arrays = _read(path) if os.path.exists(path) else None
+        if arrays is not None and source is not None and list(arrays['source']) != source:
+            arrays = None
+        if arrays is None:
+            arrays = _read(export(name))
+
+        model = {cls.kind: cls for cls in KINDS.values()}[str(arrays['kind'])](arrays)
+        _loaded[name] = {'model': model, 'source': source}
+        return model
+
+
+def _read(path):
+    with np.load(path, allow_pickle=False) as f:
+        return {key: f[key] for key in f.files}
+
+
+def estimator(name):
+    """
+    Purpose:
+        Model to predict with: the compiled model, or the sklearn estimator when NBAPREDICT_COMPILED=0
+
+    Args:
+        name: 'log', 'mlp' or 'rf'
+    Returns:
+        model: CompiledModel or fitted sklearn estimator, both with predict and predict_proba
+    """
+
+    return load(name) if ENABLED else registry.load(name)
+
+
+def score(X, models=None):
+    """
+    Purpose:
+        Scores a feature matrix with each compiled model, converting it to float32 once
+
+    Args:
+        X: DataFrame or array of the prediction features
+        models: Any of 'log', 'mlp' and 'rf', all three when None
+    Returns:
+        probs: Dict of model name -> probability of a win for each row
+    """
+
+    names = registry.check_names(models)
+    compiled = {name: load(name) for name in names}
+    X = as_matrix(X, compiled[names[0]].features)
+    return {name: model.proba(X) for name, model in compiled.items()}
@@ -1,48 +1,37 @@
 import os
 import io
-import difflib
 import pandas as pd
 import datetime as dt
-from bs4 import BeautifulSoup, Comment
-from time import sleep
-from requests import get
-from tqdm import tqdm
-from selenium import webdriver
-from selenium.webdriver.common.by import By
+from .WebCache import get, current_season
+from .FetchScheduler import fetch_all
+from . import TableParser as tp
+from . import Scrapers as scrape
+from .NameResolver import NameResolver
+from . import MinutesProviders as mp
+from . import EloEngine as engine
+from . import DatasetCompilers as dc
 
 
-def get_projected_minutes(names):
+def get_projected_minutes(names, providers=None, as_of=None):
     """
     Purpose:
         Generates projected minutes played totals for players in today NBA game slate
     
     Args:
         names: A list of names used to update player names to match basketball-reference naming style
+        providers: MinutesProviders to try in order, MinutesProviders.default_providers() when None
+        as_of: Date the projections are labelled with, dt.date.today() when None. The sources only
+               publish the current day's projections, see played_minutes for past dates
     Returns:
         df: DataFrame containing the relevant players projected minute totals
     """
     
-    today = dt.date.today()
-    if today.month > 7 & today.month <= 12:
-        season = today.year + 1
-    else:
-        season = today.year
+    today = as_of or dt.date.today()
+    season = current_season(today)
     
-    # Use selenium webdriver to get projected minutes from Lineups.com
-    driver = webdriver.Firefox()
-    driver.get(f'https://www.lineups.com/nba/nba-player-minutes-per-game')
+    # Lineups.com projections, from its json feed or a headless browser session
+    mp_df, _ = mp.fetch_minutes(providers)
     
-    # Use driver.click() function to convert the webpage table to CSV form and maximize player output
-    driver.find_element(By.XPATH, '/html/body/app-root/div[3]/app-minutes-router/app-minutes/div/div/div[4]/div/div[2]/div[2]/div/div/button').click()
-    driver.find_element(By.XPATH, '/html/body/app-root/div[3]/app-minutes-router/app-minutes/div/div/div[4]/div/div[2]/div[1]/div/app-dropdown/div/button/span').click()
-    sleep(1)
-    driver.find_element(By.XPATH, '/html/body/app-root/div[3]/app-minutes-router/app-minutes/div/div/div[4]/div/div[2]/div[1]/div/app-dropdown/div/div/div[4]').click()
-    sleep(2)
-    text = driver.find_element(By.XPATH, "/html/body/app-root/div[3]/app-minutes-router/app-minutes/div/div/div[5]/div/p").text
-    driver.quit()
-    
-    # create dataframe from mp table text
-    mp_df = pd.read_csv(io.StringIO(text), header=0)
     mp_df['DATE'] = str(today)
     mp_df['SEASON'] = season
     mp_df['SZN_TYPE'] = 'reg'
@@ -52,24 +41,37 @@ def get_projected_minutes(names):
     mp_df = mp_df[['DATE', 'TEAM', 'PLAYER', 'MP', 'SEASON', 'SZN_TYPE']]
     mp_df = mp_df.replace({'BKN': 'BRK', 'CHA': 'CHO', 'NO': 'NOP', 'NY': 'NYK', 'SA': 'SAS', 'GS': 'GSW'})
 
-    for i in range(len(mp_df)):
-        name = mp_df.loc[i, 'PLAYER']
-        try:
-            new_name = difflib.get_close_matches(name, names, 1)[0]
-        except Exception:
-            continue
-        mp_df.loc[i, 'PLAYER'] = new_name
+    mp_df['PLAYER'] = mp_df['PLAYER'].map(NameResolver(names).resolve_all(mp_df['PLAYER']))
 
     return mp_df
 
 
-def daily_stats():
+def played_minutes(games):
+    """
+    Purpose:
+        Minutes each player actually played in finished games, from the box scores, in the layout of
+        get_projected_minutes. Stands in for projections on past dates, which are no longer published
+
+    Args:
+        games: Game rows of finished games, as built by DatasetCompilers.build_game_data
+    Returns:
+        df: DATE, TEAM, PLAYER, MP and SEASON for every player who got minutes
+    """
+
+    games = games.assign(date=pd.to_datetime(games['date']).dt.strftime('%Y-%m-%d'))
+    mp_df = dc.build_player_minutes(games)
+    mp_df = mp_df[mp_df.MP != 0].sort_values(by=['DATE', 'TEAM'], kind='mergesort')
+
+    return mp_df[['DATE', 'TEAM', 'PLAYER', 'MP', 'SEASON']].reset_index(drop=True)
+
+
+def daily_stats(as_of=None):
     """
     Purpose:
         Generates player and team stats for each team in today NBA game slate by scraping from basketball-reference.com
     
     Args:
-        None
+        as_of: Date being predicted, dt.date.today() when None. The pages hold the season's stats to date
     Returns:
         ps_df: Player stats dataframe
         ts_df: Team stats dataframe
@@ -79,55 +81,18 @@ def daily_stats():
     sched = pd.read_csv(f'{pred_folder}/TodayGames.csv')
     teams = list(sched.team.unique())
 
-    stats = ['per_game', 'advanced']
-    today = dt.date.today()
-
-    if today.month > 7 & today.month <= 12:
-        season = today.year + 1
-    else:
-        season = today.year
-
-    player_stats_dfs = []
-    team_stats_dfs = [] 
-
-    for team in tqdm(teams):
-        sleep(3)
-        resp = get(f'https://www.basketball-reference.com/teams/{team}/{season}.html')
-        soup = BeautifulSoup(resp.content, 'html.parser')
-
-        d_list = []
-        for stat in stats:
-            d = None
-            table = soup.find('table', {"id": stat})
-            d = pd.read_html(str(table))[0]
-            d['SEASON'] = season
-            d['TEAM'] = team
-            d = d.rename(columns={'Player': 'PLAYER', 'Age': 'AGE'})
-            if stat == 'per_game':
-                d = d.rename(columns={'MP': 'MPG'})
-            else:
-                d = d[['Rk', 'SEASON', 'TEAM', 'PLAYER', 'MP', 'PER', 'TS%', '3PAr', 'FTr', 'ORB%', 'DRB%', 'TRB%',
-                       'AST%', 'STL%', 'BLK%', 'TOV%', 'USG%', 'OWS', 'DWS', 'WS', 'WS/48', 'OBPM', 'DBPM', 'BPM', 'VORP']]
-            drop = [col for col in d.columns if 'Unnamed' in col]
-            d = d.sort_values(by='PLAYER', ascending=True).reset_index().drop(drop + ['Rk', 'index'], axis=1)
-            d_list.append(d)
-
-        player_stats = pd.merge(d_list[0], d_list[1], on=['SEASON', 'TEAM', 'PLAYER'], how='inner', validate='1:1')
-        player_stats_dfs.append(player_stats)
-        
-        team_soup = BeautifulSoup("\n".join(soup.find_all(text=Comment)), "lxml")
-        team_stats = pd.read_html(str(team_soup.select_one("table#team_misc")))[0]
-        team_stats.columns = team_stats.columns.droplevel()
-        team_stats.rename(columns={'Unnamed: 0_level_1': 'TEAM'}, inplace=True)
-        team_stats = team_stats[team_stats.TEAM != 'Lg Rank']
-        team_stats['TEAM'] = team
-        team_stats['SEASON'] = season
-        team_stats.columns = ['TEAM', 'W', 'L', 'PW', 'PL', 'MOV', 'SOS', 'SRS', 'ORtg', 'DRtg',
-                              'PACE', 'FTr', '3PAr', 'eFG%', 'TOV%', 'ORB%', 'FT/FGA', 'DeFG%',
-                              'DTOV%', 'DRB%', 'DFT/FGA', 'Arena', 'Attendance', 'SEASON']
-
-        team_stats = team_stats[['TEAM', 'SEASON', 'ORtg', 'DRtg', 'PACE', 'eFG%', 'TOV%', 'ORB%', 'DRB%']]
-        team_stats_dfs.append(team_stats)
+    season = current_season(as_of)
+
+    urls = {team: scrape.team_page_url(team, season) for team in teams}
+
+    # player and team stats come from the same page, parsed once
+    def parse(team, resp):
+        page = scrape.parse_team_page(resp, team, season)
+        return scrape.merge_player_stats(page), page['team_misc']
+
+    pages = dict(fetch_all(urls, parse))
+    player_stats_dfs = [pages[team][0] for team in teams]
+    team_stats_dfs = [pages[team][1] for team in teams]
 
     ps_df = pd.concat(player_stats_dfs, ignore_index=True)
     ps_df = ps_df.sort_values(by=['TEAM', 'PLAYER']).reset_index(drop=True).fillna(0)
@@ -142,23 +107,18 @@ def daily_stats():
     return ps_df, ts_df
 
 
-def daily_raptor():
+def daily_raptor(as_of=None):
     """
     Purpose:
         Generates up-to-date RAPTOR ratings from 538's data repository
     
     Args:
-        None
+        as_of: Date being predicted, dt.date.today() when None
     Returns:
         rap_df: Dataframe containing RAPTOR ratings for each player in the league
     """
     
-    today = dt.date.today()
-
-    if today.month > 7 & today.month <= 12:
-        season = today.year + 1
-    else:
-        season = today.year
+    season = current_season(as_of)
 
     by = ['team', 'player']
     df_list = []
@@ -178,33 +138,22 @@ def daily_raptor():
     return rap_df
 
 
-def daily_elo():
+def daily_elo(as_of=None, end=None):
     """
     Purpose:
-        Generates up-to-date ELO ratings from 538's data repository
+        Generates Elo ratings for today's games, computed locally from the season's results
+        by EloEngine rather than downloaded from 538
     
     Args:
-        None
+        as_of: Date being predicted, dt.date.today() when None
+        end: Last date of a range of slates, rated in one pass with EloEngine.range_elo
     Returns:
         elo_df: Dataframe containing ELO ratings for each team in the league
     """
 
-    url = "https://projects.fivethirtyeight.com/nba-model/nba_elo_latest.csv"
-    download = get(url).content
-    df = pd.read_csv(io.StringIO(download.decode('utf-8')))
-    df = df[df.date == str(dt.date.today())]
-    cols = ['date', 'team1', 'team2', 'elo1_pre', 'elo2_pre']
-    df = df[cols]
-    df.replace('CHA', 'CHO', inplace=True)
-    df.reset_index(drop=True, inplace=True)
-    elodup = df.copy()
-    elodup = elodup.rename(columns={'team1': 'team2', 'team2': 'team1', 'elo1_pre': 'elo2_pre', 'elo2_pre': 'elo1_pre'})
-    elo_df = pd.concat([df, elodup], ignore_index=True)
-    elo_df = elo_df.sort_values(by='date')
-    elo_df.reset_index(drop=True, inplace=True)
-    elo_df = elo_df.rename(columns={'team1': 'team', 'team2': 'opp', 'elo1_pre': 'teamElo', 'elo2_pre': 'oppElo'})
-
-    return elo_df
+    if end is not None:
+        return engine.range_elo(as_of, end)
+    return engine.daily_elo(as_of)
 
 
 def daily_training_update(date, team, season, szn_type):
@@ -227,24 +176,51 @@ def daily_training_update(date, team, season, szn_type):
         Opp: Opposing team points
     """
 
-    r = get(f'https://www.basketball-reference.com/teams/{team}/{season}_games.html')
+    df = season_results(team, season, szn_type)
+    df = df[df.Date == date]
+    df = df.reset_index(drop=True)
+    win = df.iloc[0, 2]
+    tm = df.iloc[0, 3]
+    opp = df.iloc[0, 4]
+    return win, tm, opp
+
+
+def season_results(team, season, szn_type):
+    """
+    Purpose:
+        Generates every game outcome and score in a team's season from basketball-reference.com
+
+    Args:
+        team: Team abbreviation
+        season: NBA season
+        szn_type: Regular Season (0) or Playoffs (1)
+    Returns:
+        df: Date, Team, win, Tm and Opp for each game on the team's schedule
+    """
+
+    return parse_season_results(get(season_results_url(team, season)), team, szn_type)
+
+
+def season_results_url(team, season):
+    return f'https://www.basketball-reference.com/teams/{team}/{season}_games.html'
+
+
+def parse_season_results(r, team, szn_type):
 
     if szn_type == 0:
         if r.status_code == 200:
-            soup = BeautifulSoup(r.content, 'html.parser')
-            table = soup.find('table', attrs={'id': 'games'})
-            if table:
-                df = pd.read_html(str(table))[0]
+            tables = tp.read_tables(r.content, ['games'])
+            if 'games' in tables:
+                df = tables['games']
 
         else:
             print(r.status_code)
 
     elif szn_type == 1:
         if r.status_code == 200:
-            soup = BeautifulSoup(r.content, 'html.parser')
-            table = soup.find('table', attrs={'id': 'games_playoffs'})
-            if table:
-                df = pd.read_html(str(table))[0]
+            tables = tp.read_tables(r.content, ['games_playoffs'])
+            if 'games_playoffs' in tables:
+                df = tables['games_playoffs']
 
     df = df.rename(columns={'Unnamed: 7': 'win'})
     df = df[df.G != 'G']
@@ -253,9 +229,4 @@ def daily_training_update(date, team, season, szn_type):
     df = df[['Date', 'Team', 'win', 'Tm', 'Opp']]
     df.loc[df.win == 'W', 'win'] = 1
     df.loc[df.win == 'L', 'win'] = 0
-    df = df[df.Date == date]
-    df = df.reset_index(drop=True)
-    win = df.iloc[0, 2]
-    tm = df.iloc[0, 3]
-    opp = df.iloc[0, 4]
-    return win, tm, opp
+    return df
@@ -1,117 +1,140 @@
 
 import os
-import difflib
 import pandas as pd
 import numpy as np
 import datetime as dt
 from . import Scrapers as scrape
 from . import NBAtools as tl
-from tqdm import tqdm
-from time import sleep
+from .FetchScheduler import fetch_all
+from .WebCache import current_season
+from .NameResolver import NameResolver
+
+
+ABV_DICT = {'Atlanta Hawks' : 'ATL',
+            'Boston Celtics' : 'BOS',
+            'Brooklyn Nets' : 'BRK',
+            'Chicago Bulls' : 'CHI',
+            'Charlotte Hornets' : 'CHO',
+            'Charlotte Bobcats' : 'CHA',
+            'Cleveland Cavaliers' : 'CLE',
+            'Dallas Mavericks' : 'DAL',
+            'Denver Nuggets' : 'DEN',
+            'Detroit Pistons' : 'DET',
+            'Golden State Warriors' : 'GSW',
+            'Houston Rockets' : 'HOU',
+            'Indiana Pacers' : 'IND',
+            'Los Angeles Clippers' : 'LAC',
+            'Los Angeles Lakers' : 'LAL',
+            'Memphis Grizzlies' : 'MEM',
+            'Miami Heat' : 'MIA',
+            'Milwaukee Bucks' : 'MIL',
+            'Minnesota Timberwolves' : 'MIN',
+            'New Orleans Pelicans' : 'NOP',
+            'New Orleans Hornets' : 'NOH',
+            'New York Knicks' : 'NYK',
+            'Oklahoma City Thunder' : 'OKC',
+            'Orlando Magic' : 'ORL',
+            'Philadelphia 76ers' : 'PHI',
+            'Phoenix Suns' : 'PHO',
+            "Portland Trail Blazers" : "POR",
+            "Sacramento Kings" : "SAC",
+            "San Antonio Spurs" : "SAS",
+            "Toronto Raptors" : "TOR",
+            "Utah Jazz" : "UTA",
+            "Washington Wizards" : 'WAS'}
+
+# first day of the playoffs for seasons where the regular season was not 82 games
+POST_START = {2022: '2022-04-15', 2021: '2021-05-21', 2020: '2020-08-15'}
+
+
+def build_game_data(season=None, as_of=None, end=None):
+    """
+    Scrapes a season's schedule and builds the game rows with recent performance features. Without
+    a season, only the slate being predicted is kept: the games on as_of, or every game from as_of
+    to end, written to TodayGames.csv. With a season, every game but as_of's is kept for training,
+    written to {season}Games.csv
+
+    Args:
+        season: Season to build in full, None for the slate being predicted
+        as_of: Date being predicted, dt.date.today() when None
+        end: Last date of a range of slates, as_of's season only
+
+    Returns:
+        maindf: Game rows sorted by date, None when the slate has no games
+    """
 
-
-def build_game_data(season=None):
-    
     pred_folder = os.path.join(os.path.join(os.path.expanduser('~')), 'Desktop/PREDICT_NBA')
-    today = dt.date.today()
+    as_of = as_of or dt.date.today()
     
     if season is None:
-        if today.month > 7 & today.month <= 12:
-            season = today.year + 1
-        else:
-            season = today.year
+        season = current_season(as_of)
         time_span = 'Today'
     
     else:
         time_span = str(season)
 
-    sched = scrape.get_szn_schedule(season)
+    # a range's played games keep their scores for the form of the games after them
+    sched = scrape.get_szn_schedule(season, as_of=min(end, dt.date.today()) if end else as_of)
+
+    maindf = compile_game_data(sched)
     
+    if time_span == 'Today':
+        if end is None:
+            maindf = maindf[maindf.date == str(as_of)]
+        else:
+            maindf = maindf[(maindf.date >= str(as_of)) & (maindf.date <= str(end))]
+        if len(maindf) == 0:
+            return None
+    else:
+        maindf = maindf[maindf.date != str(as_of)]
+        
+    maindf.reset_index(drop=True, inplace=True)
+    
+    maindf.to_csv(f'{pred_folder}/{time_span}Games.csv', index=False)
+    
+    return maindf
+
+
+def compile_game_data(sched):
+    """
+    Turns a scraped schedule into team-perspective game rows with each team's and its
+    opponent's recent performance features. Works on one season or several stacked together
+
+    Args:
+        sched: Schedule DataFrame as returned by Scrapers.get_szn_schedule
+
+    Returns:
+        maindf: One row per team per game, sorted by date
+    """
+
+    sched = sched.copy()
     sched['szn_type'] = 'reg'
 
-    abv_dict = {'Atlanta Hawks' : 'ATL',
-                'Boston Celtics' : 'BOS',
-                'Brooklyn Nets' : 'BRK',
-                'Chicago Bulls' : 'CHI',
-                'Charlotte Hornets' : 'CHO',
-                'Charlotte Bobcats' : 'CHA',
-                'Cleveland Cavaliers' : 'CLE',
-                'Dallas Mavericks' : 'DAL',
-                'Denver Nuggets' : 'DEN',
-                'Detroit Pistons' : 'DET',
-                'Golden State Warriors' : 'GSW',
-                'Houston Rockets' : 'HOU',
-                'Indiana Pacers' : 'IND',
-                'Los Angeles Clippers' : 'LAC',
-                'Los Angeles Lakers' : 'LAL',
-                'Memphis Grizzlies' : 'MEM',
-                'Miami Heat' : 'MIA',
-                'Milwaukee Bucks' : 'MIL',
-                'Minnesota Timberwolves' : 'MIN',
-                'New Orleans Pelicans' : 'NOP',
-                'New Orleans Hornets' : 'NOH',
-                'New York Knicks' : 'NYK',
-                'Oklahoma City Thunder' : 'OKC',
-                'Orlando Magic' : 'ORL',
-                'Philadelphia 76ers' : 'PHI',
-                'Phoenix Suns' : 'PHO',
-                "Portland Trail Blazers" : "POR",
-                "Sacramento Kings" : "SAC",
-                "San Antonio Spurs" : "SAS",
-                "Toronto Raptors" : "TOR",
-                "Utah Jazz" : "UTA",
-                "Washington Wizards" : 'WAS'}
-
-    for i in range(len(sched)):
-        v = sched.iloc[i,2]
-        h = sched.iloc[i,4]
-        sched.iloc[i,2] = abv_dict[v]
-        sched.iloc[i,4] = abv_dict[h]
+    for col in ['away_team', 'home_team']:
+        abv = sched[col].map(ABV_DICT)
+        if abv.isna().any():
+            raise KeyError(sched.loc[abv.isna(), col].iloc[0])
+        sched[col] = abv
 
     sched = sched.astype({"away_pts":"int","home_pts":"int"})
 
-    df_list = []
-    teams = sched['away_team'].unique()
+    df = tl.team_features_all(sched)
 
-    for team in teams:
-        teamdf = sched[(sched.home_team == team) | (sched.away_team == team)]
-        teamdf.reset_index(drop=True, inplace=True)
-        d = tl.team_features(team,teamdf)
-        df_list.append(d)
+    opp = df.set_index(['date', 'team'])[['teamDayOff', 'lastFive', 'lastTen', 'winp']]
+    opp.columns = ['oppDayOff', 'oppLastFive', 'oppLastTen', 'oppWinp']
 
-    df = pd.concat(df_list, ignore_index=True)
-    
-    maindf = pd.merge(df, df, left_on=['date', 'opp'], right_on=['date', 'team'], how='outer', suffixes=["","_opp"])
-    maindf = maindf.drop(columns=['season_opp', 'team_opp', 'team_pts_opp', 'opp_opp', 
-                                  'opp_pts_opp', 'win_opp', 'home_opp', 'gp_opp', 'szn_type_opp']).sort_values(by=['date']).reset_index(drop=True)
-    
-    maindf.rename(columns={'teamDayOff_opp':'oppDayOff', 'lastFive_opp':'oppLastFive', 'lastTen_opp':'oppLastTen', 'winp_opp':'oppWinp'}, inplace=True)
-    
-    if season == 2022:
-        maindf.loc[maindf['date'] > '2022-04-15', 'szn_type'] = 'post'
-    elif season == 2021:
-        maindf.loc[maindf['date'] > '2021-05-21', 'szn_type'] = 'post'
-    elif season == 2020:
-        maindf.loc[maindf['date'] > '2020-08-15', 'szn_type'] = 'post'
-    else:
-        maindf.loc[maindf.gp > 81, 'szn_type'] = 'post'
+    maindf = df.join(opp, on=['date', 'opp']).sort_values(by=['date']).reset_index(drop=True)
+
+    post_start = maindf['season'].map(POST_START)
+    fixed = post_start.notna()
+    maindf.loc[fixed & (maindf['date'] > pd.to_datetime(post_start)), 'szn_type'] = 'post'
+    maindf.loc[~fixed & (maindf.gp > 81), 'szn_type'] = 'post'
 
     cols = ['season', 'date', 'team', 'team_pts', 'opp', 'opp_pts', 'home', 'szn_type', 'gp', 'lastFive', 'lastTen', 'winp',
             'teamDayOff', 'oppLastFive', 'oppLastTen', 'oppWinp', 'oppDayOff', 'win']
     
     maindf = maindf[cols]
-    
-    if time_span == 'Today':
-        maindf = maindf[maindf.date == str(today)]
-        if len(maindf) == 0:
-            return None
-    else:
-        maindf = maindf[maindf.date != str(today)]
-        
-    maindf.reset_index(drop=True, inplace=True)
-    
-    maindf.to_csv(f'{pred_folder}/{time_span}Games.csv', index=False)
-    
+
     return maindf
 
 
@@ -119,30 +142,29 @@ def build_player_minutes(games):
 
     games = games[~games[['team', 'opp', 'date']].apply(frozenset, axis=1).duplicated()]
 
-    dflist = []
-    for i in tqdm(range(len(games))):
-        sleep(2.8)
-        date = str(games.loc[i,'date'])
-        team1 = games.loc[i,'team']
-        team2 = games.loc[i,'opp']
-        home = games.loc[i,'home']
-        season = games.loc[i,'season']
-        szn_type = games.loc[i,'szn_type']
-
-        if home == 1:
-            h = team1
+    jobs = {}
+    info = {}
+    for r in games.itertuples(index=False):
+        date = str(r.date)
+
+        if r.home == 1:
+            h = r.team
         else:
-            h = team2
+            h = r.opp
+
+        gamestr = date.replace('-','') + '0' + h
+        jobs[gamestr] = scrape.box_score_url(gamestr)
+        info[gamestr] = (r.team, r.opp, r.season, date, r.szn_type)
 
-        d = date.replace('-','')
+    def parse(gamestr, resp):
+        return scrape.parse_box_scores(resp, *info[gamestr])
 
-        gamestr = d + '0' + h
+    try:
+        box_scores = dict(fetch_all(jobs, parse))
+    except Exception:
+        raise ValueError('no good fam')
 
-        try:
-            d = scrape.get_box_scores(gamestr, team1, team2, season, date, szn_type)
-            dflist.append(d)
-        except Exception:
-            raise ValueError('no good fam')
+    dflist = [box_scores[gamestr] for gamestr in jobs]
 
     main_df = pd.concat(dflist, ignore_index=True)
     main_df.sort_values(by=['DATE', 'TEAM'], ascending=True, inplace=True)
@@ -153,23 +175,30 @@ def build_player_minutes(games):
 
 def build_player_stats(teams, years):
 
-    df_list = []
-    for team in tqdm(teams):
-        for year in years:
-            sleep(3)
-            try:
-                pg = scrape.get_roster_stats(team, year, 'per_game').sort_values(by='PLAYER', ascending=True).rename(columns={"MP": "MPG"})
-                sleep(3)
-                adv = scrape.get_roster_stats(team, year, stat='advanced').sort_values(by='PLAYER', ascending=True)
-                adv = adv[['SEASON', 'TEAM', 'PLAYER', 'MP', 'PER', 'TS%', '3PAr', 'FTr', 'ORB%', 'DRB%',
-                           'TRB%', 'AST%', 'STL%', 'BLK%', 'TOV%', 'USG%', 'OWS', 'DWS',
-                            'WS', 'WS/48', 'OBPM', 'DBPM', 'BPM', 'VORP']]
+    return build_team_page_stats(teams, years)[0]
+
+
+def build_team_page_stats(teams, years):
+    """
+    Fetches each team-year page once and builds both the player stats and the team stats from it
+
+    Args:
+        teams: Team abbreviations
+        years: Seasons
+
+    Returns:
+        player_stats: Per game and advanced stats for every player, as returned by build_player_stats
+        team_stats: One row of team ratings per team-year
+    """
 
-                df = pg.merge(adv, on = ['SEASON','TEAM','PLAYER'], how = 'inner', validate='1:1')
-                df_list.append(df)
+    jobs = {(team, year): scrape.team_page_url(team, year) for team in teams for year in years}
 
-            except Exception:
-                continue
+    def parse(key, resp):
+        page = scrape.parse_team_page(resp, *key)
+        return scrape.merge_player_stats(page), page['team_misc']
+
+    pages = dict(fetch_all(jobs, parse, errors='skip'))
+    df_list = [pages[key][0] for key in jobs if key in pages]
 
     maindf = pd.concat(df_list, ignore_index=True)
     maindf = maindf.drop_duplicates().sort_values(by=['SEASON', 'TEAM'], ascending=True).reset_index(drop=True).fillna(0)
@@ -181,7 +210,9 @@ def build_player_stats(teams, years):
 
     maindf = maindf[cols]
 
-    return maindf
+    team_stats = pd.concat([pages[key][1] for key in jobs if key in pages], ignore_index=True)
+
+    return maindf, team_stats
 
 
 def build_full_stats(rap = None, stat = None, daily = False):
@@ -191,13 +222,7 @@ def build_full_stats(rap = None, stat = None, daily = False):
     rap = rap[rap.TEAM.isin(teams)].reset_index(drop=True)
     correct_names = list(stat.PLAYER.unique())
 
-    for i in range(len(rap)):
-        name = rap.loc[i,'PLAYER']
-        try:
-            new_name = difflib.get_close_matches(name, correct_names, 1)[0]
-            rap.loc[i,'PLAYER'] = new_name
-        except:
-            continue
+    rap['PLAYER'] = rap['PLAYER'].map(NameResolver(correct_names).resolve_all(rap['PLAYER']))
 
     if daily is False:
         df = pd.merge(stat, rap, how='left', on=['PLAYER', 'SEASON', 'TEAM'], suffixes=['','no']).reset_index(drop=True)
@@ -212,75 +237,107 @@ def build_full_stats(rap = None, stat = None, daily = False):
 
 
 def build_games_plus_roster(games, mp, stats):
-    
-    for i in range(1,9):
-        games[f'P{i}Or'] = 0
-        games[f'P{i}Dr'] = 0
-        games[f'P{i}name'] = 0
-        games[f'P{i}MP'] = 0
-        games['age'] = 0
+    """
+    Adds each team's and opponent's top players (by MPG, among players with projected minutes)
+    to the game rows as P1..P8 and oppP1..oppP8 RAPTOR, name and minutes columns, plus the
+    average age of that group
+
+    The roster block only depends on the team, so it is built once per team with a
+    grouped sort and pivot and joined onto the games for both sides of each matchup
+
+    Args:
+        games: Game rows with team and opp columns
+        mp: Minutes per player with TEAM, PLAYER and MP columns
+        stats: Player stats with TEAM, PLAYER, MPG, AGE and raptor columns
+
+    Returns:
+        games: Copy of games with the roster columns added
+    """
+
+    block = roster_block(mp, stats)
+    opp_block = block.add_prefix('opp')
+
+    dtypes = {'Or': 'float64', 'Dr': 'float64', 'name': 'object', 'MP': mp['MP'].dtype, 'age': 'float64'}
+    cols = []
+    for prefix in ['', 'opp']:
+        for i in range(1,9):
+            cols.extend([(f'{prefix}P{i}{suffix}', suffix) for suffix in ['Or', 'Dr', 'name', 'MP']])
+            if i == 1:
+                cols.append((f'{prefix}age', 'age'))
+
+    games = games.drop(columns=[c for c, _ in cols if c in games.columns])
+    base = list(games.columns)
+    games = games.join(block, on='team').join(opp_block, on='opp')
+
+    # player slots no team filled stay as 0, like the columns the original loop initialised
+    for c, suffix in cols:
+        if suffix != 'age' and (c not in games.columns or games[c].isna().all()):
+            games[c] = 0
+        else:
+            games[c] = games[c].fillna(0).astype(dtypes[suffix])
 
-    for i in range(1,9):
-        games[f'oppP{i}Or'] = 0
-        games[f'oppP{i}Dr'] = 0
-        games[f'oppP{i}name'] = 0
-        games[f'oppP{i}MP'] = 0
-        games['oppage'] = 0
-
-
-    for i,r in tqdm(games.iterrows()):
-        date = r['date']
-        team = r['team']
-        opp = r['opp']
-        szn = int(r['season'])
-        # po = r['szn_type']
-
-        teammp = mp[mp.TEAM == team]
-        oppmp = mp[mp.TEAM == opp]
-
-        # Use Get Top Players Function To Return Roster and Player Info
-        top = tl.top_players(team, teammp.PLAYER.unique(), stats, szn)
-        otop = tl.top_players(opp, oppmp.PLAYER.unique(), stats, szn)
-
-        roster = top.merge(teammp, on='PLAYER', how='left')
-        oroster = otop.merge(oppmp, on='PLAYER', how='left')
-
-        roster.drop(columns=['DATE','TEAM','SEASON'], inplace=True)
-        oroster.drop(columns=['DATE','TEAM','SEASON'], inplace=True)
-
-        names = list(roster.iloc[0:7,0].values)
-        Or = list(roster.iloc[0:7,1].values)
-        Dr = list(roster.iloc[0:7,2].values)
-        minutes = list(roster.iloc[0:7,4].values)
-        age = round(np.sum(roster.iloc[0:7,3].values)/8,1)
-        games.loc[i,'age'] = age
-
-
-        onames = list(oroster.iloc[0:7,0].values)
-        oOr = list(oroster.iloc[0:7,1].values)
-        oDr = list(oroster.iloc[0:7,2].values)
-        ominutes = list(oroster.iloc[0:7,4].values)
-        oage = round(np.sum(oroster.iloc[0:7,3].values)/8,1)
-        games.loc[i,'oppage'] = oage
-
-        for j,name in enumerate(names):
-            O = Or[j]
-            D = Dr[j]
-            minu = minutes[j]
-            games.loc[i,f'P{j+1}Or'] = O
-            games.loc[i,f'P{j+1}Dr'] = D
-            games.loc[i,f'P{j+1}MP'] = minu
-            games.loc[i,f'P{j+1}name'] = name
-        for x,oname in enumerate(onames):
-            oO = oOr[x]
-            oD = oDr[x]
-            ominu = ominutes[x]
-            games.loc[i,f'oppP{x+1}Or'] = oO
-            games.loc[i,f'oppP{x+1}Dr'] = oD
-            games.loc[i,f'oppP{x+1}MP'] = ominu
-            games.loc[i,f'oppP{x+1}name'] = oname
-
-    return games
+    return games[base + [c for c, _ in cols]]
+
+
+def build_games_plus_roster_by_date(games, mp, stats):
+    """
+    Runs build_games_plus_roster separately for every date in games, since rosters change from
+    one game to the next: each date's players are ranked among those with minutes on that date
+
+    Args:
+        games: Game rows over one or more dates
+        mp: Minutes per player with DATE, TEAM, PLAYER and MP columns
+        stats: Player stats with TEAM, PLAYER, MPG, AGE and raptor columns
+
+    Returns:
+        games: Game rows with the roster columns added, sorted by date
+    """
+
+    mp_by_date = dict(list(mp.groupby(pd.to_datetime(mp['DATE']).dt.strftime('%Y-%m-%d'))))
+    empty = mp.iloc[:0]
+    days = pd.to_datetime(games['date']).dt.strftime('%Y-%m-%d')
+    dates = [build_games_plus_roster(day, mp_by_date.get(date, empty), stats)
+             for date, day in games.groupby(days, sort=True)]
+
+    return pd.concat(dates, ignore_index=True)
+
+
+def roster_block(mp, stats):
+    """
+    Builds the wide P1..P8 block for every team in one pass
+
+    Players are the top 8 by MPG among those with minutes in mp, ties kept in stats order. As in
+    the original per-game loop only the first 7 rows after attaching minutes are used, and the
+    age is their summed age divided by 8
+
+    Args:
+        mp: Minutes per player with TEAM, PLAYER and MP columns
+        stats: Player stats with TEAM, PLAYER, MPG, AGE and raptor columns
+
+    Returns:
+        block: One row per team indexed by TEAM, with P{i}Or, P{i}Dr, P{i}name, P{i}MP and age columns
+    """
+
+    col = ['TEAM', 'PLAYER', 'MPG', 'AGE', 'raptor_total', 'raptor_offense', 'raptor_defense']
+    pairs = pd.MultiIndex.from_frame(mp[['TEAM', 'PLAYER']])
+    top = stats[col][pd.MultiIndex.from_frame(stats[['TEAM', 'PLAYER']]).isin(pairs)]
+
+    top = top.sort_values(by=['TEAM', 'MPG'], ascending=[True, False], kind='mergesort')
+    top = top[top.groupby('TEAM').cumcount() < 8]
+
+    roster = top.merge(mp[['TEAM', 'PLAYER', 'MP']], on=['TEAM', 'PLAYER'], how='left')
+    roster['slot'] = roster.groupby('TEAM').cumcount() + 1
+    roster = roster[roster.slot < 8]
+
+    wide = roster.pivot(index='TEAM', columns='slot', values=['raptor_offense', 'raptor_defense', 'PLAYER', 'MP'])
+    names = {'raptor_offense': 'Or', 'raptor_defense': 'Dr', 'PLAYER': 'name', 'MP': 'MP'}
+    wide.columns = [f'P{slot}{names[value]}' for value, slot in wide.columns]
+
+    age = roster.groupby('TEAM')['AGE'].sum()
+    age[roster['AGE'].isna().groupby(roster['TEAM']).any()] = np.nan
+    wide['age'] = (age / 8).round(1)
+
+    return wide
 
 
 def build_prediction_data(games_base, team_stats, elo):
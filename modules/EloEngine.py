@@ -0,0 +1,250 @@
+import os
+import json
+import numpy as np
+import pandas as pd
+import datetime as dt
+from . import Scrapers as scrape
+from . import DatasetCompilers as dc
+
+
+STATE_PATH = os.path.join(os.path.join(os.path.expanduser('~')), 'Desktop/PREDICT_NBA/EloState.json')
+
+# FiveThirtyEight's NBA Elo parameters
+K = 20
+HOME_ADV = 100
+MEAN = 1505
+CARRYOVER = 0.75
+
+# every team starts at the mean FiveThirtyEight's ratings regress to. Starting below it leaves the whole
+# league offset, since games move ratings between teams without changing their total
+INITIAL = MEAN
+
+# seasons rated before the first season asked for. The models were trained on FiveThirtyEight's ratings,
+# carried over since 1947, and three seasons from INITIAL bring every team to within 0.1 points of a
+# rating started long before (see benchmarks/bench_elo.py)
+WARMUP_SEASONS = 3
+
+# franchises that changed abbreviation keep their rating: new abbreviation -> old
+RENAMES = {'CHO': 'CHA', 'NOP': 'NOH'}
+
+
+def season_games(season):
+    """
+    Purpose:
+        Loads a season's games, one row per game, from the cached schedule pages
+
+    Args:
+        season: Season, e.g. 2023 for 2022-23
+    Returns:
+        games: season, date ('YYYY-MM-DD'), home, away, home_pts, away_pts with team abbreviations
+    """
+
+    sched = scrape.get_szn_schedule(season)
+    games = pd.DataFrame({'season': sched['season'],
+                          'date': pd.to_datetime(sched['date']).dt.strftime('%Y-%m-%d'),
+                          'home': sched['home_team'].map(dc.ABV_DICT),
+                          'away': sched['away_team'].map(dc.ABV_DICT),
+                          'home_pts': sched['home_pts'].astype('int'),
+                          'away_pts': sched['away_pts'].astype('int')})
+    if games[['home', 'away']].isna().any().any():
+        raise KeyError(sched.loc[games[['home', 'away']].isna().any(axis=1)].iloc[0].to_dict())
+    return games
+
+
+def compute(games, ratings=None, season=None):
+    """
+    Purpose:
+        Runs Elo through a set of games in date order, carrying ratings over between seasons.
+        Teams play at most once a day, so each date is updated in one vectorized step
+
+        Games without a result (both scores 0) get pre-game ratings but don't change them
+
+    Args:
+        games: Output of season_games, one or more seasons
+        ratings: Dict of team -> rating to start from, INITIAL for every team when None
+        season: Season the starting ratings are from, so the first season in games gets the carryover
+    Returns:
+        pre: games with home_elo and away_elo, each team's rating before the game
+        ratings: Dict of team -> rating after the last game
+        season: Season of the last game
+    """
+
+    games = games.sort_values(by=['date'], kind='mergesort').reset_index(drop=True)
+
+    ratings = dict(ratings or {})
+    teams = sorted(set(ratings) | set(games['home']) | set(games['away']))
+    index = {team: i for i, team in enumerate(teams)}
+    R = np.array([ratings.get(team, np.nan) for team in teams], dtype='float64')
+
+    h = games['home'].map(index).to_numpy()
+    a = games['away'].map(index).to_numpy()
+    hp = games['home_pts'].to_numpy(dtype='float64')
+    ap = games['away_pts'].to_numpy(dtype='float64')
+    played = (hp + ap) > 0
+
+    home_elo = np.empty(len(games))
+    away_elo = np.empty(len(games))
+
+    seasons = games['season'].to_numpy()
+    dates = games['date'].to_numpy()
+    bounds = np.r_[np.flatnonzero(np.r_[len(dates) > 0, dates[1:] != dates[:-1]]), len(dates)]
+
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        if season is None or seasons[start] != season:
+            if season is not None:
+                R = CARRYOVER * R + (1 - CARRYOVER) * MEAN
+            season = seasons[start]
+
+        gh, ga = h[start:end], a[start:end]
+        for side in (gh, ga):
+            new = np.isnan(R[side])
+            if new.any():
+                R[side[new]] = [_inherit(R, index, teams[i]) for i in side[new]]
+
+        home_elo[start:end] = R[gh]
+        away_elo[start:end] = R[ga]
+
+        diff = R[gh] + HOME_ADV - R[ga]
+        expected = 1 / (1 + 10 ** (-diff / 400))
+        margin = hp[start:end] - ap[start:end]
+        home_win = margin > 0
+        winner_diff = np.where(home_win, diff, -diff)
+        multiplier = (np.abs(margin) + 3) ** 0.8 / (7.5 + 0.006 * winner_diff)
+        shift = np.where(played[start:end], K * multiplier * (home_win - expected), 0)
+
+        R[gh] += shift
+        R[ga] -= shift
+
+    pre = games.assign(home_elo=home_elo, away_elo=away_elo)
+    ratings = {team: float(R[i]) for i, team in enumerate(teams) if not np.isnan(R[i])}
+
+    return pre, ratings, season
+
+
+def _inherit(R, index, team):
+    old = RENAMES.get(team)
+    if old in index and not np.isnan(R[index[old]]):
+        return R[index[old]]
+    return INITIAL
+
+
+def team_rows(pre):
+    """
+    Purpose:
+        Turns per-game ratings into the two team-perspective rows per game used by build_prediction_data
+
+    Args:
+        pre: Output of compute
+    Returns:
+        elo: date, team, opp, teamElo, oppElo, sorted by date
+    """
+
+    home = pd.DataFrame({'date': pre['date'], 'team': pre['home'], 'opp': pre['away'],
+                         'teamElo': pre['home_elo'], 'oppElo': pre['away_elo']})
+    away = pd.DataFrame({'date': pre['date'], 'team': pre['away'], 'opp': pre['home'],
+                         'teamElo': pre['away_elo'], 'oppElo': pre['home_elo']})
+
+    elo = pd.concat([home, away], ignore_index=True)
+    return elo.sort_values(by='date', kind='mergesort').reset_index(drop=True)
+
+
+def elo_history(seasons, save=True):
+    """
+    Purpose:
+        Rates every game of a range of seasons from the schedule pages, starting WARMUP_SEASONS
+        earlier so the first season doesn't open with everyone at INITIAL
+
+    Args:
+        seasons: Iterable of seasons
+        save: Save the ratings after the last completed game as the daily state
+    Returns:
+        elo: date, team, opp, teamElo, oppElo for every game of the requested seasons
+    """
+
+    seasons = sorted(set(seasons))
+    first = seasons[0] - WARMUP_SEASONS
+    games = pd.concat([season_games(s) for s in range(first, seasons[-1] + 1)], ignore_index=True)
+
+    played = games.home_pts + games.away_pts > 0
+    pre, ratings, season = compute(games[played])
+
+    if save:
+        _save_state(season, games[played].date.max(), ratings)
+
+    # today's games, still without a result, get the current ratings
+    rest, _, _ = compute(games[~played], ratings, season)
+    pre = pd.concat([pre, rest], ignore_index=True)
+
+    return team_rows(pre[pre.season.isin(seasons)])
+
+
+def daily_elo(today=None):
+    """
+    Purpose:
+        Ratings before today's games. The saved state is brought up to date with only
+        the games finished since the last run, so a normal day costs a handful of updates
+
+    Args:
+        today: Date to rate, dt.date.today() when None
+    Returns:
+        elo: date, team, opp, teamElo, oppElo for today's games
+    """
+
+    today = str(today or dt.date.today())
+    season = int(today[:4]) + 1 if int(today[5:7]) > 7 else int(today[:4])
+
+    state = _load_state()
+    if state is None or state['season'] < season - 1:
+        elo_history([season])
+        state = _load_state()
+
+    # the state has moved past the date asked for, so rate it from the start of the season instead
+    if state['season'] > season or (state['date'] or '') >= today:
+        elo = elo_history([season], save=False)
+        return elo[elo.date == today].reset_index(drop=True)
+
+    games = season_games(season)
+    played = games.home_pts + games.away_pts > 0
+    new = games[played & (games.date > (state['date'] or '')) & (games.date < today)]
+    if len(new):
+        _, ratings, state_season = compute(new, state['ratings'], state['season'])
+        _save_state(state_season, new.date.max(), ratings)
+        state = _load_state()
+
+    pre, _, _ = compute(games[games.date == today], state['ratings'], state['season'])
+    return team_rows(pre)
+
+
+def range_elo(start, end):
+    """
+    Purpose:
+        Ratings before every game from start to end, rated in one pass over the season. The saved
+        daily state is left alone, since the range can end before its date
+
+    Args:
+        start: First date, dt.date or 'YYYY-MM-DD'
+        end: Last date, in the same season as start
+    Returns:
+        elo: date, team, opp, teamElo, oppElo for the range's games
+    """
+
+    start, end = str(start), str(end)
+    season = int(start[:4]) + 1 if int(start[5:7]) > 7 else int(start[:4])
+
+    elo = elo_history([season], save=False)
+    return elo[(elo.date >= start) & (elo.date <= end)].reset_index(drop=True)
+
+
+def _load_state():
+    if not os.path.exists(STATE_PATH):
+        return None
+    with open(STATE_PATH) as f:
+        return json.load(f)
+
+
+def _save_state(season, date, ratings):
+    os.makedirs(os.path.dirname(STATE_PATH), exist_ok=True)
+    tmp = f'{STATE_PATH}.{os.getpid()}.tmp'
+    with open(tmp, 'w') as f:
+        json.dump({'season': int(season), 'date': date, 'ratings': ratings}, f, indent=0, sort_keys=True)
+    os.replace(tmp, STATE_PATH)
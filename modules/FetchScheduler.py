@@ -0,0 +1,127 @@
+import time
+import threading
+from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+
+# (requests per second, burst) for each host. basketball-reference allows 20 requests a minute
+HOST_RATES = {'www.basketball-reference.com': (20 / 60, 1)}
+DEFAULT_RATE = (10, 10)
+WORKERS = 4
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+
+class TokenBucket(object):
+
+    """
+    Thread-safe token bucket. Each request takes one token, tokens refill at a fixed rate up to capacity
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.last = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Blocks until a token is available, then takes it
+
+        Args:
+            self
+
+        Returns:
+            None
+        """
+
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.rate)
+                self.last = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def set_rate(host, rate, capacity=1):
+    """
+    Purpose:
+        Overrides the request budget for a host
+
+    Args:
+        host: Host name, e.g. www.basketball-reference.com
+        rate: Requests per second
+        capacity: Requests allowed in a burst
+    Returns:
+        None
+    """
+
+    with _buckets_lock:
+        HOST_RATES[host] = (rate, capacity)
+        _buckets.pop(host, None)
+
+
+def throttle(url):
+    """
+    Purpose:
+        Waits for the url's host to have request budget available. Called by WebCache
+        before every network request, so cache hits never spend tokens
+
+    Args:
+        url: Url about to be requested
+    Returns:
+        None
+    """
+
+    host = urlparse(url).netloc
+    with _buckets_lock:
+        bucket = _buckets.get(host)
+        if bucket is None:
+            bucket = _buckets[host] = TokenBucket(*HOST_RATES.get(host, DEFAULT_RATE))
+    bucket.acquire()
+
+
+def fetch_all(jobs, parse, workers=None, errors='raise', progress=True):
+    """
+    Purpose:
+        Fetches a batch of urls on a thread pool, rate limited per host, and parses each
+        response on the worker that fetched it
+
+    Args:
+        jobs: Dict of key -> url, or a list of urls used as their own keys
+        parse: Function called with (key, response) returning the parsed result
+        workers: Number of worker threads, defaults to WORKERS
+        errors: 'raise' to re-raise the first failed job, 'skip' to leave failed jobs out
+        progress: Show a tqdm progress bar
+    Returns:
+        results: Generator of (key, result) pairs in the order jobs finish
+    """
+
+    from .WebCache import get
+    from tqdm import tqdm
+
+    if not isinstance(jobs, dict):
+        jobs = {url: url for url in jobs}
+
+    def work(key, url):
+        return parse(key, get(url))
+
+    with ThreadPoolExecutor(max_workers=workers or WORKERS) as pool:
+        futures = {pool.submit(work, key, url): key for key, url in jobs.items()}
+        for future in tqdm(as_completed(futures), total=len(futures), disable=not progress):
+            key = futures[future]
+            try:
+                result = future.result()
+            except Exception:
+                if errors == 'raise':
+                    for f in futures:
+                        f.cancel()
+                    raise
+                continue
+            yield key, result
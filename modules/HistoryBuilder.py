@@ -0,0 +1,117 @@
+import os
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from . import Scrapers as scrape
+from . import DatasetCompilers as dc
+from . import FetchScheduler as fs
+from . import EloEngine as engine
+from . import Instrumentation as inst
+from .WebCache import current_season
+
+
+HISTORY_DIR = os.path.join(os.path.join(os.path.expanduser('~')), 'Desktop/PREDICT_NBA/HISTORY')
+WORKERS = 4
+
+
+def season_path(season):
+    return os.path.join(HISTORY_DIR, f'{season}TrainingData.csv')
+
+
+def build_season(season, raptor=None, elo=None):
+    """
+    Purpose:
+        Builds the training rows for one season: schedule and recent form, box score minutes,
+        roster stats with RAPTOR ratings, team stats and Elo, written to HISTORY/{season}TrainingData.csv
+
+    Args:
+        season: Season to build, e.g. 2023 for 2022-23
+        raptor: RAPTOR ratings from Scrapers.get_raptor, fetched when None
+        elo: Elo ratings from EloEngine.elo_history, computed when None
+    Returns:
+        path: Csv file written
+    """
+
+    with inst.span('build_game_data', season=season):
+        games = dc.build_game_data(season=season)
+    games['date'] = games['date'].dt.strftime('%Y-%m-%d')
+    teams = sorted(games.team.unique())
+
+    with inst.span('player_minutes', season=season):
+        mp = dc.build_player_minutes(games)
+    with inst.span('team_pages', season=season):
+        stats, team_stats = dc.build_team_page_stats(teams, [season])
+
+    with inst.span('raptor', season=season):
+        raptor = scrape.get_raptor() if raptor is None else raptor
+    with inst.span('elo', season=season):
+        elo = engine.elo_history([season], save=False) if elo is None else elo
+    with inst.span('build_full_stats', season=season):
+        full_stats = dc.build_full_stats(raptor[raptor.SEASON == season].copy(), stats)
+
+    # rosters change game to game, so players are ranked among those who played on each date
+    with inst.span('build_games_plus_roster', season=season):
+        gamedata = dc.build_games_plus_roster_by_date(games, mp, full_stats)
+
+    with inst.span('build_prediction_data', season=season):
+        elo = elo[elo['date'].astype('str').isin(gamedata['date'])].copy()
+        df = dc.build_prediction_data(gamedata, team_stats, elo)
+        df = df[df.win.notna()].reset_index(drop=True)
+
+    os.makedirs(HISTORY_DIR, exist_ok=True)
+    path = season_path(season)
+    tmp = f'{path}.{os.getpid()}.tmp'
+    df.to_csv(tmp, index=False)
+    os.replace(tmp, path)
+
+    return path
+
+
+def _init_worker(rates):
+
+    # each process has its own token buckets, so the host budget is split between them
+    for host, (rate, capacity) in rates.items():
+        fs.set_rate(host, rate, capacity)
+
+
+def build_history(seasons, workers=None, rebuild=False):
+    """
+    Purpose:
+        Builds training data for a range of seasons, one process per season, and merges
+        them into HISTORY/TrainingData.csv
+
+        Seasons that already have a file are reused, so adding a season only builds that season.
+        The current season is always rebuilt since its games are still being played. Workers share
+        downloaded pages through the response cache, and each gets an equal share of every
+        host's request budget so together they stay within the site's limits
+
+    Args:
+        seasons: Iterable of seasons, e.g. range(2014, 2024)
+        workers: Number of processes, defaults to WORKERS
+        rebuild: True to rebuild every season
+    Returns:
+        df: Training rows for all requested seasons, sorted by date
+    """
+
+    seasons = sorted(set(seasons))
+    todo = [s for s in seasons if rebuild or s >= current_season() or not os.path.exists(season_path(s))]
+
+    if todo:
+        workers = min(workers or WORKERS, len(todo))
+        rates = {host: (rate / workers, capacity) for host, (rate, capacity) in fs.HOST_RATES.items()}
+
+        # RAPTOR covers every season and Elo runs through the seasons in order, so both
+        # are built once here and handed to each worker
+        raptor = scrape.get_raptor()
+        elo = engine.elo_history(todo, save=False)
+
+        print(f'\nBuilding seasons {todo} on {workers} processes...')
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(rates,)) as pool:
+            futures = {pool.submit(build_season, s, raptor, elo): s for s in todo}
+            for future in as_completed(futures):
+                print(f'{futures[future]} done: {future.result()}')
+
+    df = pd.concat([pd.read_csv(season_path(s)) for s in seasons], ignore_index=True)
+    df = df.sort_values(by=['date', 'team'], kind='mergesort').reset_index(drop=True)
+    df.to_csv(os.path.join(HISTORY_DIR, 'TrainingData.csv'), index=False)
+
+    return df
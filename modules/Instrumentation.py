@@ -0,0 +1,312 @@
+import os
+import sys
+import json
+import time
+import warnings
+import importlib
+import threading
+import tracemalloc
+import datetime as dt
+from urllib.parse import urlparse
+from contextlib import contextmanager
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+RUNS_DIR = os.path.join(os.path.join(os.path.expanduser('~')), 'Desktop/PREDICT_NBA/RUNS')
+
+# tracemalloc slows allocation down (imports most of all, a daily run takes more than twice as long),
+# so it's only switched on with NBAPREDICT_TRACE_MEMORY=1. Spans record the process's peak resident memory either way
+TRACE_MEMORY = os.environ.get('NBAPREDICT_TRACE_MEMORY', '0') == '1'
+
+# 'package.module:function' of a metrics sink added to every run, see add_sink
+SINK_ENV = 'NBAPREDICT_METRICS_SINK'
+
+_sinks = []
+_run = None
+_lock = threading.Lock()
+_local = threading.local()
+
+
+class Run(object):
+
+    """
+    Spans and fetches recorded between start_run and finish_run, written out as a json report
+    """
+
+    def __init__(self, name, trace_memory):
+        self.started = dt.datetime.now()
+        self.id = self.started.strftime('%Y%m%d-%H%M%S') + f'-{name}'
+        self.name = name
+        self.trace_memory = trace_memory
+        self.start = time.perf_counter()
+        self.finished = None
+        self.spans = []
+        self.fetches = []
+        self.stage = None
+        self.started_tracing = False
+        self.path = os.path.join(RUNS_DIR, f'{self.id}.json')
+
+    def report(self):
+        """
+        Summarises the run: every span in the order it finished, plus fetch totals overall and per host
+
+        Args:
+            self
+
+        Returns:
+            report: Dict, as written to the json file
+        """
+
+        with _lock:
+            spans = list(self.spans)
+            fetches = list(self.fetches)
+
+        hosts = {}
+        for f in fetches:
+            h = hosts.setdefault(f['host'], {'requests': 0, 'cache_hits': 0, 'bytes': 0, 'seconds': 0.0, 'wait': 0.0})
+            h['requests'] += 1
+            h['cache_hits'] += f['cache_hit']
+            h['bytes'] += f['bytes']
+            h['seconds'] += f['seconds']
+            h['wait'] += f['wait']
+        for h in hosts.values():
+            h['seconds'] = round(h['seconds'], 4)
+            h['wait'] = round(h['wait'], 4)
+
+        end = self.finished if self.finished is not None else time.perf_counter()
+        return {'run': self.id,
+                'name': self.name,
+                'started': self.started.isoformat(timespec='seconds'),
+                'seconds': round(end - self.start, 4),
+                'finished': self.finished is not None,
+                'peak_bytes': max((s['peak_bytes'] for s in spans if s['peak_bytes'] is not None), default=None),
+                'max_rss_bytes': _max_rss(),
+                'python': sys.version.split()[0],
+                'pid': os.getpid(),
+                'spans': spans,
+                'fetch_summary': {'requests': len(fetches),
+                                  'cache_hits': sum(f['cache_hit'] for f in fetches),
+                                  'bytes': sum(f['bytes'] for f in fetches),
+                                  'hosts': hosts},
+                'fetches': fetches}
+
+    def write(self):
+        """
+        Writes the report to RUNS_DIR/{run id}.json, replacing an earlier write of the same run
+
+        Args:
+            self
+
+        Returns:
+            path: Json file written
+        """
+
+        os.makedirs(RUNS_DIR, exist_ok=True)
+        tmp = f'{self.path}.{os.getpid()}.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.report(), f, indent=1, default=str)
+        os.replace(tmp, self.path)
+        return self.path
+
+
+def add_sink(sink):
+    """
+    Purpose:
+        Registers a metrics sink. It's called with every finished span and every fetch as a dict
+        with a 'type' of 'span' or 'fetch'; see span and fetch for the fields. Errors raised by
+        a sink are turned into warnings so they can't stop a run
+
+    Args:
+        sink: Callable taking one dict
+    Returns:
+        sink
+    """
+
+    with _lock:
+        if sink not in _sinks:
+            _sinks.append(sink)
+    return sink
+
+
+def remove_sink(sink):
+    with _lock:
+        if sink in _sinks:
+            _sinks.remove(sink)
+
+
+def _env_sink():
+
+    target = os.environ.get(SINK_ENV)
+    if not target:
+        return
+    module, _, attr = target.partition(':')
+    try:
+        add_sink(getattr(importlib.import_module(module), attr))
+    except (ImportError, AttributeError, ValueError) as e:
+        warnings.warn(f'Could not load the metrics sink {target}: {e}')
+
+
+def _max_rss():
+    if resource is None:
+        return None
+    # ru_maxrss is in bytes on macOS and kilobytes on Linux
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+
+def _emit(record):
+    for sink in list(_sinks):
+        try:
+            sink(record)
+        except Exception as e:
+            warnings.warn(f'Metrics sink {sink!r} failed: {type(e).__name__}: {e}')
+
+
+def start_run(name, trace_memory=None):
+    """
+    Purpose:
+        Starts recording a run. Spans and fetches from any thread are added to it until finish_run
+
+    Args:
+        name: Name of the run, e.g. 'predict'
+        trace_memory: Record peak memory per span with tracemalloc, TRACE_MEMORY when None
+    Returns:
+        run: The new Run
+    """
+
+    global _run
+    if _run is not None:
+        finish_run()
+
+    trace_memory = TRACE_MEMORY if trace_memory is None else trace_memory
+    started_tracing = trace_memory and not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    _env_sink()
+    _run = Run(name, trace_memory and tracemalloc.is_tracing())
+    _run.started_tracing = started_tracing
+    return _run
+
+
+def current_run():
+    return _run
+
+
+def finish_run():
+    """
+    Purpose:
+        Stops recording, writes the run report and stops memory tracing if start_run started it
+
+    Args:
+        None
+    Returns:
+        path: Json report written, None if no run was active
+    """
+
+    global _run
+    run, _run = _run, None
+    if run is None:
+        return None
+    run.finished = time.perf_counter()
+    if run.started_tracing and tracemalloc.is_tracing():
+        tracemalloc.stop()
+    return run.write()
+
+
+@contextmanager
+def span(name, **attrs):
+    """
+    Purpose:
+        Times a stage and, while memory is traced, records the peak memory allocated during it.
+        Spans nest; a parent's peak includes its children's
+
+        Finished spans are added to the current run and sent to every sink as
+        {'type': 'span', 'name', 'parent', 'depth', 'start', 'seconds', 'start_bytes', 'peak_bytes', 'max_rss_bytes', 'error', **attrs}.
+        start_bytes and peak_bytes are Python allocations traced by tracemalloc (None when it's off),
+        max_rss_bytes the process's peak resident memory so far
+
+    Args:
+        name: Stage name
+        attrs: Extra json-serialisable fields for the record
+    Yields:
+        record: The span's dict, which the stage can add fields to
+    """
+
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        stack = _local.stack = []
+
+    run = _run
+    tracing = tracemalloc.is_tracing()
+    start_bytes = None
+    if tracing:
+        start_bytes, peak = tracemalloc.get_traced_memory()
+        if stack:
+            stack[-1]['_peak'] = max(stack[-1]['_peak'], peak)
+        tracemalloc.reset_peak()
+
+    record = {'type': 'span', 'name': name, 'parent': stack[-1]['name'] if stack else None, 'depth': len(stack),
+              'start': round(time.perf_counter() - run.start, 4) if run else None, **attrs}
+    frame = {'name': name, '_peak': 0}
+    stack.append(frame)
+    outer_stage = run.stage if run else None
+    if run:
+        run.stage = name
+
+    start = time.perf_counter()
+    error = None
+    try:
+        yield record
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        seconds = time.perf_counter() - start
+        stack.pop()
+        peak_bytes = None
+        if tracing and tracemalloc.is_tracing():
+            peak_bytes = max(frame['_peak'], tracemalloc.get_traced_memory()[1])
+            if stack:
+                stack[-1]['_peak'] = max(stack[-1]['_peak'], peak_bytes)
+            tracemalloc.reset_peak()
+        if run:
+            run.stage = outer_stage
+
+        record.update(seconds=round(seconds, 4), start_bytes=start_bytes, peak_bytes=peak_bytes,
+                      max_rss_bytes=_max_rss(), error=error)
+        if run:
+            with _lock:
+                run.spans.append(record)
+        _emit(record)
+
+
+def fetch(url, seconds, nbytes, cache_hit, status, wait=0.0):
+    """
+    Purpose:
+        Records one request made through WebCache.get
+
+        Sent to every sink as {'type': 'fetch', 'url', 'host', 'stage', 'bytes', 'seconds', 'wait', 'cache_hit', 'status'},
+        where stage is the innermost span open when the request was made and wait the time spent rate limited
+
+    Args:
+        url: Url requested
+        seconds: Total time taken, including wait
+        nbytes: Size of the response body
+        cache_hit: Whether the response came from the cache
+        status: Http status code
+        wait: Seconds spent waiting for the host's rate limit
+    Returns:
+        None
+    """
+
+    run = _run
+    record = {'type': 'fetch', 'url': url, 'host': urlparse(url).netloc, 'stage': run.stage if run else None,
+              'bytes': nbytes, 'seconds': round(seconds, 4), 'wait': round(wait, 4),
+              'cache_hit': bool(cache_hit), 'status': status}
+    if run:
+        with _lock:
+            run.fetches.append(record)
+    _emit(record)
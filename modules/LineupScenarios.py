@@ -0,0 +1,165 @@
+import numpy as np
+import pandas as pd
+from . import ModelRegistry as registry
+from . import Instrumentation as inst
+from . import CompiledModels as compiled
+from .NBAtools import PREDICTION_FEATURES
+
+
+# player slots in the roster columns; build_games_plus_roster only fills the first 7, P8 stays 0
+SLOTS = range(1, 9)
+
+# RAPTOR x minutes features: (feature, side, rating), side 0 being the team's P slots and 1 the opponent's oppP slots
+ROSTER_FEATURES = [('RVTo', 0, 'Or'), ('RVTd', 0, 'Dr'), ('oRVTo', 1, 'Or'), ('oRVTd', 1, 'Dr')]
+
+
+def _rv(ratings, mp):
+    # same rounding as build_prediction_data: each player's RAPTOR x minutes to 2 places, then the total
+    return np.round(np.round(ratings * mp, 2).sum(axis=-1), 2)
+
+
+class ScenarioEngine(object):
+
+    """
+    Scores lineup what-ifs (players ruled out, minutes changed) on a compiled prediction dataset
+    without running the pipeline again. Only the RAPTOR x minutes features are rebuilt, from the
+    P1..P8 ratings and minutes already in the dataset; which players fill the slots, the team's
+    average age and every other feature stay as they were
+    """
+
+    def __init__(self, data, models=None, estimators=None):
+        """
+        Args:
+            self
+            data: Prediction dataset from build_prediction_data, e.g. the first frame returned by
+                  DailyReport.score, with the P{i}Or/Dr/MP/name and oppP{i}Or/Dr/MP/name columns
+            models: Models to score with, any of 'log', 'mlp' and 'rf'. All three when None
+            estimators: Fitted models by name, the compiled models (see CompiledModels.estimator) when None
+
+        Returns:
+            self.models: Names of the models scored
+            self.players: One row per player slot on the slate: PLAYER, TEAM, OPP, DATE, MP
+        """
+
+        self.models = registry.check_names(models)
+        self.estimators = estimators or {name: compiled.estimator(name) for name in self.models}
+        self.features = list(PREDICTION_FEATURES)
+        data = data.reset_index(drop=True)
+        self.n = len(data)
+
+        self.date = data['date'].astype('str').to_numpy()
+        self.team = data['team'].to_numpy()
+        self.opp = data['opp'].to_numpy()
+        self.X = data[self.features].to_numpy(dtype='float64')
+        self.columns = {feature: self.features.index(feature) for feature, _, _ in ROSTER_FEATURES}
+
+        # (row, side, slot) arrays of each player's ratings and minutes
+        prefixes = ['P', 'oppP']
+        self.ratings = {r: np.stack([data[[f'{p}{i}{r}' for i in SLOTS]].to_numpy(dtype='float64') for p in prefixes],
+                                    axis=1)
+                        for r in ['Or', 'Dr']}
+        self.mp = np.stack([data[[f'{p}{i}MP' for i in SLOTS]].to_numpy(dtype='float64') for p in prefixes], axis=1)
+        names = np.stack([data[[f'{p}{i}name' for i in SLOTS]].to_numpy(dtype='object') for p in prefixes], axis=1)
+
+        # name -> every (row, side, slot) the player fills, as a team player and as an opponent.
+        # Empty slots hold 0 rather than a name
+        filled = np.vectorize(lambda v: isinstance(v, str), otypes=[bool])(names)
+        self._positions = {}
+        for row, side, slot in zip(*np.nonzero(filled)):
+            self._positions.setdefault(names[row, side, slot], []).append((row, side, slot))
+
+        rows, slots = np.nonzero(filled[:, 0])
+        self.players = pd.DataFrame({'PLAYER': names[rows, 0, slots], 'TEAM': self.team[rows], 'OPP': self.opp[rows],
+                                     'DATE': self.date[rows], 'MP': self.mp[rows, 0, slots]})
+
+    def _edits(self, scenarios):
+
+        s, r, side, slot, value = [], [], [], [], []
+        for i, scenario in enumerate(scenarios):
+            # minutes first, so a player both given minutes and ruled out ends up out
+            changes = list(scenario.get('minutes', {}).items()) + [(p, 0.0) for p in scenario.get('out', [])]
+            for player, minutes in changes:
+                if player not in self._positions:
+                    raise ValueError(f'{player} is not one of the players in the slate\'s roster features')
+                if minutes < 0:
+                    raise ValueError(f'{player} can\'t play {minutes} minutes')
+                for position in self._positions[player]:
+                    s.append(i)
+                    r.append(position[0])
+                    side.append(position[1])
+                    slot.append(position[2])
+                    value.append(minutes)
+        return [np.array(a, dtype=dtype) for a, dtype in
+                [(s, 'int64'), (r, 'int64'), (side, 'int64'), (slot, 'int64'), (value, 'float64')]]
+
+    def run(self, scenarios):
+        """
+        Scores a batch of scenarios. Every scenario's changed rows are rebuilt together and scored
+        with one predict_proba call per model, along with the unchanged slate
+
+        Args:
+            self
+            scenarios: List of dicts, each with any of
+                       'out': players ruled out
+                       'minutes': {player: minutes} overrides
+                       'name': label for the SCENARIO column, the scenario's position when omitted
+
+        Returns:
+            df: One row per game row a scenario changes: SCENARIO, DATE, TEAM, OPP, WIN, then for
+                each model its probability and the change from the unchanged slate (dLOG_PROB_%, ...)
+        """
+
+        labels = np.array([scenario.get('name', i) for i, scenario in enumerate(scenarios)], dtype='object')
+
+        with inst.span('scenario_features', scenarios=len(scenarios)):
+            s, r, side, slot, value = self._edits(scenarios)
+
+            # only the (scenario, row) pairs something changed in are rebuilt and scored
+            pairs, pair = np.unique(s * self.n + r, return_inverse=True)
+            rows = pairs % self.n
+            mp = self.mp[rows]
+            mp[pair, side, slot] = value
+
+            X = self.X[rows]
+            for feature, team_side, rating in ROSTER_FEATURES:
+                X[:, self.columns[feature]] = _rv(self.ratings[rating][rows, team_side], mp[:, team_side])
+            X = pd.DataFrame(np.concatenate([self.X, X]), columns=self.features)
+
+        df = pd.DataFrame({'SCENARIO': labels[pairs // self.n], 'DATE': self.date[rows],
+                           'TEAM': self.team[rows], 'OPP': self.opp[rows]})
+        with inst.span('scenario_inference', models=self.models, rows=len(X)):
+            for i, name in enumerate(self.models):
+                _, col, _ = registry.MODELS[name]
+                with inst.span('predict_proba', model=name):
+                    prob = self.estimators[name].predict_proba(X)[:, 1]
+                if i == 0:
+                    df['WIN'] = (prob[self.n:] > 0.5).astype('int64')
+                pct = np.round(prob * 100, 1)
+                df[col] = pct[self.n:]
+                df[f'd{col}'] = np.round(pct[self.n:] - pct[rows], 1)
+
+        return df
+
+    def injury_table(self, players=None):
+        """
+        Rules each player out on their own and reports how their team's chances change
+
+        Args:
+            self
+            players: Players to rule out, every player with minutes on the slate when None
+
+        Returns:
+            df: One row per player: PLAYER, TEAM, OPP, DATE, MP, then for each model the team's
+                probability without them and the change, biggest drop first
+        """
+
+        table = self.players[self.players.MP > 0] if players is None else \
+            self.players[self.players.PLAYER.isin(players)]
+        table = table.drop_duplicates('PLAYER').reset_index(drop=True)
+
+        scored = self.run([{'name': player, 'out': [player]} for player in table.PLAYER])
+        scored = scored.rename(columns={'SCENARIO': 'PLAYER'}).drop(columns=['WIN'])
+        df = table.merge(scored, on=['PLAYER', 'DATE', 'TEAM', 'OPP'], how='left')
+
+        _, col, _ = registry.MODELS[self.models[0]]
+        return df.sort_values(f'd{col}', kind='mergesort').reset_index(drop=True)
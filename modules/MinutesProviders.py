@@ -0,0 +1,256 @@
+import os
+import io
+import abc
+import json
+import time
+import atexit
+import threading
+import pandas as pd
+from .WebCache import get
+
+
+PAGE_URL = 'https://www.lineups.com/nba/nba-player-minutes-per-game'
+
+# url of a json minutes feed, read instead of driving the lineups.com page in a browser. lineups.com doesn't
+# document the feed its page is rendered from, so there's no default: it's only used when set
+MINUTES_URL_ENV = 'NBAPREDICT_MINUTES_URL'
+
+# projections move during the day as injury news comes in
+MINUTES_TTL = 10 * 60
+
+# seconds the browser waits for the page's controls before giving up
+BROWSER_TIMEOUT = 20
+
+# columns of the csv export on the lineups.com page, which every provider returns
+COLUMNS = ['Name', 'Team', 'Projected Minutes']
+
+_FIELDS = {'Name': ['name', 'player', 'player_name', 'full_name'],
+           'Team': ['team', 'team_abbreviation', 'team_abbr'],
+           'Projected Minutes': ['projected_minutes', 'proj_minutes', 'minutes', 'projected_mins']}
+
+
+class MinutesProvider(abc.ABC):
+
+    """
+    Source of today's projected minutes. fetch() returns a DataFrame with the Name, Team and
+    Projected Minutes columns of the lineups.com csv export and records how long it took in timings
+    """
+
+    name = 'base'
+
+    def __init__(self):
+        self.timings = {'startup': 0.0, 'fetch': 0.0}
+
+    def fetch(self):
+        """
+        Gets today's projected minutes, recording the time spent starting the source up (a browser, say)
+        and fetching the data separately in self.timings
+
+        Args:
+            self
+
+        Returns:
+            df: Name, Team and Projected Minutes
+        """
+
+        self.timings = {'startup': 0.0, 'fetch': 0.0}
+        start = time.perf_counter()
+        try:
+            return self._fetch()
+        finally:
+            self.timings['fetch'] = time.perf_counter() - start - self.timings['startup']
+
+    @abc.abstractmethod
+    def _fetch(self):
+        """Gets the projections, see fetch"""
+
+
+class HttpMinutesProvider(MinutesProvider):
+
+    """
+    Reads the projections from a json feed, NBAPREDICT_MINUTES_URL by default, no browser needed
+    """
+
+    name = 'http'
+
+    def __init__(self, url=None):
+        super().__init__()
+        self.url = url or os.environ.get(MINUTES_URL_ENV)
+
+    def _fetch(self):
+
+        if not self.url:
+            raise ValueError(f'No minutes feed url, set {MINUTES_URL_ENV}')
+        resp = get(self.url, ttl=MINUTES_TTL)
+        if resp.status_code != 200:
+            raise ValueError(f'{self.url} returned {resp.status_code}')
+        return parse_minutes_json(json.loads(resp.content))
+
+
+class BrowserMinutesProvider(MinutesProvider):
+
+    """
+    Drives the lineups.com page in a headless Firefox, waiting for each control to be ready instead
+    of sleeping. The browser is started once per process and reused by later fetches
+    """
+
+    name = 'browser'
+
+    _driver = None
+    _lock = threading.Lock()
+
+    def _fetch(self):
+
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.support import expected_conditions as EC
+        from selenium.webdriver.support.ui import WebDriverWait
+
+        with BrowserMinutesProvider._lock:
+            driver = self._session()
+            driver.get(PAGE_URL)
+            wait = WebDriverWait(driver, BROWSER_TIMEOUT)
+
+            # switch the table to its csv view and show every player
+            base = '/html/body/app-root/div[3]/app-minutes-router/app-minutes/div/div'
+            wait.until(EC.element_to_be_clickable((By.XPATH, f'{base}/div[4]/div/div[2]/div[2]/div/div/button'))).click()
+            wait.until(EC.element_to_be_clickable((By.XPATH, f'{base}/div[4]/div/div[2]/div[1]/div/app-dropdown/div/button/span'))).click()
+            wait.until(EC.element_to_be_clickable((By.XPATH, f'{base}/div[4]/div/div[2]/div[1]/div/app-dropdown/div/div/div[4]'))).click()
+
+            csv_text = (By.XPATH, f'{base}/div[5]/div/p')
+            wait.until(lambda d: d.find_element(*csv_text).text.count('\n') > 1)
+            text = driver.find_element(*csv_text).text
+
+        return pd.read_csv(io.StringIO(text), header=0)[COLUMNS]
+
+    def _session(self):
+
+        if BrowserMinutesProvider._driver is None:
+            from selenium import webdriver
+
+            start = time.perf_counter()
+            options = webdriver.FirefoxOptions()
+            options.add_argument('-headless')
+            BrowserMinutesProvider._driver = webdriver.Firefox(options=options)
+            atexit.register(BrowserMinutesProvider.close)
+            self.timings['startup'] = time.perf_counter() - start
+
+        return BrowserMinutesProvider._driver
+
+    @classmethod
+    def close(cls):
+        """
+        Quits the shared browser session, if one was started
+
+        Args:
+            cls
+
+        Returns:
+            None
+        """
+
+        with cls._lock:
+            if cls._driver is not None:
+                cls._driver.quit()
+                cls._driver = None
+
+
+class FileMinutesProvider(MinutesProvider):
+
+    """
+    Reads projections saved to disk, either the lineups.com csv export or the json feed. Used to run offline
+    """
+
+    name = 'file'
+
+    def __init__(self, path=None):
+        super().__init__()
+        self.path = path or os.environ.get('NBAPREDICT_MINUTES_FILE')
+
+    def _fetch(self):
+
+        if not self.path or not os.path.exists(self.path):
+            raise ValueError(f'No minutes file found at {self.path}')
+        if self.path.endswith('.json'):
+            with open(self.path) as f:
+                return parse_minutes_json(json.load(f))
+        return pd.read_csv(self.path)[COLUMNS]
+
+
+def parse_minutes_json(payload):
+    """
+    Purpose:
+        Converts the lineups.com minutes feed to the columns of the page's csv export
+
+    Args:
+        payload: Decoded json, either a list of player records or an object holding one
+    Returns:
+        df: Name, Team and Projected Minutes
+    """
+
+    records = payload
+    if isinstance(payload, dict):
+        records = next((v for v in payload.values() if isinstance(v, list) and v and isinstance(v[0], dict)), None)
+    if not records:
+        raise ValueError('No player records in the minutes feed')
+
+    df = pd.DataFrame(records)
+    lower = {c.lower(): c for c in df.columns}
+    cols = {}
+    for col, candidates in _FIELDS.items():
+        found = next((lower[c] for c in candidates if c in lower), None)
+        if found is None:
+            raise ValueError(f'Minutes feed has no {col} field, found {list(df.columns)}')
+        cols[found] = col
+
+    df = df[list(cols)].rename(columns=cols)
+    df['Projected Minutes'] = pd.to_numeric(df['Projected Minutes'], errors='coerce').fillna(0).round()
+    return df
+
+
+def default_providers():
+    """
+    Purpose:
+        Providers tried by get_projected_minutes: the minutes file when NBAPREDICT_MINUTES_FILE is set,
+        otherwise the headless browser, tried after the json feed when NBAPREDICT_MINUTES_URL is set
+
+    Args:
+        None
+    Returns:
+        providers: List of MinutesProvider
+    """
+
+    if os.environ.get('NBAPREDICT_MINUTES_FILE'):
+        return [FileMinutesProvider()]
+    if os.environ.get(MINUTES_URL_ENV):
+        return [HttpMinutesProvider(), BrowserMinutesProvider()]
+    return [BrowserMinutesProvider()]
+
+
+def fetch_minutes(providers=None):
+    """
+    Purpose:
+        Gets today's projected minutes from the first provider that succeeds, printing
+        the startup and fetch time of every provider tried
+
+    Args:
+        providers: List of MinutesProvider, default_providers() when None
+    Returns:
+        df: Name, Team and Projected Minutes
+        timings: List of (provider name, startup seconds, fetch seconds, error or None)
+    """
+
+    timings = []
+    for provider in providers or default_providers():
+        try:
+            df = provider.fetch()
+            error = None
+        except Exception as e:
+            df = None
+            error = f'{type(e).__name__}: {e}'
+        timings.append((provider.name, provider.timings['startup'], provider.timings['fetch'], error))
+        print(f"minutes provider {provider.name}: startup {provider.timings['startup']:.2f}s, "
+              f"fetch {provider.timings['fetch']:.2f}s" + (f' (failed, {error})' if error else ''))
+        if df is not None:
+            return df, timings
+
+    raise ValueError('No minutes provider succeeded')
@@ -0,0 +1,199 @@
+import os
+import json
+import pickle
+import hashlib
+import warnings
+import threading
+import datetime as dt
+
+
+MODEL_DIR = os.path.join(os.path.join(os.path.expanduser('~')), 'Desktop/PREDICT_NBA/MODELS')
+
+# model name -> (file in MODEL_DIR, prediction store column, TodayPred column)
+MODELS = {'log': ('logreg_model.sav', 'LOG_PROB_%', 'Probability (LR)'),
+          'mlp': ('mlp_model.sav', 'MLP_PROB_%', 'Probability (MLP)'),
+          'rf': ('rf_model.sav', 'RF_PROB_%', 'Probability (RF)')}
+
+# one json line per saved model version
+VERSIONS_PATH = os.path.join(MODEL_DIR, 'versions.jsonl')
+
+# versioned files kept per model, older ones are deleted when a new version is saved
+KEEP_VERSIONS = 10
+
+# loaded models are shared by every DailyReport in the process, keyed by name
+_loaded = {}
+_lock = threading.Lock()
+
+
+def model_path(name):
+    return os.path.join(MODEL_DIR, MODELS[name][0])
+
+
+def check_names(names):
+    """
+    Purpose:
+        Validates a selection of model names
+
+    Args:
+        names: Model names, None for all models
+    Returns:
+        names: List of model names in registry order
+    """
+
+    if names is None:
+        return list(MODELS)
+    if isinstance(names, str):
+        names = [names]
+    unknown = [n for n in names if n not in MODELS]
+    if unknown:
+        raise ValueError(f'Unknown model(s) {unknown}, choose from {list(MODELS)}')
+    return [n for n in MODELS if n in names]
+
+
+def load(name):
+    """
+    Purpose:
+        Returns a model, unpickling it on first use. Later calls reuse the loaded model
+        until the file on disk changes, e.g. after retrain_model saves a new one
+
+    Args:
+        name: 'log', 'mlp' or 'rf'
+    Returns:
+        model: Fitted sklearn estimator
+    """
+
+    path = model_path(name)
+    stat = os.stat(path)
+    stamp = (stat.st_mtime_ns, stat.st_size)
+
+    with _lock:
+        entry = _loaded.get(name)
+        if entry is not None and entry['stamp'] == stamp:
+            return entry['model']
+
+        with open(path, 'rb') as f:
+            blob = f.read()
+
+        # sklearn drops the version a model was pickled with on load, but warns when it differs from ours.
+        # It is imported here rather than at the top so reading the registry stays cheap
+        import sklearn
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            model = pickle.loads(blob)
+        version = next((str(w.message.original_sklearn_version) for w in caught
+                        if hasattr(w.message, 'original_sklearn_version')), sklearn.__version__)
+
+        sha256 = hashlib.sha256(blob).hexdigest()
+        record = next((v for v in versions(name) if v['sha256'] == sha256), {})
+        _loaded[name] = {'model': model,
+                         'stamp': stamp,
+                         'meta': {'name': name,
+                                  'path': path,
+                                  'version': record.get('version', 0),
+                                  'sha256': sha256,
+                                  'size': len(blob),
+                                  'modified': dt.datetime.fromtimestamp(stat.st_mtime).isoformat(timespec='seconds'),
+                                  'estimator': type(model).__name__,
+                                  'sklearn_version': version}}
+        return model
+
+
+def metadata(name):
+    """
+    Purpose:
+        Describes a loaded model: file, version (0 for the model shipped with the package), sha256 hash,
+        size, modification time, estimator class and the sklearn version it was pickled with
+
+    Args:
+        name: 'log', 'mlp' or 'rf'
+    Returns:
+        meta: Dict of metadata, None if the model hasn't been loaded in this process
+    """
+
+    entry = _loaded.get(name)
+    return None if entry is None else dict(entry['meta'])
+
+
+def is_loaded(name):
+    return name in _loaded
+
+
+def unload(name=None):
+    """
+    Purpose:
+        Drops loaded models from memory so the next use reads them from disk again
+
+    Args:
+        name: Model to drop, all models when None
+    Returns:
+        None
+    """
+
+    with _lock:
+        if name is None:
+            _loaded.clear()
+        else:
+            _loaded.pop(name, None)
+
+
+def versions(name=None):
+    """
+    Purpose:
+        Lists the saved model versions, oldest first
+
+    Args:
+        name: Only list versions of this model, all models when None
+    Returns:
+        records: List of dicts with name, version, file, sha256, trained and any details passed to save
+    """
+
+    if not os.path.exists(VERSIONS_PATH):
+        return []
+    with open(VERSIONS_PATH) as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    return [r for r in records if name is None or r['name'] == name]
+
+
+def save(name, model, **details):
+    """
+    Purpose:
+        Saves a new version of a model. The pickle is written to a numbered file next to the current one,
+        e.g. MODELS/logreg_model.v0003.sav, then swapped in as the current file with os.replace, so a
+        report loading the model at the same time sees either the old file or the new one, never a partial write
+
+    Args:
+        name: 'log', 'mlp' or 'rf'
+        model: Fitted estimator
+        details: Extra fields recorded with the version, e.g. training rows and fit time
+    Returns:
+        record: The version record written to versions.jsonl
+    """
+
+    blob = pickle.dumps(model)
+    history = versions(name)
+    version = history[-1]['version'] + 1 if history else 1
+
+    stem = os.path.splitext(MODELS[name][0])[0]
+    file = f'{stem}.v{version:04d}.sav'
+    _write_atomic(os.path.join(MODEL_DIR, file), blob)
+    _write_atomic(model_path(name), blob)
+
+    record = {'name': name, 'version': version, 'file': file, 'sha256': hashlib.sha256(blob).hexdigest(),
+              'trained': dt.datetime.now().isoformat(timespec='seconds'), **details}
+    with open(VERSIONS_PATH, 'a') as f:
+        f.write(json.dumps(record) + '\n')
+
+    for old in history[:max(0, len(history) + 1 - KEEP_VERSIONS)]:
+        try:
+            os.remove(os.path.join(MODEL_DIR, old['file']))
+        except FileNotFoundError:
+            pass
+
+    return record
+
+
+def _write_atomic(path, blob):
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(blob)
+    os.replace(tmp, path)
@@ -0,0 +1,99 @@
+import copy
+import time
+import numbers
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from . import ModelRegistry as registry
+from . import CompiledModels as compiled
+from . import TrainingStore as ts
+from . import NBAtools as tl
+
+
+# epochs the MLP trains for when continuing from its current weights
+MLP_WARM_EPOCHS = 40
+
+# trees grown on the updated data per retrain. The same number of the oldest trees is dropped,
+# so the forest keeps its size and gradually turns over to trees that have seen recent games
+RF_EXTRA_TREES = 15
+
+
+def refit(name, model, X, y, retrain=0):
+    """
+    Purpose:
+        Refits a model on the updated training data, starting from its current state where the estimator allows:
+        the logistic regression continues from its coefficients, the MLP from its weights, and the random forest
+        grows extra trees on the new data in place of its oldest ones
+
+    Args:
+        name: 'log', 'mlp' or 'rf'
+        model: Current fitted estimator, left unchanged
+        X: Feature DataFrame with the PREDICTION_FEATURES columns
+        y: Win target
+        retrain: Number of this retrain, e.g. the version it will be saved as. A forest with a fixed
+                 random_state is grown from random_state + retrain, so each retrain's trees differ
+    Returns:
+        model: Newly fitted estimator
+    """
+
+    model = copy.deepcopy(model)
+
+    if name == 'rf':
+        # the new trees' seeds are drawn from random_state after skipping one per kept tree. The forest
+        # keeps its size, so a fixed random_state would give every retrain the same seeds
+        seed = model.random_state
+        size = len(model.estimators_)
+        model.set_params(warm_start=True, n_estimators=size + RF_EXTRA_TREES,
+                         random_state=seed + retrain if isinstance(seed, numbers.Integral) else seed)
+        model.fit(X, y)
+        model.estimators_ = model.estimators_[-size:]
+        model.set_params(n_estimators=size, warm_start=False, random_state=seed)
+        return model
+
+    if name == 'mlp':
+        max_iter = model.max_iter
+        model.set_params(warm_start=True, max_iter=MLP_WARM_EPOCHS)
+        model.fit(X, y)
+        model.set_params(warm_start=False, max_iter=max_iter)
+        return model
+
+    model.set_params(warm_start=True)
+    model.fit(X, y)
+    model.set_params(warm_start=False)
+    return model
+
+
+def _retrain(name):
+
+    # runs in a worker process: the training arrays are memory mapped rather than sent from the parent
+    start = time.perf_counter()
+    X, y = ts.load()
+    X = pd.DataFrame(X, columns=tl.PREDICTION_FEATURES, copy=False)
+    history = registry.versions(name)
+    model = refit(name, registry.load(name), X, y, retrain=history[-1]['version'] + 1 if history else 1)
+    return model, {'rows': len(y), 'seconds': round(time.perf_counter() - start, 2)}
+
+
+def retrain_models(models=None, workers=None):
+    """
+    Purpose:
+        Refits the chosen models on the training store, one process per model, and saves and exports each as a
+        new version. Predictions keep using the current files until each new version is swapped in
+
+    Args:
+        models: Any of 'log', 'mlp' and 'rf', all three when None
+        workers: Number of processes, one per model when None
+    Returns:
+        records: Dict of model name -> version record, see ModelRegistry.save
+    """
+
+    models = registry.check_names(models)
+    with ProcessPoolExecutor(max_workers=workers or len(models)) as pool:
+        futures = {name: pool.submit(_retrain, name) for name in models}
+        records = {}
+        for name, future in futures.items():
+            model, details = future.result()
+            records[name] = registry.save(name, model, **details)
+            # exported now, while the model is at hand, so the next prediction doesn't import sklearn to do it
+            compiled.export(name, model)
+
+    return records
@@ -4,70 +4,109 @@ import datetime as dt
 import numpy as np
 from . import DailyScrape as ds
 import os
-import pickle
-from tqdm import tqdm
-from time import sleep
-from sklearn.linear_model import LogisticRegression
+from .FetchScheduler import fetch_all
+from . import PredictionStore as store
+from . import ModelRegistry as registry
+from . import TrainingStore as ts
+from . import ModelTrainer as trainer
+
+
+# model inputs, in the column order the saved models were fitted with
+PREDICTION_FEATURES = ['home', 'dRest', 'dAge', 'dWin%', 'dLast5', 'dLast10', 'teamElo', 'oppElo', 'dElo', 'dORtg', 'dDRtg',
+                       'dPACE', 'deFG', 'dTOV', 'dORB', 'dDRB', 'RVTo', 'RVTd', 'oRVTo', 'oRVTd']
 
 
 def team_features(team, team_df):
+    """
+    Builds the recent performance features for a single team. Thin wrapper around
+    team_features_all, kept for callers that still work one team at a time
 
-    df = team_df.copy()
-    df['team'] = team
-    df['opp'] = 0
-    df['team_pts'] = 0
-    df['opp_pts'] = 0
-    df['win'] = 0
-    df['home'] = 0
-    df['gp'] = 0
-    g = 0
+    Args:
+        team: Team abbreviation
+        team_df: Schedule rows (home or away) involving the team
 
-    for i in range(len(df)):
+    Returns:
+        df: One row per game from the team's perspective
+    """
 
-        if df.loc[i, 'away_team'] == team:
-            df.loc[i, 'opp'] = df.loc[i, 'home_team']
-            df.loc[i, 'team_pts'] = df.loc[i, 'away_pts']
-            df.loc[i, 'opp_pts'] = df.loc[i, 'home_pts']
-            df.loc[i, 'home'] = 0
+    df = team_df[(team_df.home_team == team) | (team_df.away_team == team)]
+    return team_features_all(df, teams=[team])
 
-        else:
-            df.loc[i, 'opp'] = df.loc[i, 'away_team']
-            df.loc[i, 'team_pts'] = df.loc[i, 'home_pts']
-            df.loc[i, 'opp_pts'] = df.loc[i, 'away_pts']
-            df.loc[i, 'home'] = 1
 
-        if df.loc[i, 'team_pts'] > df.loc[i, 'opp_pts']:
-            df.loc[i, 'win'] = 1
+def team_features_all(sched, teams=None):
+    """
+    Builds the long team-game table for every team in a schedule in one pass
 
-        df.loc[i, 'gp'] = g
-        g += 1
+    Each game is split into an away-perspective and a home-perspective row, then the
+    rest days, last five, last ten and win percentage features are computed per team
+    with grouped cumulative sums rather than a python loop over every game. Stacked
+    seasons are kept apart, so each team's features restart at the start of a season
 
-    cols = ['season', 'date', 'team', 'team_pts', 'opp', 'opp_pts', 'win', 'home', 'gp', 'szn_type']
-    df = df[cols]
+    Args:
+        sched: Schedule DataFrame with season, date, away_team, away_pts, home_team, home_pts and szn_type columns
+        teams: Teams to build rows for, in output order. Defaults to the order teams first appear as the away team
 
-    teamDayOff = [0]
-    for i in range(1, len(df)):
-        days_off = (df.iloc[i, 1] - df.iloc[(i - 1), 1]).days
-        teamDayOff.append(days_off)
+    Returns:
+        df: One row per team per game, grouped by season and team in schedule order
+    """
 
-    df['teamDayOff'] = teamDayOff
+    if teams is None:
+        teams = list(sched['away_team'].unique())
 
-    df['lastFive'] = (df['win'].rolling(min_periods=1, window=5).sum().shift().bfill()) / 5
-    df['lastTen'] = (df['win'].rolling(min_periods=1, window=10).sum().shift().bfill()) / 10
-    df['winp'] = df['win'].expanding(1).sum().shift()
+    sched = sched.reset_index(drop=True)
+    base = sched[['season', 'date', 'szn_type']]
 
-    for i in range(1, 5):
-        df.loc[i, 'lastFive'] = (df.loc[i, 'lastFive'] * 5) / i
+    away = base.assign(team=sched['away_team'].values, team_pts=sched['away_pts'].values,
+                       opp=sched['home_team'].values, opp_pts=sched['home_pts'].values, home=0)
+    home = base.assign(team=sched['home_team'].values, team_pts=sched['home_pts'].values,
+                       opp=sched['away_team'].values, opp_pts=sched['away_pts'].values, home=1)
+    away['row'] = np.arange(len(sched))
+    home['row'] = np.arange(len(sched))
 
-    for i in range(1, 10):
-        df.loc[i, 'lastTen'] = (df.loc[i, 'lastTen'] * 10) / i
+    df = pd.concat([away, home], ignore_index=True)
+    team_order = {t: i for i, t in enumerate(teams)}
+    season_order = {s: i for i, s in enumerate(sched['season'].unique())}
+    df['team_order'] = df['team'].map(team_order)
+    df = df[df.team_order.notna()].copy()
+    df['season_order'] = df['season'].map(season_order)
+    df = df.sort_values(by=['season_order', 'team_order', 'row'], kind='mergesort').reset_index(drop=True)
+    df['group'] = df.groupby(['season_order', 'team_order'], sort=False).ngroup()
 
-    for i in range(len(df)):
-        df.loc[i, 'winp'] = df.loc[i, 'winp'] / i
+    df['win'] = (df['team_pts'] > df['opp_pts']).astype('int64')
+    df['opp'] = df['opp'].astype('object')
 
-    df.iloc[0, 11:] = 0
+    g = df.groupby('group', sort=False)
+    gp = g.cumcount().to_numpy()
+    df['gp'] = gp
 
-    df = df.replace(np.nan, 0)
+    cols = ['season', 'date', 'team', 'team_pts', 'opp', 'opp_pts', 'win', 'home', 'gp', 'szn_type']
+    df = df[cols + ['group']].copy()
+
+    df['teamDayOff'] = g['date'].diff().dt.days.fillna(0).astype('int64').to_numpy()
+
+    # wins in the games strictly before each row, and in the 5 and 10 games before it
+    wins_before = g['win'].cumsum() - df['win']
+    wb = wins_before.groupby(df['group'], sort=False)
+    last5 = (wins_before - wb.shift(5).fillna(0)).to_numpy()
+    last10 = (wins_before - wb.shift(10).fillna(0)).to_numpy()
+    wins_before = wins_before.to_numpy()
+
+    # same float operations as the original rolling(...)/n followed by the *n/i correction
+    # for the first few games of a season, so values match bit for bit
+    with np.errstate(divide='ignore', invalid='ignore'):
+        n = gp.astype('float64')
+        lastFive = last5 / 5
+        lastFive = np.where(gp < 5, lastFive * 5 / n, lastFive)
+        lastTen = last10 / 10
+        lastTen = np.where(gp < 10, lastTen * 10 / n, lastTen)
+        winp = wins_before.astype('float64') / n
+
+    first = gp == 0
+    df['lastFive'] = np.where(first, 0, lastFive)
+    df['lastTen'] = np.where(first, 0, lastTen)
+    df['winp'] = np.where(first, 0, winp)
+
+    df = df.drop(columns='group').replace(np.nan, 0)
 
     return df
 
@@ -83,61 +122,114 @@ def top_players(team, lst, d, szn):
     return top[['PLAYER', 'raptor_offense', 'raptor_defense', 'AGE']]
 
 
-def retrain_model():
+def resolve_outcomes(new_train):
     """
-    If NewTrain.csv dataset is found, this method determines the actual outcomes of yesterday's games
-    and appends this dataset to the original training data, then trains a new logistic regression model
-    on the updated training dataset
+    Fills in win, team_pts and opp_pts for predicted games once they have been played
+
+    Rows are grouped so that each (team, season, szn_type) games page is fetched and parsed
+    once. Both rows of a game are resolved from whichever team's page is already needed
+    most, the opponent's row being the same result seen from the other side
 
     Args:
-        None
+        new_train: Prediction rows with date, team, opp, season and szn_type columns
 
     Returns:
-        None: if NewTrain.csv dataset not found in PREDICT_NBA directory
-        retrained_log_model: logistic regression model fitted to existing data + yesterday's games
+        new_train: Copy with win, team_pts and opp_pts set, NaN where no result was found
+    """
+
+    df = new_train.copy()
+    df['date'] = pd.to_datetime(df['date'])
+
+    # fetch from the team with more pending games, ties broken by name so both rows of a game agree
+    counts = df.groupby(['team', 'season', 'szn_type']).size()
+    team_n = counts.reindex(pd.MultiIndex.from_frame(df[['team', 'season', 'szn_type']])).to_numpy()
+    opp_n = counts.reindex(pd.MultiIndex.from_frame(df[['opp', 'season', 'szn_type']])).fillna(0).to_numpy()
+    from_team = (team_n > opp_n) | ((team_n == opp_n) & (df['team'] < df['opp']).to_numpy())
+    df['source'] = np.where(from_team, df['team'], df['opp'])
+
+    jobs = {}
+    for source, season, szn_type in df[['source', 'season', 'szn_type']].drop_duplicates().itertuples(index=False):
+        jobs[(source, season, szn_type)] = ds.season_results_url(source, season)
+
+    def parse(key, resp):
+        return ds.parse_season_results(resp, key[0], key[2]).assign(season=key[1], szn_type=key[2])
+
+    results = pd.concat([d for _, d in fetch_all(jobs, parse)], ignore_index=True)
+    results = results.rename(columns={'Date': 'date', 'Team': 'source'})
+    results = results.drop_duplicates(subset=['source', 'season', 'szn_type', 'date']).set_index(['source', 'season', 'szn_type', 'date'])
+
+    found = results.reindex(pd.MultiIndex.from_frame(df[['source', 'season', 'szn_type', 'date']]))
+    win = pd.to_numeric(found['win'], errors='coerce').to_numpy()
+    tm = pd.to_numeric(found['Tm'], errors='coerce').to_numpy()
+    opp = pd.to_numeric(found['Opp'], errors='coerce').to_numpy()
+
+    new_train = new_train.copy()
+    new_train['win'] = np.where(from_team, win, 1 - win)
+    new_train['team_pts'] = np.where(from_team, tm, opp)
+    new_train['opp_pts'] = np.where(from_team, opp, tm)
+
+    return new_train
+
+
+def retrain_model(models=None, as_of=None):
+    """
+    If predictions are waiting in the NewTrainingData store, this method determines the actual outcomes of yesterday's games
+    and appends them to the training store as a new partition, then refits the models on the memory mapped
+    training arrays in parallel, each continuing from its current state, and saves them as new versions
+
+    Args:
+        models: Models to retrain, any of 'log', 'mlp' and 'rf'. All three when None
+        as_of: Date treated as today when checking whether the stored games have been played, dt.date.today() when None
+
+    Returns:
+        None
     """
 
-    today = dt.date.today()
+    today = pd.Timestamp(as_of).date() if as_of is not None else dt.date.today()
     pred_dir_path = str(os.path.join(os.path.join(os.path.expanduser('~')), 'Desktop/PREDICT_NBA'))
 
     if not os.path.exists(pred_dir_path):
         print('You need to make predictions first')
         return None
 
-    train = pd.read_csv(f'{pred_dir_path}/TrainingData.csv')
-    NT_path = pred_dir_path + '/NewTrainingData.csv'
+    new_train = store.read('new_training')
 
-    if not os.path.exists(NT_path):
+    if len(new_train) == 0:
         print('You need to make predictions first')
         return None
 
-    new_train = pd.read_csv(f'{pred_dir_path}/NewTrainingData.csv')
-    if (new_train.date.max() == str(today)) | (train.date.max() == str(today - dt.timedelta(days=1))):
+    if (new_train.date.max() == str(today)) | (ts.max_date() == str(today - dt.timedelta(days=1))):
         print('Previously predicted games have yet to be played. Cannot update training data with correct outcomes.')
         return None
 
     print('\nUpdating Dataset With Previous Game Outcomes...')
-    for i in tqdm(range(len(new_train))):
-        sleep(3)
-        date = new_train.loc[i, 'date']
-        team = new_train.loc[i, 'team']
-        season = new_train.loc[i, 'season']
-        szn_type = new_train.loc[i, 'szn_type']
-        new_train.loc[i, 'win'], new_train.loc[i, 'team_pts'], new_train.loc[i, 'opp_pts'] = ds.daily_training_update(date, team, season, szn_type)
-
-    train = pd.read_csv(f'{pred_dir_path}/TrainingData.csv')
-    df = pd.concat([train, new_train], ignore_index=True)
-    df.to_csv(f'{pred_dir_path}/TrainingData.csv', index=False)
-    os.remove(f'{pred_dir_path}/NewTrainingData.csv')
-
-    df = df[['win', 'home', 'dRest', 'dAge', 'dWin%', 'dLast5', 'dLast10', 'teamElo', 'oppElo', 'dElo',
-             'dORtg', 'dDRtg', 'dPACE', 'deFG', 'dTOV', 'dORB', 'dDRB', 'RVTo', 'RVTd', 'oRVTo', 'oRVTd']]
-
-    targetName = "win"
-    X = df.loc[:, df.columns[np.where(df.columns != targetName)]]
-    y = df.loc[:, targetName]
-
-    retrained_log_model = LogisticRegression(penalty='l2', tol=0.0001, max_iter=340, solver='lbfgs').fit(X, y)
-    pickle.dump(retrained_log_model, open(f"{pred_dir_path}/MODELS/logreg_model.sav", 'wb'))
-
-    return print('Training data has been updated and logistic regression model is now retrained and ready for use.')
+    new_train = resolve_outcomes(new_train)
+
+    pending = new_train[new_train.win.isna()]
+    new_train = new_train[new_train.win.notna()]
+    if len(pending) > 0:
+        print(f'{len(pending)} rows have no result yet and are kept for the next retrain')
+
+    # the rows are only cleared from the prediction store once they're in the training store and the csv.
+    # If the run stops in between, the next one finds them again and each only gets the rows it's missing
+    ts.append(new_train)
+
+    # the csv keeps every column for reading by hand, new rows are appended under its existing header
+    csv_path = f'{pred_dir_path}/TrainingData.csv'
+    if os.path.exists(csv_path):
+        keys = ['date', 'team', 'opp']
+        written = pd.read_csv(csv_path, usecols=keys, dtype=str)
+        written['date'] = pd.to_datetime(written['date']).dt.strftime('%Y-%m-%d')
+        new_keys = new_train[keys].assign(date=pd.to_datetime(new_train['date']).dt.strftime('%Y-%m-%d'))
+        missing = ~pd.MultiIndex.from_frame(new_keys).isin(pd.MultiIndex.from_frame(written))
+        header = pd.read_csv(csv_path, nrows=0).columns
+        new_train[missing].reindex(columns=header).to_csv(csv_path, mode='a', header=False, index=False)
+
+    store.delete('new_training', new_train)
+
+    print('\nRetraining Models...')
+    records = trainer.retrain_models(models)
+    for name, record in records.items():
+        print(f"{registry.MODELS[name][0]}: version {record['version']}, {record['rows']} rows, {record['seconds']}s")
+
+    return print('Training data has been updated and the models are now retrained and ready for use.')
@@ -0,0 +1,190 @@
+import os
+import re
+import json
+import difflib
+import unicodedata
+from contextlib import contextmanager
+from collections import Counter, defaultdict
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: saves still merge with the file, without the lock
+    fcntl = None
+
+
+ALIAS_PATH = os.path.join(os.path.join(os.path.expanduser('~')), 'Desktop/PREDICT_NBA/PlayerAliases.json')
+
+_SUFFIXES = {'jr', 'sr', 'ii', 'iii', 'iv', 'v'}
+
+
+def normalize(name):
+    """
+    Purpose:
+        Reduces a player name to a comparison key: accents stripped, lower case,
+        punctuation and generational suffixes removed
+
+    Args:
+        name: Player name
+    Returns:
+        key: Normalized name, e.g. 'Luka Dončić' -> 'luka doncic', 'Jaren Jackson Jr.' -> 'jaren jackson'
+    """
+
+    name = unicodedata.normalize('NFKD', str(name))
+    name = ''.join(c for c in name if not unicodedata.combining(c)).lower()
+    name = re.sub(r"[.'`’,]", '', name).replace('-', ' ')
+    words = [w for w in name.split() if w not in _SUFFIXES]
+    return ' '.join(words)
+
+
+@contextmanager
+def _locked(path):
+
+    # held while the alias table is read, merged and replaced, so resolvers saving from
+    # several processes at once each add their matches rather than the last one winning
+    with open(f'{path}.lock', 'a') as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        yield
+
+
+def _read_aliases(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def _ngrams(key, n=3):
+    padded = f'  {key} '
+    return {padded[i:i + n] for i in range(len(padded) - n + 1)}
+
+
+class NameResolver(object):
+
+    """
+    Maps player names from other sources (RAPTOR, lineups.com) onto a list of correct names,
+    replacing a difflib.get_close_matches scan of every name for every lookup
+
+    Lookups try, in order: an exact hit, the persistent alias table, a normalized key,
+    then difflib scoring against only the few names sharing the most character trigrams
+    """
+
+    def __init__(self, names, alias_path=ALIAS_PATH, cutoff=0.6, candidates=8):
+        """
+        Args:
+            names: Correct names to resolve onto
+            alias_path: Json file of previously confirmed matches, None to keep aliases in memory only
+            cutoff: Minimum difflib ratio for a fuzzy match, same default as get_close_matches
+            candidates: Number of trigram candidates scored with difflib
+        """
+
+        self.names = list(dict.fromkeys(names))
+        self.exact = set(self.names)
+        self.cutoff = cutoff
+        self.candidates = candidates
+        self.alias_path = alias_path
+
+        self.by_key = defaultdict(list)
+        self.grams = defaultdict(list)
+        for i, name in enumerate(self.names):
+            key = normalize(name)
+            self.by_key[key].append(name)
+            for gram in _ngrams(key):
+                self.grams[gram].append(i)
+
+        self.aliases = {} if alias_path is None else _read_aliases(alias_path)
+        # matches made since the last save, the only ones save writes over the file's
+        self.new_aliases = {}
+
+    def resolve(self, name):
+        """
+        Args:
+            name: Name to look up
+
+        Returns:
+            match: The matching correct name, or None if nothing is close enough
+        """
+
+        if name in self.exact:
+            return name
+
+        alias = self.aliases.get(name)
+        if alias in self.exact:
+            return alias
+
+        key = normalize(name)
+        match = None
+        if len(self.by_key.get(key, [])) == 1:
+            match = self.by_key[key][0]
+        else:
+            match = self._fuzzy(name, key)
+
+        if match is not None:
+            self.aliases[name] = match
+            self.new_aliases[name] = match
+
+        return match
+
+    def resolve_all(self, names):
+        """
+        Args:
+            names: Iterable of names, usually a DataFrame column
+
+        Returns:
+            mapping: Dict of each distinct name -> resolved name, leaving names without a match unchanged
+        """
+
+        mapping = {}
+        for name in dict.fromkeys(names):
+            match = self.resolve(name)
+            mapping[name] = name if match is None else match
+        self.save()
+        return mapping
+
+    def save(self):
+        """
+        Adds newly confirmed matches to the alias table. The table is read again under a file lock
+        and merged, so matches saved by other processes since this resolver loaded it are kept
+
+        Args:
+            self
+
+        Returns:
+            None
+        """
+
+        if self.alias_path is None or not self.new_aliases:
+            return
+        os.makedirs(os.path.dirname(self.alias_path), exist_ok=True)
+        with _locked(self.alias_path):
+            aliases = _read_aliases(self.alias_path)
+            aliases.update(self.new_aliases)
+            tmp = f'{self.alias_path}.{os.getpid()}.tmp'
+            with open(tmp, 'w') as f:
+                json.dump(aliases, f, indent=0, sort_keys=True, ensure_ascii=False)
+            os.replace(tmp, self.alias_path)
+        self.aliases.update(aliases)
+        self.new_aliases = {}
+
+    def _fuzzy(self, name, key):
+
+        counts = Counter()
+        for gram in _ngrams(key):
+            counts.update(self.grams.get(gram, ()))
+        if not counts:
+            return None
+
+        # same scoring as get_close_matches, ties going to the larger string
+        s = difflib.SequenceMatcher()
+        s.set_seq2(name)
+        best = None
+        for i, _ in counts.most_common(self.candidates):
+            candidate = self.names[i]
+            s.set_seq1(candidate)
+            if s.real_quick_ratio() >= self.cutoff and s.quick_ratio() >= self.cutoff:
+                score = s.ratio()
+                if score >= self.cutoff and (best is None or (score, candidate) > best):
+                    best = (score, candidate)
+
+        return None if best is None else best[1]
@@ -0,0 +1,264 @@
+"""
+Long-running prediction service. Builds a DailyReport once, keeps the models and the day's
+compiled inputs in memory, refreshes each input on its own schedule and answers lookups over
+local HTTP from precomputed responses, so repeated requests don't run the pipeline again
+
+    GET /predictions                  every game on today's slate, as stored by get_predictions
+    GET /matchup?team=BOS&opp=NYK     one team's side of one game
+    GET /health                       when each input was last refreshed, and any refresh errors
+"""
+
+import json
+import time
+import asyncio
+import datetime as dt
+from urllib.parse import urlsplit, parse_qs
+from . import ModelRegistry as registry
+from . import CompiledModels as compiled
+
+
+HOST = '127.0.0.1'
+PORT = 8766
+
+# seconds between refreshes of each of DailyReport's inputs. Projected minutes move the most
+# during the day, as injuries and lineups are announced
+REFRESH = {'games': 3600, 'stats': 3600, 'mp': 600, 'elo': 3600}
+
+REQUEST_TIMEOUT = 5
+
+STATUS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+          503: 'Service Unavailable'}
+
+
+def _json(obj):
+    return json.dumps(obj, default=str).encode()
+
+
+class PredictionService(object):
+
+    """
+    Resident wrapper around DailyReport serving today's predictions over HTTP
+    """
+
+    def __init__(self, models=None, refresh=None, host=HOST, port=PORT):
+        """
+        Args:
+            self
+            models: Models to predict with, any of 'log', 'mlp' and 'rf'. All three when None
+            refresh: Seconds between refreshes per input, overriding REFRESH. 0 or None turns
+                     an input's refresh off
+            host: Address to listen on, local only by default
+            port: Port to listen on, 0 for any free port
+
+        Returns:
+            self.report: DailyReport the responses are built from, None until it has been built
+            self.updated: Input -> time it was last built or refreshed
+            self.errors: Input -> error from its last refresh, cleared once it refreshes again
+        """
+
+        self.models = registry.check_names(models)
+        self.refresh = dict(REFRESH, **(refresh or {}))
+        self.host = host
+        self.port = port
+        self.report = None
+        self.updated = {}
+        self.errors = {}
+        self._lock = asyncio.Lock()
+        self._server = None
+        self._tasks = []
+        # (date, /predictions body, (team, opp) -> /matchup body), replaced in one assignment
+        # so a request never sees half of a refresh
+        self._published = None
+
+    @property
+    def url(self):
+        return f'http://{self.host}:{self.port}'
+
+    async def start(self):
+        """
+        Starts listening, then builds the report and starts a refresh loop for each input.
+        Requests made while the report is being built get a 503
+
+        Args:
+            self
+
+        Returns:
+            self
+        """
+
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        print(f'\nServing predictions on {self.url}')
+
+        async with self._lock:
+            await asyncio.to_thread(self._rebuild)
+        for source, every in self.refresh.items():
+            if every:
+                self._tasks.append(asyncio.create_task(self._refresh_loop(source, every)))
+        return self
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def serve_forever(self):
+        if self._server is None:
+            await self.start()
+        try:
+            await self._server.serve_forever()
+        finally:
+            await self.stop()
+
+    def _rebuild(self):
+
+        from ..predict import DailyReport
+
+        # the models are loaded once here and stay loaded, they're only read again after a
+        # retrain replaces their files
+        for name in self.models:
+            compiled.estimator(name)
+        report = DailyReport(models=self.models)
+        self.report = report
+        now = time.time()
+        self.updated = {source: now for source in self.refresh}
+        self._publish()
+
+    def _publish(self):
+
+        report = self.report
+        if report.games is None:
+            games = []
+        else:
+            _, preds_df = report.score(self.models)
+            games = preds_df.to_dict('records')
+
+        matchups = {}
+        for game in games:
+            matchups[(str(game['TEAM']).upper(), str(game['OPP']).upper())] = _json(game)
+        predictions = _json({'date': report.today, 'models': self.models, 'games': games})
+        self._published = (report.today, predictions, matchups)
+
+    async def refresh_now(self, source):
+        """
+        Refreshes one input and republishes the predictions. A new day rebuilds the whole report
+
+        Args:
+            self
+            source: 'games', 'stats', 'mp' or 'elo'
+
+        Returns:
+            ok: False if the refresh failed, the error is kept in self.errors
+        """
+
+        async with self._lock:
+            try:
+                if self.report is None or self.report.today != dt.date.today():
+                    await asyncio.to_thread(self._rebuild)
+                elif self.report.games is not None:
+                    await asyncio.to_thread(self.report.refresh, source)
+                    await asyncio.to_thread(self._publish)
+            except Exception as e:
+                self.errors[source] = f'{type(e).__name__}: {e}'
+                print(f'\nRefreshing {source} failed, still serving the previous predictions: {self.errors[source]}')
+                return False
+            self.updated[source] = time.time()
+            self.errors.pop(source, None)
+            return True
+
+    async def _refresh_loop(self, source, every):
+        while True:
+            await asyncio.sleep(every)
+            await self.refresh_now(source)
+
+    def respond(self, method, target):
+        """
+        Answers one request from the published responses, without touching the report
+
+        Args:
+            self
+            method: HTTP method
+            target: Path and query string
+
+        Returns:
+            status: HTTP status code
+            body: Json body
+        """
+
+        if method != 'GET':
+            return 405, _json({'error': 'only GET is supported'})
+        parts = urlsplit(target)
+
+        if parts.path == '/health':
+            published = self._published
+            return 200, _json({'ready': published is not None, 'date': published and published[0],
+                               'models': self.models,
+                               'updated': {k: dt.datetime.fromtimestamp(v).isoformat(timespec='seconds')
+                                           for k, v in self.updated.items()},
+                               'errors': self.errors})
+
+        if parts.path not in ['/predictions', '/matchup']:
+            return 404, _json({'error': f'unknown path {parts.path}'})
+        published = self._published
+        if published is None:
+            return 503, _json({'error': "today's predictions are still being built"})
+        date, predictions, matchups = published
+
+        if parts.path == '/predictions':
+            return 200, predictions
+
+        query = parse_qs(parts.query)
+        team, opp = query.get('team', [''])[0].upper(), query.get('opp', [''])[0].upper()
+        if not team or not opp:
+            return 400, _json({'error': 'pass both team and opp, e.g. /matchup?team=BOS&opp=NYK'})
+        if (team, opp) not in matchups:
+            return 404, _json({'error': f'{team} and {opp} do not play on {date}'})
+        return 200, matchups[(team, opp)]
+
+    async def _handle(self, reader, writer):
+
+        try:
+            request = await asyncio.wait_for(reader.readline(), REQUEST_TIMEOUT)
+            # headers are read and ignored, there are no request bodies
+            while True:
+                line = await asyncio.wait_for(reader.readline(), REQUEST_TIMEOUT)
+                if line in [b'\r\n', b'\n', b'']:
+                    break
+            parts = request.decode('latin-1').split()
+            if len(parts) < 2:
+                status, body = 400, _json({'error': 'malformed request'})
+            else:
+                status, body = self.respond(parts[0], parts[1])
+            writer.write(f'HTTP/1.1 {status} {STATUS[status]}\r\nContent-Type: application/json\r\n'
+                         f'Content-Length: {len(body)}\r\nConnection: close\r\n\r\n'.encode() + body)
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+def serve(models=None, host=HOST, port=PORT, refresh=None):
+    """
+    Purpose:
+        Runs a PredictionService until interrupted
+
+    Args:
+        models: Models to predict with, all three when None
+        host: Address to listen on
+        port: Port to listen on
+        refresh: Seconds between refreshes per input, overriding REFRESH
+    Returns:
+        None
+    """
+
+    service = PredictionService(models=models, refresh=refresh, host=host, port=port)
+    try:
+        asyncio.run(service.serve_forever())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,179 @@
+import os
+import sqlite3
+from contextlib import contextmanager
+
+
+PRED_DIR = os.path.join(os.path.join(os.path.expanduser('~')), 'Desktop/PREDICT_NBA')
+DB_PATH = os.path.join(PRED_DIR, 'PredictNBA.sqlite')
+
+# table -> (key columns, csv the table replaces)
+TABLES = {'predictions': (['DATE', 'TEAM', 'OPP'], 'Predictions.csv'),
+          'new_training': (['date', 'team', 'opp'], 'NewTrainingData.csv')}
+
+
+# pandas is imported inside the functions that need it, so querying the store from the
+# command line doesn't pay for it
+
+@contextmanager
+def _connect():
+    os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
+    con = sqlite3.connect(DB_PATH, timeout=30)
+    try:
+        with con:
+            yield con
+    finally:
+        con.close()
+
+
+def _quote(name):
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def _columns(con, table):
+    return [r[1] for r in con.execute(f'PRAGMA table_info({_quote(table)})')]
+
+
+def _ensure(con, table, columns=()):
+
+    # columns are left untyped so sqlite keeps each value as given (ints, floats and the 0/name mix in P{i}name)
+    keys = TABLES[table][0]
+    if not _columns(con, table):
+        history = _csv_history(table)
+        cols = list(history.columns) if history is not None else (list(columns) or keys)
+        con.execute(f'CREATE TABLE {_quote(table)} ({", ".join(_quote(c) for c in cols)}, '
+                    f'PRIMARY KEY ({", ".join(_quote(k) for k in keys)}))')
+        if history is not None:
+            _insert(con, table, history)
+
+    existing = _columns(con, table)
+    for c in columns:
+        if c not in existing:
+            con.execute(f'ALTER TABLE {_quote(table)} ADD COLUMN {_quote(c)}')
+
+
+def _csv_history(table):
+
+    # first use after upgrading: the table starts from the csv it replaces
+    csv_path = os.path.join(os.path.dirname(DB_PATH), TABLES[table][1])
+    if not os.path.exists(csv_path):
+        return None
+    import pandas as pd
+    history = pd.read_csv(csv_path)
+    return history.drop_duplicates(subset=TABLES[table][0], keep='last')
+
+
+def _rows(df):
+    import pandas as pd
+    df = df.copy()
+    for c in df.columns:
+        if pd.api.types.is_datetime64_any_dtype(df[c]):
+            df[c] = df[c].dt.strftime('%Y-%m-%d')
+    df = df.astype(object).where(df.notna(), None)
+    return list(df.itertuples(index=False, name=None))
+
+
+def _insert(con, table, df):
+    # the whole row is replaced, so columns a new row doesn't have (e.g. the probabilities of models
+    # left out of a rerun) are emptied rather than left over from the earlier row
+    cols = ', '.join(_quote(c) for c in df.columns)
+    marks = ', '.join('?' for _ in df.columns)
+    con.executemany(f'INSERT OR REPLACE INTO {_quote(table)} ({cols}) VALUES ({marks})', _rows(df))
+
+
+def upsert(table, df):
+    """
+    Purpose:
+        Inserts rows, replacing any existing rows with the same key, e.g. (date, team, opp). A
+        replaced row keeps nothing from before: columns df doesn't have are left empty. Only the
+        given rows are written, however long the history gets
+
+    Args:
+        table: 'predictions' or 'new_training'
+        df: Rows to write. New columns are added to the table as needed
+    Returns:
+        None
+    """
+
+    if len(df) == 0:
+        return
+    with _connect() as con:
+        _ensure(con, table, df.columns)
+        _insert(con, table, df)
+
+
+def read(table):
+    """
+    Purpose:
+        Reads a whole table
+
+    Args:
+        table: 'predictions' or 'new_training'
+    Returns:
+        df: Table contents, with no rows if nothing has been stored yet
+    """
+
+    import pandas as pd
+    with _connect() as con:
+        _ensure(con, table)
+        return pd.read_sql(f'SELECT * FROM {_quote(table)}', con)
+
+
+def query(table, where=None, params=()):
+    """
+    Purpose:
+        Reads rows without pandas, for the command line where import time matters
+
+    Args:
+        table: 'predictions' or 'new_training'
+        where: Optional sql condition, e.g. '"DATE" = ?'
+        params: Values for the placeholders in where
+    Returns:
+        columns: List of column names
+        rows: List of tuples
+    """
+
+    with _connect() as con:
+        _ensure(con, table)
+        cur = con.execute(f'SELECT * FROM {_quote(table)}' + (f' WHERE {where}' if where else ''), params)
+        return [d[0] for d in cur.description], cur.fetchall()
+
+
+def delete(table, keys):
+    """
+    Purpose:
+        Deletes rows by key
+
+    Args:
+        table: 'predictions' or 'new_training'
+        keys: DataFrame holding the table's key columns for the rows to delete
+    Returns:
+        None
+    """
+
+    key_cols = TABLES[table][0]
+    if len(keys) == 0:
+        return
+    with _connect() as con:
+        _ensure(con, table)
+        where = ' AND '.join(f'{_quote(k)} = ?' for k in key_cols)
+        con.executemany(f'DELETE FROM {_quote(table)} WHERE {where}', _rows(keys[key_cols]))
+
+
+def export_csv(table=None):
+    """
+    Purpose:
+        Writes tables out as the csv files people read by hand, Predictions.csv and NewTrainingData.csv
+
+    Args:
+        table: Table to export, both when None
+    Returns:
+        paths: List of csv files written
+    """
+
+    paths = []
+    for name in ([table] if table else list(TABLES)):
+        df = read(name)
+        path = os.path.join(os.path.dirname(DB_PATH), TABLES[name][1])
+        df.to_csv(path, index=False)
+        paths.append(path)
+    return paths
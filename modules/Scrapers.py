@@ -2,14 +2,23 @@
 import io
 import pandas as pd
 import datetime as dt
-from bs4 import BeautifulSoup
-from requests import get
-from time import sleep
-from tqdm import tqdm
-from selenium import webdriver
+from .WebCache import get
+from .FetchScheduler import fetch_all
+from . import TableParser as tp
 
 
-def get_szn_schedule(season):
+def get_szn_schedule(season, as_of=None):
+    """
+    Purpose:
+        Scrapes a season's schedule from basketball-reference's monthly schedule pages. Games on
+        as_of that haven't been played yet are kept with 0 points, so the day's slate is there
+
+    Args:
+        season: Season, e.g. 2023 for 2022-23
+        as_of: Date being predicted, dt.date.today() when None
+    Returns:
+        df: season, date, away_team, away_pts, home_team, home_pts for every game with a result or on as_of
+    """
 
     months = ['october', 'november', 'december', 'january', 'february', 'march', 'april', 'may', 'june', 'july']
 
@@ -18,16 +27,14 @@ def get_szn_schedule(season):
         months_2020 = ['august', 'september', 'october-2020']
         months.extend(months_2020)
 
-    df_list = []
-    for month in tqdm(months):
-        sleep(3)
-        r = get(f'https://www.basketball-reference.com/leagues/NBA_{season}_games-{month}.html')
+    urls = {month: f'https://www.basketball-reference.com/leagues/NBA_{season}_games-{month}.html' for month in months}
+
+    def parse(month, r):
         if r.status_code==200:
-            soup = BeautifulSoup(r.content, 'html.parser')
-            table = soup.find('table', attrs={'id': 'schedule'})
-            if table:
-                month_df = pd.read_html(str(table))[0]
-                df_list.append(month_df)
+            return tp.read_tables(r.content, ['schedule']).get('schedule')
+
+    month_dfs = dict(fetch_all(urls, parse))
+    df_list = [month_dfs[month] for month in months if month_dfs[month] is not None]
 
     df = pd.concat(df_list, ignore_index=True)
     df['Season'] = season
@@ -37,7 +44,8 @@ def get_szn_schedule(season):
     df = df[df.date != 'Playoffs']
     df['date'] = df['date'].apply(lambda x: pd.to_datetime(x))
     
-    df.loc[df.date == str(dt.date.today()), ['away_pts', 'home_pts']] = 0
+    pts = ['away_pts', 'home_pts']
+    df.loc[(df.date == str(as_of or dt.date.today())) & df[pts].isna().any(axis=1), pts] = 0
     df = df[~df.isna().any(axis=1)].reset_index(drop=True)
 
     return df
@@ -45,15 +53,23 @@ def get_szn_schedule(season):
 
 def get_box_scores(gamestr, team1, team2, season, date, szn_type):
     
+    resp = get(box_score_url(gamestr))
+    return parse_box_scores(resp, team1, team2, season, date, szn_type)
+
+
+def box_score_url(gamestr):
+    return f'https://www.basketball-reference.com/boxscores/{gamestr}.html'
+
+
+def parse_box_scores(resp, team1, team2, season, date, szn_type):
+
     df_list = []
     teams = [team1,team2]
-    resp = get(f'https://www.basketball-reference.com/boxscores/{gamestr}.html')
     
     if resp.status_code==200:
-        soup = BeautifulSoup(resp.content, 'html.parser')
+        tables = tp.read_tables(resp.content, [f"box-{team}-game-basic" for team in teams])
         for team in teams:
-            table = soup.find('table', id=f"box-{team}-game-basic")
-            df = pd.read_html(str(table))[0]
+            df = tables[f"box-{team}-game-basic"]
             df.columns = df.columns.droplevel()
             df['TEAM'] = team
             df['SEASON'] = season
@@ -75,37 +91,112 @@ def get_box_scores(gamestr, team1, team2, season, date, szn_type):
         return 'they blocked ya, chief'
 
 
+# tables every team page must have
+TEAM_PAGE_TABLES = ['per_game', 'advanced', 'team_misc']
+
+# parsed when the page has them, None in the page dict otherwise
+OPTIONAL_TEAM_PAGE_TABLES = ['roster']
+
+ADVANCED_COLS = ['SEASON', 'TEAM', 'PLAYER', 'MP', 'PER', 'TS%', '3PAr', 'FTr', 'ORB%', 'DRB%', 'TRB%', 'AST%', 'STL%',
+                 'BLK%', 'TOV%', 'USG%', 'OWS', 'DWS', 'WS', 'WS/48', 'OBPM', 'DBPM', 'BPM', 'VORP']
+
+
+def get_team_page(team, season):
+    """
+    Purpose:
+        Fetches a basketball-reference team page once and extracts every table the package uses from it
+
+    Args:
+        team: Team abbreviation, e.g. 'PHO'
+        season: Season, e.g. 2023 for 2022-23
+    Returns:
+        page: Dict with 'per_game', 'advanced', 'team_misc' and 'roster' DataFrames, see parse_team_page
+    """
+
+    return parse_team_page(get(team_page_url(team, season)), team, season)
+
+
+def team_page_url(team, year):
+    return f'https://www.basketball-reference.com/teams/{team}/{year}.html'
+
+
+def parse_team_page(resp, team, season):
+    """
+    Purpose:
+        Extracts the per_game, advanced, team_misc and roster tables from a team page response
+        in a single parse, so it can also be used as a FetchScheduler.fetch_all parser
+
+    Args:
+        resp: Response for team_page_url(team, season)
+        team: Team abbreviation
+        season: Season
+    Returns:
+        page: Dict of table name -> DataFrame. per_game, advanced and roster have PLAYER, SEASON and TEAM
+              columns, team_misc is one row of TEAM, SEASON and the team rating columns. roster is
+              None when the page has no roster table
+    """
+
+    if resp.status_code != 200:
+        raise ValueError(f'{resp.url} returned {resp.status_code}')
+
+    tables = tp.read_tables(resp.content, TEAM_PAGE_TABLES + OPTIONAL_TEAM_PAGE_TABLES)
+    missing = [t for t in TEAM_PAGE_TABLES if t not in tables]
+    if missing:
+        raise ValueError(f'{resp.url} has no {missing} tables')
+
+    page = {stat: _player_table(tables[stat], team, season) for stat in ['per_game', 'advanced']}
+    page['team_misc'] = _team_misc_table(tables['team_misc'], team, season)
+    for stat in OPTIONAL_TEAM_PAGE_TABLES:
+        page[stat] = _player_table(tables[stat], team, season) if stat in tables else None
+
+    return page
+
+
+def merge_player_stats(page):
+    """
+    Purpose:
+        Joins a team page's per game and advanced player stats, per game minutes becoming MPG
+
+    Args:
+        page: Output of get_team_page or parse_team_page
+    Returns:
+        df: One row per player, sorted by name
+    """
+
+    pg = page['per_game'].sort_values(by='PLAYER', ascending=True).rename(columns={'MP': 'MPG'})
+    adv = page['advanced'].sort_values(by='PLAYER', ascending=True)[ADVANCED_COLS]
+
+    return pg.merge(adv, on=['SEASON', 'TEAM', 'PLAYER'], how='inner', validate='1:1')
+
+
 def get_roster_stats(team = 'PHO', year= 2023, stat='per_game'):    
 
-    resp = get(f'https://www.basketball-reference.com/teams/{team}/{year}.html')
-    df = None
-    if resp.status_code == 200:
-        soup = BeautifulSoup(resp.content, 'html.parser')
-        table = soup.find('table', {"id":stat} )
-        df = pd.read_html(str(table))[0]
-        df['SEASON'] = year
-        df['TEAM'] = team
-        df.rename(columns={'Unnamed: 1':'PLAYER', 'Age':'AGE', 'Tm':'TEAM', 'Pos':'POS'}, inplace=True)
-        drop = [col for col in df.columns if 'Unnamed' in col]
-        df = df.reset_index().drop(drop+['Rk', 'index'], axis=1)
-        return df
+    return get_team_page(team, year)[stat]
+
 
 def get_team_stats(team, season):
     
     try:
-        driver = webdriver.Firefox()
-        driver.get(f'https://www.basketball-reference.com/teams/{team}/{season}.html')
-        soup = BeautifulSoup(driver.page_source, features='html.parser')
-        table = soup.find('table', id='team_misc')
-        df = pd.read_html(str(table))[0]
-        driver.quit()
-    except:
-        driver.quit()
+        return get_team_page(team, season)['team_misc']
+    except ValueError:
         raise ValueError("Invalid Input")
 
+
+def _player_table(df, team, season):
+
+    # older pages leave the player column's header blank
+    df['SEASON'] = season
+    df['TEAM'] = team
+    df = df.rename(columns={'Unnamed: 1': 'PLAYER', 'Player': 'PLAYER', 'Age': 'AGE', 'Pos': 'POS'})
+    drop = [col for col in df.columns if 'Unnamed' in col or col == 'Rk']
+    return df.drop(columns=drop).reset_index(drop=True)
+
+
+def _team_misc_table(df, team, season):
+
     df.columns = df.columns.droplevel()
-    df.rename(columns={'Unnamed: 0_level_1': 'TEAM'}, inplace=True)
-    df = df[df.TEAM != 'Lg Rank']
+    df = df.rename(columns={'Unnamed: 0_level_1': 'TEAM'})
+    df = df[df.TEAM != 'Lg Rank'].copy()
     df['TEAM'] = team
     df['SEASON'] = season
     df.columns = ['TEAM', 'W', 'L', 'PW', 'PL', 'MOV', 'SOS', 'SRS', 'ORtg', 'DRtg',
@@ -114,9 +205,7 @@ def get_team_stats(team, season):
 
     cols = ['TEAM', 'SEASON', 'ORtg', 'DRtg', 'PACE', 'eFG%', 'TOV%', 'ORB%', 'DRB%']
 
-    df = df[cols]
-
-    return df
+    return df[cols]
 
 
 def get_raptor():
@@ -142,35 +231,4 @@ def get_raptor():
     
     return df
 
-
-
-def get_elo():
-    
-    url = "https://projects.fivethirtyeight.com/nba-model/nba_elo.csv" 
-    download = get(url).content
-    elo = pd.read_csv(io.StringIO(download.decode('utf-8')))
-    elo=elo[['date','season','playoff','team1','team2','elo1_pre','elo2_pre']]
-    elo.fillna(0, inplace=True)
-    elo = elo[(elo.playoff==0) | (elo.playoff =='p')]
-    elo = elo[(elo.date < str(dt.date.today())) & (elo.season > 2013)]
-    elo.drop(columns='playoff', inplace=True)
-    elo.replace({'BKN':'BRK'},inplace=True,regex=True)
-    elo.season = elo.season.astype('int')
-    elo.loc[(elo.team1 == 'CHA') & (elo.season > 2014), 'team1'] = 'CHO'
-    elo.loc[(elo.team2 == 'CHA') & (elo.season > 2014), 'team2'] = 'CHO'
-    elo.reset_index(drop=True, inplace=True)
-    cols = ['date','team1','team2','elo1_pre','elo2_pre']
-    elo=elo[cols]
-    
-    elodup = elo.copy()
-    elodup = elodup.rename(columns={'team1':'team2','team2':'team1','elo1_pre':'elo2_pre','elo2_pre':'elo1_pre'})
-    elodup=elodup[cols]
-    
-    full_elo = pd.concat([elo, elodup], ignore_index=True)
-    full_elo = full_elo.sort_values(by='date')
-    full_elo.reset_index(drop=True, inplace=True)
-    full_elo = full_elo.rename(columns={'team1':'team','team2':'opp','elo1_pre':'teamElo', 'elo2_pre':'oppElo'})
-    
-    return full_elo
-
 # In[ ]:
\ No newline at end of file
@@ -0,0 +1,203 @@
+import os
+import json
+import datetime as dt
+import pandas as pd
+
+
+SNAPSHOT_DIR = os.path.join(os.path.join(os.path.expanduser('~')), 'Desktop/PREDICT_NBA/SNAPSHOTS')
+
+# parsed inputs of a DailyReport, in the order they are built
+SOURCES = ['games', 'player_stats', 'team_stats', 'raptor', 'stats', 'mp', 'elo']
+
+
+def season_of(date):
+    """
+    Purpose:
+        Season a date falls in, e.g. 2023 for any date of the 2022-23 season
+
+    Args:
+        date: dt.date or 'YYYY-MM-DD'
+    Returns:
+        season: int
+    """
+
+    date = pd.Timestamp(date)
+    return date.year + 1 if date.month > 7 else date.year
+
+
+def snapshot_dir(source, date, season=None):
+    date = str(pd.Timestamp(date).date())
+    return os.path.join(SNAPSHOT_DIR, source, str(season or season_of(date)), date)
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError('Snapshots are stored as Parquet and need pyarrow: pip install pyarrow')
+    return pyarrow
+
+
+def _table(df, pa):
+
+    # scraped tables can hold numbers and strings in one column (e.g. '' for a missing stat),
+    # which Parquet can't type. Those columns are stored as strings, everything else keeps its dtype
+    mixed = [c for c in df.columns if df[c].dtype == object
+             and pd.api.types.infer_dtype(df[c], skipna=True).startswith('mixed')]
+    if mixed:
+        df = df.copy()
+        for c in mixed:
+            df[c] = df[c].where(df[c].isna(), df[c].astype(str))
+    return pa.Table.from_pandas(df, preserve_index=False)
+
+
+def save(source, df, date, season=None, **details):
+    """
+    Purpose:
+        Saves a parsed input as a new version of the snapshot for (source, season, date).
+        Earlier versions are kept, so a re-run never overwrites what a past prediction was made from
+
+    Args:
+        source: Name of the input, one of SOURCES
+        df: DataFrame to save
+        date: Date the input was built for
+        season: Season of the date, worked out from the date when None
+        details: Extra values stored in the file's metadata
+    Returns:
+        path: Parquet file written
+    """
+
+    if source not in SOURCES:
+        raise ValueError(f'Unknown snapshot source {source}, expected one of {SOURCES}')
+    pa = _pyarrow()
+
+    path = snapshot_dir(source, date, season)
+    os.makedirs(path, exist_ok=True)
+    version = (versions(source, date, season) or [0])[-1] + 1
+
+    table = _table(df, pa)
+    meta = {'source': source, 'date': str(pd.Timestamp(date).date()), 'season': season or season_of(date),
+            'version': version, 'created': dt.datetime.now().isoformat(timespec='seconds'), **details}
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}), b'nbapredict': json.dumps(meta).encode()})
+
+    file = os.path.join(path, f'v{version:04d}.parquet')
+    tmp = f'{file}.{os.getpid()}.tmp'
+    pa.parquet.write_table(table, tmp)
+    os.replace(tmp, file)
+    return file
+
+
+def save_day(date, frames, season=None, **details):
+    """
+    Purpose:
+        Saves every input of a day's report as snapshots
+
+    Args:
+        date: Date of the report
+        frames: Dict of source -> DataFrame
+        season: Season of the date, worked out from the date when None
+        details: Extra values stored in each file's metadata
+    Returns:
+        paths: Dict of source -> Parquet file written
+    """
+
+    return {source: save(source, df, date, season, **details) for source, df in frames.items() if df is not None}
+
+
+def versions(source, date, season=None):
+    """
+    Purpose:
+        Versions saved for (source, season, date), oldest first
+
+    Args:
+        source: Name of the input
+        date: Date of the snapshot
+        season: Season of the date, worked out from the date when None
+    Returns:
+        versions: List of ints
+    """
+
+    path = snapshot_dir(source, date, season)
+    if not os.path.isdir(path):
+        return []
+    return sorted(int(f[1:5]) for f in os.listdir(path) if f.startswith('v') and f.endswith('.parquet'))
+
+
+def load(source, date, season=None, version=None):
+    """
+    Purpose:
+        Loads a snapshot with the dtypes it was saved with
+
+    Args:
+        source: Name of the input
+        date: Date of the snapshot
+        season: Season of the date, worked out from the date when None
+        version: Version to load, the latest when None
+    Returns:
+        df: The saved DataFrame
+    """
+
+    pa = _pyarrow()
+    saved = versions(source, date, season)
+    if not saved:
+        raise FileNotFoundError(f'No {source} snapshot for {pd.Timestamp(date).date()}')
+    version = version or saved[-1]
+    file = os.path.join(snapshot_dir(source, date, season), f'v{version:04d}.parquet')
+    return pa.parquet.read_table(file).to_pandas()
+
+
+def load_day(date, season=None, version=None):
+    """
+    Purpose:
+        Loads every snapshot saved for a date
+
+    Args:
+        date: Date of the report
+        season: Season of the date, worked out from the date when None
+        version: Version to load of each input, the latest when None
+    Returns:
+        frames: Dict of source -> DataFrame, with every source in SOURCES
+    """
+
+    missing = [s for s in SOURCES if not versions(s, date, season)]
+    if missing:
+        raise FileNotFoundError(f'No {missing} snapshots for {pd.Timestamp(date).date()}')
+    return {source: load(source, date, season, version) for source in SOURCES}
+
+
+def metadata(source, date, season=None, version=None):
+    """
+    Purpose:
+        Metadata stored with a snapshot: source, date, season, version, created and any extra details
+
+    Args:
+        source: Name of the input
+        date: Date of the snapshot
+        season: Season of the date, worked out from the date when None
+        version: Version, the latest when None
+    Returns:
+        meta: Dict
+    """
+
+    pa = _pyarrow()
+    version = version or versions(source, date, season)[-1]
+    file = os.path.join(snapshot_dir(source, date, season), f'v{version:04d}.parquet')
+    return json.loads(pa.parquet.read_schema(file).metadata[b'nbapredict'])
+
+
+def dates(source='games'):
+    """
+    Purpose:
+        Dates with a snapshot of the given input
+
+    Args:
+        source: Name of the input
+    Returns:
+        dates: Sorted list of 'YYYY-MM-DD' strings
+    """
+
+    root = os.path.join(SNAPSHOT_DIR, source)
+    if not os.path.isdir(root):
+        return []
+    return sorted(d for season in os.listdir(root) for d in os.listdir(os.path.join(root, season)))
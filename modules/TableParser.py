@@ -0,0 +1,218 @@
+import io
+import re
+import pandas as pd
+from lxml import etree, html
+from pandas.errors import EmptyDataError
+
+try:
+    # not part of pandas' documented api. It types the rows exactly as pd.read_html does without
+    # read_html parsing the page again; when it's missing or its signature changes, each table is
+    # handed to pd.read_html instead. benchmarks/bench_table_parser.py checks both against read_html
+    from pandas.io.parsers import TextParser
+except ImportError:
+    TextParser = None
+
+# set to False to type every table with pd.read_html, slower but only using public pandas
+USE_TEXT_PARSER = TextParser is not None
+
+
+_RE_WHITESPACE = re.compile(r"[\r\n]+|\s{2,}")
+
+
+def read_tables(content, ids, encoding='utf-8'):
+    """
+    Purpose:
+        Extracts tables by id from a page in a single lxml parse, including tables that
+        basketball-reference hides inside html comments
+
+        Rows are split into header, body and footer and typed the same way pd.read_html does,
+        so the DataFrames match the old BeautifulSoup + read_html(str(table)) path
+
+    Args:
+        content: Page html as bytes or str
+        ids: Table ids to extract
+        encoding: Encoding used when content is bytes
+    Returns:
+        tables: Dict of table id -> DataFrame for each id found on the page
+    """
+
+    if isinstance(content, bytes):
+        parser = html.HTMLParser(recover=True, encoding=encoding)
+        doc = html.document_fromstring(content, parser=parser)
+    else:
+        doc = html.document_fromstring(content)
+
+    wanted = set(ids)
+    found = {}
+    for table in doc.iter('table'):
+        table_id = table.get('id')
+        if table_id in wanted and table_id not in found:
+            found[table_id] = table
+
+    missing = wanted - set(found)
+    if missing:
+        for comment in doc.iter(etree.Comment):
+            text = comment.text or ''
+            if '<table' not in text or not any(f'id="{i}"' in text for i in missing):
+                continue
+            fragment = html.fragment_fromstring(text, create_parent='div')
+            for table in fragment.iter('table'):
+                table_id = table.get('id')
+                if table_id in missing:
+                    found[table_id] = table
+                    missing.discard(table_id)
+            if not missing:
+                break
+
+    tables = {}
+    for table_id in ids:
+        table = found.get(table_id)
+        if table is None or _is_hidden(table):
+            continue
+        try:
+            tables[table_id] = table_to_frame(table)
+        except EmptyDataError:
+            continue
+
+    return tables
+
+
+def read_table(content, table_id, encoding='utf-8'):
+    """
+    Purpose:
+        Extracts a single table by id, see read_tables
+
+    Args:
+        content: Page html as bytes or str
+        table_id: Table id
+        encoding: Encoding used when content is bytes
+    Returns:
+        df: The table as a DataFrame
+    """
+
+    tables = read_tables(content, [table_id], encoding=encoding)
+    if table_id not in tables:
+        raise ValueError(f'No table with id {table_id!r} found')
+    return tables[table_id]
+
+
+def table_to_frame(table):
+    """
+    Purpose:
+        Converts an lxml <table> element to a DataFrame following pd.read_html's rules. The rows are
+        typed by pandas' TextParser, or by pd.read_html itself when TextParser can't be used
+
+    Args:
+        table: lxml table element
+    Returns:
+        df: DataFrame, with MultiIndex columns when the table has several header rows
+    """
+
+    for elem in table.xpath('.//*[@style]'):
+        if _is_hidden(elem):
+            elem.getparent().remove(elem)
+
+    if not USE_TEXT_PARSER:
+        return _read_html(table)
+
+    header_rows = []
+    for thead in table.xpath('.//thead'):
+        header_rows.extend(thead.xpath('./tr'))
+        if thead.xpath('./td|./th'):
+            header_rows.append(thead)
+    body_rows = table.xpath('.//tbody//tr') + table.xpath('./tr')
+    footer_rows = table.xpath('.//tfoot//tr')
+
+    if not header_rows:
+        while body_rows and all(td.tag == 'th' for td in body_rows[0].xpath('./td|./th')):
+            header_rows.append(body_rows.pop(0))
+
+    head = _expand_colspan_rowspan(header_rows)
+    body = _expand_colspan_rowspan(body_rows)
+    foot = _expand_colspan_rowspan(footer_rows)
+
+    header = None
+    if head:
+        body = head + body
+        if len(head) == 1:
+            header = 0
+        else:
+            header = [i for i, row in enumerate(head) if any(text for text in row)]
+
+    if foot:
+        body += foot
+
+    width = max((len(row) for row in body), default=0)
+    for row in body:
+        if len(row) < width:
+            row += [''] * (width - len(row))
+
+    try:
+        with TextParser(body, header=header, index_col=None, skiprows=0, parse_dates=False, thousands=',',
+                        decimal='.', converters=None, na_values=None, keep_default_na=True) as tp:
+            return tp.read()
+    except TypeError:
+        # a pandas version whose TextParser takes other arguments
+        return _read_html(table)
+
+
+def _read_html(table):
+    try:
+        return pd.read_html(io.StringIO(html.tostring(table, encoding='unicode')), flavor='lxml', thousands=',')[0]
+    except ValueError:
+        # read_html raises ValueError for a table without rows, where TextParser raises EmptyDataError
+        raise EmptyDataError('No rows in the table')
+
+
+def _is_hidden(elem):
+    return 'display:none' in elem.get('style', '').replace(' ', '')
+
+
+def _expand_colspan_rowspan(rows):
+
+    # cells with rowspan or colspan have their text copied into every cell they cover
+    all_texts = []
+    remainder = []
+
+    for tr in rows:
+        texts = []
+        next_remainder = []
+
+        index = 0
+        for td in tr.xpath('./td|./th'):
+            while remainder and remainder[0][0] <= index:
+                prev_i, prev_text, prev_rowspan = remainder.pop(0)
+                texts.append(prev_text)
+                if prev_rowspan > 1:
+                    next_remainder.append((prev_i, prev_text, prev_rowspan - 1))
+                index += 1
+
+            text = _RE_WHITESPACE.sub(' ', td.text_content().strip())
+            rowspan = int(td.get('rowspan') or 1)
+            colspan = int(td.get('colspan') or 1)
+
+            for _ in range(colspan):
+                texts.append(text)
+                if rowspan > 1:
+                    next_remainder.append((index, text, rowspan - 1))
+                index += 1
+
+        for prev_i, prev_text, prev_rowspan in remainder:
+            texts.append(prev_text)
+            if prev_rowspan > 1:
+                next_remainder.append((prev_i, prev_text, prev_rowspan - 1))
+
+        all_texts.append(texts)
+        remainder = next_remainder
+
+    while remainder:
+        next_remainder = []
+        texts = []
+        for prev_i, prev_text, prev_rowspan in remainder:
+            texts.append(prev_text)
+            if prev_rowspan > 1:
+                next_remainder.append((prev_i, prev_text, prev_rowspan - 1))
+        all_texts.append(texts)
+        remainder = next_remainder
+
+    return all_texts
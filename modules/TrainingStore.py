@@ -0,0 +1,236 @@
+import os
+import json
+import shutil
+import numpy as np
+import pandas as pd
+from . import NBAtools as tl
+
+
+STORE_DIR = os.path.join(os.path.join(os.path.expanduser('~')), 'Desktop/PREDICT_NBA/TRAINING')
+CSV_PATH = os.path.join(os.path.join(os.path.expanduser('~')), 'Desktop/PREDICT_NBA/TrainingData.csv')
+
+# partitions beyond this are merged into one on append, so loads usually map a single file
+MAX_PARTITIONS = 16
+
+# a game is in the store at most once, from each team's side
+KEYS = ['date', 'team', 'opp']
+
+# array file -> dtype. X holds the features in PREDICTION_FEATURES order, y the win target
+ARRAYS = {'X': 'float64', 'y': 'int8', 'date': 'datetime64[D]', 'team': '<U3', 'opp': '<U3'}
+
+
+def _schema_path():
+    return os.path.join(STORE_DIR, 'schema.json')
+
+
+def _partitions():
+    if not os.path.isdir(STORE_DIR):
+        return []
+    return sorted(os.path.join(STORE_DIR, p) for p in os.listdir(STORE_DIR) if p.startswith('part-'))
+
+
+def _check_schema():
+
+    with open(_schema_path()) as f:
+        schema = json.load(f)
+    if schema['features'] != list(tl.PREDICTION_FEATURES):
+        raise ValueError(f'Training store at {STORE_DIR} was built with features {schema["features"]}, '
+                         f'expected {list(tl.PREDICTION_FEATURES)}. Rebuild it with TrainingStore.rebuild()')
+
+
+def _ensure():
+
+    # first use: the store starts from the training csv downloaded with the models. The schema is
+    # written last, so an import that fails is run again next time rather than leaving an empty store.
+    # A schema without partitions next to the csv is an import from before that which didn't finish
+    if os.path.exists(_schema_path()):
+        _check_schema()
+        if _partitions() or not os.path.exists(CSV_PATH):
+            return
+    if os.path.exists(CSV_PATH):
+        _write_partition(_arrays(pd.read_csv(CSV_PATH)))
+    _write_schema()
+
+
+def _write_schema():
+    os.makedirs(STORE_DIR, exist_ok=True)
+    with open(_schema_path(), 'w') as f:
+        json.dump({'features': list(tl.PREDICTION_FEATURES), 'target': 'win', 'arrays': ARRAYS}, f, indent=1)
+
+
+def _arrays(df):
+
+    missing = [c for c in list(tl.PREDICTION_FEATURES) + ['win', 'date', 'team', 'opp'] if c not in df.columns]
+    if missing:
+        raise ValueError(f'Training rows are missing columns {missing}')
+    if df['win'].isna().any():
+        raise ValueError('Training rows must have a known outcome in win')
+
+    return {'X': df[list(tl.PREDICTION_FEATURES)].to_numpy(dtype=ARRAYS['X']),
+            'y': df['win'].to_numpy(dtype=ARRAYS['y']),
+            'date': pd.to_datetime(df['date']).to_numpy().astype(ARRAYS['date']),
+            'team': df['team'].to_numpy(dtype=ARRAYS['team']),
+            'opp': df['opp'].to_numpy(dtype=ARRAYS['opp'])}
+
+
+def _write_partition(arrays, name=None):
+
+    if len(arrays['y']) == 0:
+        return None
+    parts = _partitions()
+    if name is None:
+        last = int(os.path.basename(parts[-1])[5:]) if parts else -1
+        name = f'part-{last + 1:05d}'
+
+    # written to a temporary folder and renamed, so a partition is either complete or absent
+    path = os.path.join(STORE_DIR, name)
+    tmp = os.path.join(STORE_DIR, f'.{name}.{os.getpid()}.tmp')
+    os.makedirs(tmp, exist_ok=True)
+    for key, values in arrays.items():
+        np.save(os.path.join(tmp, f'{key}.npy'), values)
+    os.replace(tmp, path)
+    return path
+
+
+def stored(df):
+    """
+    Purpose:
+        Finds the rows whose (date, team, opp) is already in the store
+
+    Args:
+        df: Rows with date, team and opp
+    Returns:
+        mask: Boolean array, True for rows already stored
+    """
+
+    date, team, opp = load(('date', 'team', 'opp'))
+    keys = set(zip(date.astype('str'), team, opp))
+    rows = zip(pd.to_datetime(df['date']).dt.strftime('%Y-%m-%d'), df['team'], df['opp'])
+    return np.array([row in keys for row in rows], dtype=bool)
+
+
+def append(df):
+    """
+    Purpose:
+        Adds resolved training rows as a new partition, merging partitions once there are more than MAX_PARTITIONS.
+        Rows already in the store are skipped, so appending the same rows again, e.g. after a retrain
+        stopped before clearing them from the prediction store, doesn't add them twice
+
+    Args:
+        df: Rows with date, team, opp, win and every column in NBAtools.PREDICTION_FEATURES
+    Returns:
+        path: Partition written, None if there were no new rows
+    """
+
+    _ensure()
+    df = df[~stored(df) & ~df.duplicated(subset=KEYS, keep='last').to_numpy()]
+    path = _write_partition(_arrays(df))
+    if len(_partitions()) > MAX_PARTITIONS:
+        path = compact()
+    return path
+
+
+def load(columns=('X', 'y'), mmap=True):
+    """
+    Purpose:
+        Loads the training arrays. With a single partition they are memory mapped straight from disk
+        with no copy; several partitions are concatenated
+
+    Args:
+        columns: Arrays to load, any of 'X', 'y', 'date', 'team' and 'opp'
+        mmap: Memory map the files read-only, False to read them into memory
+    Returns:
+        arrays: Tuple of arrays in the order asked for. X has one column per feature in PREDICTION_FEATURES
+    """
+
+    _ensure()
+    parts = _partitions()
+    mode = 'r' if mmap else None
+    arrays = []
+    for key in columns:
+        pieces = [np.load(os.path.join(p, f'{key}.npy'), mmap_mode=mode) for p in parts]
+        if not pieces:
+            width = (0, len(tl.PREDICTION_FEATURES)) if key == 'X' else (0,)
+            arrays.append(np.empty(width, dtype=ARRAYS[key]))
+        else:
+            arrays.append(pieces[0] if len(pieces) == 1 else np.concatenate(pieces))
+    return tuple(arrays)
+
+
+def load_frame(mmap=True):
+    """
+    Purpose:
+        Loads the training data as a DataFrame of date, team, opp, win and the prediction features
+
+    Args:
+        mmap: Memory map the files read-only
+    Returns:
+        df: Training data
+    """
+
+    X, y, date, team, opp = load(('X', 'y', 'date', 'team', 'opp'), mmap=mmap)
+    df = pd.DataFrame(X, columns=list(tl.PREDICTION_FEATURES), copy=False)
+    df.insert(0, 'win', y)
+    df.insert(0, 'opp', opp)
+    df.insert(0, 'team', team)
+    df.insert(0, 'date', pd.to_datetime(date).strftime('%Y-%m-%d'))
+    return df
+
+
+def max_date():
+    """
+    Purpose:
+        Latest game date in the store
+
+    Args:
+        None
+    Returns:
+        date: Date as a 'YYYY-MM-DD' string, None if the store is empty
+    """
+
+    date, = load(('date',))
+    return str(date.max()) if len(date) else None
+
+
+def compact():
+    """
+    Purpose:
+        Merges every partition into one, so later loads map a single file per array
+
+    Args:
+        None
+    Returns:
+        path: The merged partition
+    """
+
+    _ensure()
+    parts = _partitions()
+    if len(parts) <= 1:
+        return parts[0] if parts else None
+
+    arrays = dict(zip(ARRAYS, load(tuple(ARRAYS), mmap=False)))
+    name = f'part-{int(os.path.basename(parts[-1])[5:]) + 1:05d}'
+    path = _write_partition(arrays, name)
+    for p in parts:
+        shutil.rmtree(p)
+    return path
+
+
+def rebuild(df=None):
+    """
+    Purpose:
+        Replaces the store with new training data, e.g. after the prediction features change
+        or after HistoryBuilder.build_history
+
+    Args:
+        df: Training rows, read from TrainingData.csv when None
+    Returns:
+        None
+    """
+
+    arrays = _arrays(pd.read_csv(CSV_PATH) if df is None else df)
+    if os.path.isdir(STORE_DIR):
+        shutil.rmtree(STORE_DIR)
+    _write_partition(arrays)
+    _write_schema()
+
@@ -0,0 +1,283 @@
+import os
+import re
+import time
+import sqlite3
+import hashlib
+import threading
+import datetime as dt
+from urllib.parse import urlsplit
+from contextlib import contextmanager
+from .FetchScheduler import throttle
+from . import Instrumentation as inst
+
+
+CACHE_DIR = os.path.join(os.path.join(os.path.expanduser('~')), 'Desktop/PREDICT_NBA/CACHE')
+MAX_BYTES = 512 * 1024 * 1024
+OFFLINE = os.environ.get('NBAPREDICT_OFFLINE', '0') == '1'
+
+# every request goes to {BASE_URL}/{host}/{path} instead when set, e.g. a local replay server
+BASE_URL = os.environ.get('NBAPREDICT_BASE_URL') or None
+
+# seconds a page from the current season stays fresh, pages from past seasons never expire
+TODAY_TTL = 60 * 60
+SOURCE_TTL = {'nba_elo.csv': 12 * 60 * 60,
+              'modern_RAPTOR_by_team.csv': 24 * 60 * 60}
+
+CACHED_STATUS = (200, 404)
+
+_lock = threading.Lock()
+
+
+class CachedResponse(object):
+
+    """
+    Minimal stand-in for requests.Response holding the fields the scrapers use
+    """
+
+    def __init__(self, url, status_code, content, from_cache=False):
+        self.url = url
+        self.status_code = status_code
+        self.content = content
+        self.from_cache = from_cache
+
+    @property
+    def text(self):
+        return self.content.decode('utf-8', errors='replace')
+
+
+def current_season(today=None):
+    today = today or dt.date.today()
+    return today.year + 1 if today.month > 7 else today.year
+
+
+def ttl_for(url):
+    """
+    Purpose:
+        Picks how long a cached response for a url stays fresh
+
+    Args:
+        url: Requested url
+    Returns:
+        ttl: Seconds until the cached copy expires, None if it never expires
+    """
+
+    name = url.rsplit('/', 1)[-1]
+    if name in SOURCE_TTL:
+        return SOURCE_TTL[name]
+
+    if '/boxscores/' in url:
+        return None
+
+    # basketball-reference schedule/team pages and 538's season folders carry the season in the url
+    m = re.search(r'NBA_(\d{4})_games|/teams/\w+/(\d{4})|/nba-model/(\d{4})/', url)
+    if m:
+        season = int(next(g for g in m.groups() if g))
+        if season < current_season():
+            return None
+
+    return TODAY_TTL
+
+
+def set_offline(offline=True):
+    """
+    Purpose:
+        Toggles replay mode, in which every response is served from the cache regardless of age
+        and a missing entry raises instead of going to the network
+
+    Args:
+        offline: True to replay from the cache only
+    Returns:
+        None
+    """
+
+    global OFFLINE
+    OFFLINE = offline
+
+
+def set_base_url(base_url=None):
+    """
+    Purpose:
+        Points every request at a stand-in server, which receives the original host as the first
+        part of the path: https://www.basketball-reference.com/teams/BOS/2023.html is requested as
+        {base_url}/www.basketball-reference.com/teams/BOS/2023.html. Responses are cached under the
+        rewritten url, so they never mix with the real site's
+
+    Args:
+        base_url: Server to use, e.g. 'http://localhost:8765'. None to go back to the real sites
+    Returns:
+        None
+    """
+
+    global BASE_URL
+    BASE_URL = base_url.rstrip('/') if base_url else None
+
+
+def source_url(url):
+    """
+    Purpose:
+        The url a request for url is actually sent to, see set_base_url
+
+    Args:
+        url: Url as the scrapers build it
+    Returns:
+        url: Rewritten url, or url itself when no base url is set
+    """
+
+    if BASE_URL is None:
+        return url
+    parts = urlsplit(url)
+    return f'{BASE_URL}/{parts.netloc}{parts.path}' + (f'?{parts.query}' if parts.query else '')
+
+
+def get(url, ttl='auto'):
+    """
+    Purpose:
+        Fetches a url through the on-disk response cache shared by all scrapers
+
+    Args:
+        url: Url to fetch
+        ttl: Seconds a cached copy stays fresh. 'auto' picks it from the url with ttl_for, None never expires
+    Returns:
+        resp: CachedResponse with url, status_code, content and text
+    """
+
+    if ttl == 'auto':
+        ttl = ttl_for(url)
+
+    start = time.perf_counter()
+    fetch_url = source_url(url)
+    key = hashlib.sha256(fetch_url.encode('utf-8')).hexdigest()
+    entry = _lookup(key)
+
+    if entry is not None:
+        digest, status, fetched = entry
+        fresh = ttl is None or time.time() - fetched < ttl
+        if fresh or OFFLINE:
+            content = _read_object(digest)
+            if content is not None:
+                _touch(key)
+                inst.fetch(url, time.perf_counter() - start, len(content), True, status)
+                return CachedResponse(url, status, content, from_cache=True)
+
+    if OFFLINE:
+        raise ValueError(f'{url} is not in the response cache (offline mode)')
+
+    # rate limited by the original host, so a stand-in server sees the same request pattern
+    throttle(url)
+    wait = time.perf_counter() - start
+    # imported on the first request that misses the cache, so replays and cached runs don't load it
+    import requests
+    resp = requests.get(fetch_url)
+    inst.fetch(url, time.perf_counter() - start, len(resp.content), False, resp.status_code, wait)
+
+    if resp.status_code in CACHED_STATUS:
+        _store(key, fetch_url, resp.status_code, resp.content)
+
+    return CachedResponse(url, resp.status_code, resp.content)
+
+
+def clear():
+    """
+    Purpose:
+        Removes every cached response
+
+    Args:
+        None
+    Returns:
+        None
+    """
+
+    with _lock, _connect() as con:
+        digests = [r[0] for r in con.execute('SELECT DISTINCT digest FROM entries')]
+        con.execute('DELETE FROM entries')
+    for digest in digests:
+        _remove_object(digest)
+
+
+@contextmanager
+def _connect():
+    os.makedirs(os.path.join(CACHE_DIR, 'objects'), exist_ok=True)
+    con = sqlite3.connect(os.path.join(CACHE_DIR, 'index.sqlite'), timeout=30)
+    try:
+        with con:
+            con.execute('CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, url TEXT, digest TEXT, status INTEGER, '
+                        'size INTEGER, fetched REAL, accessed REAL)')
+            yield con
+    finally:
+        con.close()
+
+
+def _object_path(digest):
+    return os.path.join(CACHE_DIR, 'objects', digest[:2], digest)
+
+
+def _lookup(key):
+    with _connect() as con:
+        return con.execute('SELECT digest, status, fetched FROM entries WHERE key = ?', (key,)).fetchone()
+
+
+def _touch(key):
+    with _lock, _connect() as con:
+        con.execute('UPDATE entries SET accessed = ? WHERE key = ?', (time.time(), key))
+
+
+def _read_object(digest):
+    try:
+        with open(_object_path(digest), 'rb') as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+def _remove_object(digest):
+    try:
+        os.remove(_object_path(digest))
+    except FileNotFoundError:
+        pass
+
+
+def _store(key, url, status, content):
+
+    # bodies are stored by content hash, so identical pages behind different urls share one file
+    digest = hashlib.sha256(content).hexdigest()
+    path = _object_path(digest)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(content)
+        os.replace(tmp, path)
+
+    now = time.time()
+    with _lock, _connect() as con:
+        old = con.execute('SELECT digest FROM entries WHERE key = ?', (key,)).fetchone()
+        con.execute('INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?)',
+                    (key, url, digest, status, len(content), now, now))
+        orphans = _evict(con)
+        if old is not None and old[0] != digest:
+            orphans.append(old[0])
+        orphans = [d for d in orphans
+                   if con.execute('SELECT 1 FROM entries WHERE digest = ?', (d,)).fetchone() is None]
+
+    for d in orphans:
+        _remove_object(d)
+
+
+def _evict(con):
+
+    # least recently used entries go first until the distinct bodies fit under MAX_BYTES
+    sizes = dict(con.execute('SELECT digest, MAX(size) FROM entries GROUP BY digest').fetchall())
+    total = sum(sizes.values())
+    evicted = []
+    if total <= MAX_BYTES:
+        return evicted
+
+    for key, digest in con.execute('SELECT key, digest FROM entries ORDER BY accessed').fetchall():
+        if total <= MAX_BYTES:
+            break
+        con.execute('DELETE FROM entries WHERE key = ?', (key,))
+        if con.execute('SELECT 1 FROM entries WHERE digest = ?', (digest,)).fetchone() is None:
+            total -= sizes.get(digest, 0)
+            evicted.append(digest)
+
+    return evicted
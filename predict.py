@@ -1,11 +1,17 @@
 
 import os
-import pickle
 import pandas as pd
 import datetime as dt
-from requests import get
 from .modules import DatasetCompilers as dc
 from .modules import DailyScrape as ds
+from .modules import PredictionStore as store
+from .modules import ModelRegistry as registry
+from .modules import NBAtools as tl
+from .modules import SnapshotStore as snapshots
+from .modules import Instrumentation as inst
+from .modules import CompiledModels as compiled
+from .modules.LineupScenarios import ScenarioEngine
+from .modules.WebCache import current_season
 import warnings
 warnings.filterwarnings("ignore")
 
@@ -17,20 +23,35 @@ class DailyReport(object):
     outcomes, intended to be run from the terminal or within a notebook.
     """
 
-    def __init__(self):
+    # features used to predict game outcomes, also the schema of the training store
+    prediction_features = tl.PREDICTION_FEATURES
+
+    def __init__(self, models=None, replay=None, as_of=None, end=None):
         """
         Initilizes DailyReport class object, generating necessary datasets
-        for prediction
+        for prediction. Models are only loaded from disk when predictions are made.
+        Today's parsed datasets are saved as a snapshot, so the day can be replayed later
 
         Args:
             self
+            models: Models to predict with, any of 'log', 'mlp' and 'rf'. All three when None
+            replay: Past date to rebuild from its snapshots instead of scraping. Predictions made
+                    in replay are not written to the prediction store
+            as_of: Date to predict instead of today. Past dates use the minutes players actually
+                   played, from the box scores, in place of projections, and today's team pages and
+                   RAPTOR, so their features are not what was known before the games. Like replays,
+                   their predictions are not written to the prediction store, and their inputs
+                   aren't saved as snapshots
+            end: Last date of a range starting at as_of, see predict_range
 
         Returns:
-            self.log: Logistic Regression predictive model
-            self.mlp: Multilayer Perceptron predictive model
-            self.rf: Random Forest predictive model
-            self.prediction_features: Features used to predict game outcomes
-            self.today: Today's date
+            self.models: Names of the models used by get_predictions
+            self.replay: Whether the datasets were loaded from snapshots
+            self.run: Instrumentation run timing each stage, written to PREDICT_NBA/RUNS. The run that
+                      built the inputs, then the one of the last get_predictions
+            self.today: Today's date, the as_of date or the replayed date
+            self.end: Last date of a range, None for a single day
+            self.dates: Dates with games in the report
             self.player_stats: Statistical player stats
             self.team_stats: Statistical team stats
             self.raptor: 538's up to date RAPTOR ratings for each player in today's games
@@ -43,6 +64,7 @@ class DailyReport(object):
         self.pred_dir_path = str(os.path.join(os.path.join(os.path.expanduser('~')), 'Desktop/PREDICT_NBA'))
 
         if not os.path.exists(self.pred_dir_path):
+            from requests import get
             os.makedirs(self.pred_dir_path)
             os.makedirs(f'{self.pred_dir_path}/MODELS')
 
@@ -62,35 +84,120 @@ class DailyReport(object):
                 with open(FILE_TO_SAVE_AS, "wb") as f:
                     f.write(resp.content)
 
-        self.log = pickle.load(open(f'{self.pred_dir_path}/MODELS/logreg_model.sav', 'rb'))
-        self.mlp = pickle.load(open(f'{self.pred_dir_path}/MODELS/mlp_model.sav', 'rb'))
-        self.rf = pickle.load(open(f'{self.pred_dir_path}/MODELS/rf_model.sav', 'rb'))
+        if replay is not None and as_of is not None:
+            raise ValueError('replay and as_of are different ways of predicting a past day, pass one of them')
+
+        self.models = registry.check_names(models)
+        self.replay = replay is not None
+        self.today = pd.Timestamp(replay or as_of or dt.date.today()).date()
+        self.end = pd.Timestamp(end).date() if end is not None else None
+        self.dates = []
+        if self.end is not None and (self.end < self.today or current_season(self.end) != current_season(self.today)):
+            raise ValueError(f'{self.today} to {self.end} is not a range within one season')
+        if max(self.today, self.end or self.today) > dt.date.today():
+            raise ValueError('Only dates up to today can be predicted, later minutes are not projected yet')
+
+        # every stage is timed and written to PREDICT_NBA/RUNS, even when one of them fails. The run is
+        # finished here, so a report that never predicts doesn't leave it recording; get_predictions starts its own
+        self.run = inst.start_run(f'{self._run_name()}_inputs')
+        try:
+            self._build_inputs()
+        finally:
+            inst.finish_run()
+
+    @property
+    def stores_results(self):
+        """
+        Whether predictions are written to the prediction store and TodayPred.csv, and the inputs
+        saved as snapshots: only for today's games scraped today. Past days are built with hindsight
+        (box score minutes, later team pages and RAPTOR), so storing them would replace the real
+        pre-game predictions, feed hindsight rows to retrain_model and make replay rebuild the day
+        from hindsight inputs
+        """
+        return not self.replay and self.end is None and self.today == dt.date.today()
 
-        self.prediction_features = ['home', 'dRest', 'dAge', 'dWin%', 'dLast5', 'dLast10', 'teamElo', 'oppElo', 'dElo', 'dORtg', 'dDRtg',
-                                    'dPACE', 'deFG', 'dTOV', 'dORB', 'dDRB', 'RVTo', 'RVTd', 'oRVTo', 'oRVTd']
+    def _run_name(self):
+        return 'replay' if self.replay else 'range' if self.end is not None else 'predict'
 
-        self.today = dt.date.today()
-        print(f'\nGenerating NBA Game Schedule for {self.today.month}/{self.today.day}/{self.today.year}...')
+    def _build_inputs(self):
 
-        self.games = dc.build_game_data()
+        if self.replay:
+            print(f'\nReplaying NBA Game Schedule for {self.today.month}/{self.today.day}/{self.today.year} from snapshots...')
+            with inst.span('load_snapshots'):
+                for source, df in snapshots.load_day(self.today).items():
+                    setattr(self, source, df)
+            self.dates = [self.today]
+            return
+
+        span = f'{self.today.month}/{self.today.day}/{self.today.year}'
+        if self.end is not None:
+            span += f' to {self.end.month}/{self.end.day}/{self.end.year}'
+        print(f'\nGenerating NBA Game Schedule for {span}...')
+
+        # the schedule, team pages and RAPTOR are fetched once for the season, however many dates are predicted
+        with inst.span('build_game_data'):
+            self.games = dc.build_game_data(as_of=self.today, end=self.end)
         if self.games is None:
-            print('\nno NBA games today')
+            print('\nno NBA games today' if self.end is None and self.today == dt.date.today() else f'\nno NBA games on {span}')
             return
+        self.dates = sorted(pd.to_datetime(self.games['date']).dt.date.unique())
 
         print("\nCompiling Statistical Data...")
-        self.player_stats, self.team_stats = ds.daily_stats()
-        self.raptor = ds.daily_raptor()
-        self.stats = dc.build_full_stats(self.raptor, self.player_stats, daily=True)
-        self.mp = ds.get_projected_minutes(names=list(self.stats.PLAYER.unique()))[['DATE', 'TEAM', 'PLAYER', 'MP', 'SEASON']]
-        self.elo = ds.daily_elo()
-
-    def get_predictions(self):
+        with inst.span('daily_stats'):
+            self.player_stats, self.team_stats = ds.daily_stats(as_of=self.today)
+        with inst.span('daily_raptor'):
+            self.raptor = ds.daily_raptor(as_of=self.today)
+        with inst.span('build_full_stats'):
+            self.stats = dc.build_full_stats(self.raptor, self.player_stats, daily=True)
+        with inst.span('projected_minutes'):
+            self.mp = self._minutes()
+        with inst.span('daily_elo'):
+            self.elo = ds.daily_elo(as_of=self.today, end=self.end)
+
+        if self.stores_results:
+            with inst.span('save_snapshots'):
+                snapshots.save_day(self.today, {source: getattr(self, source) for source in snapshots.SOURCES})
+
+    def _minutes(self):
+
+        # projections are only published for the current day, finished games use the box scores
+        today = dt.date.today()
+        dates = pd.to_datetime(self.games['date']).dt.date
+        mp = []
+        if (dates < today).any():
+            mp.append(ds.played_minutes(self.games[dates < today]))
+        if (dates == today).any():
+            names = list(self.stats.PLAYER.unique())
+            mp.append(ds.get_projected_minutes(names=names, as_of=today)[['DATE', 'TEAM', 'PLAYER', 'MP', 'SEASON']])
+        return pd.concat(mp, ignore_index=True)
+
+    @property
+    def log(self):
+        """Logistic Regression predictive model, loaded on first use"""
+        return registry.load('log')
+
+    @property
+    def mlp(self):
+        """Multilayer Perceptron predictive model, loaded on first use"""
+        return registry.load('mlp')
+
+    @property
+    def rf(self):
+        """Random Forest predictive model, loaded on first use"""
+        return registry.load('rf')
+
+    def get_predictions(self, models=None):
         """
-        Predicts the outcomes of today's NBA games, logging their results in a full prediction dataset called Predictions.csv
-        and to a more readable dataset containing only today's predictions
+        Predicts the outcomes of today's NBA games, logging their results in the prediction store
+        and to a more readable dataset containing only today's predictions. A replayed day is only
+        predicted, its results are kept in self.predictions and nothing is written. The same goes for
+        past dates and ranges, see stores_results
 
         Args:
             self
+            models: Models to predict with, defaults to the models chosen when the report was created.
+                    The predicted winner comes from the logistic regression model when it is included,
+                    otherwise from the first model chosen
 
         Returns:
             today_pred: Reader-friendly DataFrame containing all of today's NBA game outcome predictions
@@ -100,57 +207,174 @@ class DailyReport(object):
             print('\nno games to predict')
             return
 
-        print("\nAdding Player Stats to Game Data...")
-        gamedata = dc.build_games_plus_roster(self.games, self.mp, self.stats)
+        self.run = inst.start_run(self._run_name())
+        try:
+            return self._predict(models)
+        finally:
+            print(f'\nRun report: {inst.finish_run()}')
 
-        print("\nBuilding Game Prediction Dataset...")
-        df = dc.build_prediction_data(gamedata, self.team_stats, self.elo)
-        
-        df.to_csv(f'{self.pred_dir_path}/NewTrainingData.csv', mode='a', header=not os.path.exists(f'{self.pred_dir_path}/NewTrainingData.csv'), index=False)
-        df = pd.read_csv(f'{self.pred_dir_path}/NewTrainingData.csv')
-        df.drop_duplicates(subset=['date', 'team', 'opp'], keep='last', inplace=True)
-        df.to_csv(f'{self.pred_dir_path}/NewTrainingData.csv', index=False)
-        
-        print("\nPredicting Game Outcomes...")
+    def _predict(self, models):
 
-        team = list(df['team'])
-        opp = list(df['opp'])
-        date = list(df['date'])
+        df, preds_df = self.score(models, verbose=True)
 
-        df = df[self.prediction_features]
+        print('\nPredictions Complete!')
 
-        log_prediction = self.log.predict_proba(df)
-        log_prob = [round(i[1] * 100, 1) for i in log_prediction]
+        self.predictions = preds_df
+        if self.stores_results:
+            with inst.span('store_training_rows'):
+                store.upsert('new_training', df)
+            with inst.span('store_predictions'):
+                store.upsert('predictions', preds_df)
 
-        mlp_prediction = self.mlp.predict_proba(df)
-        mlp_prob = [round(i[1] * 100, 1) for i in mlp_prediction]
+        names = {col: label for _, col, label in registry.MODELS.values() if col in preds_df.columns}
+        today_pred = preds_df.copy()
+        today_pred = today_pred[today_pred.WIN == 1]
+        cols = ['DATE', 'TEAM', 'OPP'] + list(names)
+        today_pred = today_pred[cols]
+        today_pred.columns = ['Date', 'Predicted Winner', 'Predicted Loser'] + list(names.values())
+        for col in names.values():
+            today_pred[col] = today_pred[col].astype('str') + '%'
+        if self.stores_results:
+            today_pred.to_csv(f'{self.pred_dir_path}/TodayPred.csv', index=False)
 
-        rf_prediction = self.rf.predict_proba(df)
-        rf_prob = [round(i[1] * 100, 1) for i in rf_prediction]
+        return print(today_pred)
 
-        binary_prediction = list(self.log.predict(df))
+    def score(self, models=None, verbose=False):
+        """
+        Builds the prediction dataset from the report's inputs and scores it with each model,
+        without storing or printing the results
 
-        preds_df = pd.DataFrame(list(zip(date, team, opp, binary_prediction, log_prob, mlp_prob, rf_prob)),
-                                columns=['DATE', 'TEAM', 'OPP', 'WIN', 'LOG_PROB_%', 'MLP_PROB_%', 'RF_PROB_%'])
+        Args:
+            self
+            models: Models to predict with, defaults to the models chosen when the report was created
+            verbose: Print each step, as get_predictions does
 
-        print('\nPredictions Complete!')
+        Returns:
+            df: Prediction dataset, one row per team per game
+            preds_df: DATE, TEAM, OPP, WIN and a probability column per model
+        """
 
-        preds_df.to_csv(f'{self.pred_dir_path}/Predictions.csv', mode='a', header=not os.path.exists(f'{self.pred_dir_path}/Predictions.csv'), index=False)
-        p = pd.read_csv(f'{self.pred_dir_path}/Predictions.csv')
-        p.drop_duplicates(subset=['DATE', 'TEAM', 'OPP'], keep='last', inplace=True)
-        p.to_csv(f'{self.pred_dir_path}/Predictions.csv', index=False)
+        if verbose:
+            print("\nAdding Player Stats to Game Data...")
+        with inst.span('build_games_plus_roster'):
+            gamedata = dc.build_games_plus_roster_by_date(self.games, self.mp, self.stats)
+
+        if verbose:
+            print("\nBuilding Game Prediction Dataset...")
+        with inst.span('build_prediction_data'):
+            df = dc.build_prediction_data(gamedata, self.team_stats.copy(), self.elo.copy())
+
+        if verbose:
+            print("\nPredicting Game Outcomes...")
+
+        X = df[self.prediction_features]
+        models = registry.check_names(models or self.models)
+        preds_df = pd.DataFrame({'DATE': list(df['date']), 'TEAM': list(df['team']), 'OPP': list(df['opp'])})
+        with inst.span('inference', models=models, games=len(X), compiled=compiled.ENABLED):
+            if compiled.ENABLED:
+                # one float32 matrix shared by every model
+                X = compiled.as_matrix(X, self.prediction_features)
+            probs = {}
+            for name in models:
+                with inst.span('load_model', model=name):
+                    model = compiled.estimator(name)
+                with inst.span('predict_proba', model=name):
+                    probs[name] = model.predict_proba(X)[:, 1]
+            # the first model's predicted winner, without a separate predict pass
+            preds_df['WIN'] = (probs[models[0]] > 0.5).astype('int64')
+            for name in models:
+                _, col, _ = registry.MODELS[name]
+                preds_df[col] = [round(p * 100, 1) for p in probs[name]]
+
+        return df, preds_df
+
+    def scenarios(self, models=None):
+        """
+        Builds a ScenarioEngine on the report's prediction dataset, to score players being ruled out
+        or their minutes changing without rebuilding the report
 
-        today_pred = preds_df.copy()
-        today_pred = today_pred[today_pred.WIN == 1]
-        cols = ['DATE', 'TEAM', 'OPP', 'LOG_PROB_%', 'MLP_PROB_%', 'RF_PROB_%']
-        today_pred = today_pred[cols]
-        today_pred.columns = ['Date', 'Predicted Winner', 'Predicted Loser', 'Probability (LR)', 'Probability (MLP)', 'Probability (RF)']
-        today_pred['Probability (LR)'] = today_pred['Probability (LR)'].astype('str') + '%'
-        today_pred['Probability (MLP)'] = today_pred['Probability (MLP)'].astype('str') + '%'
-        today_pred['Probability (RF)'] = today_pred['Probability (RF)'].astype('str') + '%'
-        today_pred.to_csv(f'{self.pred_dir_path}/TodayPred.csv', index=False)
+        Args:
+            self
+            models: Models to score with, defaults to the models chosen when the report was created
 
-        return print(today_pred)
+        Returns:
+            engine: ScenarioEngine, see its run and injury_table methods
+        """
+
+        models = registry.check_names(models or self.models)
+        df, _ = self.score(models)
+        return ScenarioEngine(df, models)
+
+    def refresh(self, source):
+        """
+        Rebuilds one of the report's inputs in place, so a long-running process can keep a report
+        current without rebuilding everything. Refreshed inputs are not saved as snapshots
+
+        Args:
+            self
+            source: 'games' (the slate and recent form), 'stats' (player and team stats and RAPTOR),
+                    'mp' (projected minutes) or 'elo'
+
+        Returns:
+            None
+        """
+
+        if self.replay or self.end is not None:
+            raise ValueError('Only a report for a single day that was scraped can be refreshed')
+
+        with inst.span(f'refresh_{source}'):
+            if source == 'games':
+                games = dc.build_game_data(as_of=self.today)
+                if games is None:
+                    raise ValueError(f'No games left on {self.today}')
+                self.games = games
+                self.dates = [self.today]
+            elif source == 'stats':
+                self.player_stats, self.team_stats = ds.daily_stats(as_of=self.today)
+                self.raptor = ds.daily_raptor(as_of=self.today)
+                self.stats = dc.build_full_stats(self.raptor, self.player_stats, daily=True)
+            elif source == 'mp':
+                self.mp = self._minutes()
+            elif source == 'elo':
+                self.elo = ds.daily_elo(as_of=self.today)
+            else:
+                raise ValueError(f"Unknown input {source}, expected 'games', 'stats', 'mp' or 'elo'")
+
+    def export_csv(self):
+        """
+        Writes the stored predictions and pending training rows out as Predictions.csv and
+        NewTrainingData.csv in the PREDICT_NBA directory
+
+        Args:
+            self
+
+        Returns:
+            paths: List of csv files written
+        """
+
+        return store.export_csv()
+
+
+def predict_range(start, end, models=None):
+    """
+    Predicts every game from start to end as one batch. The season's schedule, team pages, RAPTOR
+    and Elo are fetched or computed once for the whole range rather than once per day, then every
+    date's rosters are built and all of the games are scored together
+
+    Args:
+        start: First date, dt.date or 'YYYY-MM-DD'
+        end: Last date, in the same season as start and no later than today
+        models: Models to predict with, any of 'log', 'mlp' and 'rf'. All three when None
+
+    Returns:
+        report: DailyReport with the range's inputs, and its predictions in report.predictions.
+                They are not written to the prediction store: the features use each day's box
+                score minutes and the team pages and RAPTOR as of today, not as of the game
+    """
+
+    report = DailyReport(models=models, as_of=start, end=end)
+    report.get_predictions()
+    return report
 
 
 if __name__ == "__main__":